@@ -3,6 +3,7 @@ from .generators import (
     struct_generator,
     union_generator
 )
+from .batch import decode_many, encode_many
 from .container import array
 from .composite import (
     bytes_ as bytes,
@@ -11,10 +12,14 @@ from .composite import (
     union,
 )
 from .descriptor import kind
-from .exception import ProphyError
+from .exception import ProphyError, ProphyTruncatedError
+from .ndarray import struct_dtype
 from .optional import optional
+from .pool import buffer_pool
+from .registry import message_registry
 from .scalar import i8, i16, i32, i64, u8, u16, u32, u64, r32, r64, enum, enum8
 from .six import with_metaclass
+from .stream import stream_decoder
 
 
 __all__ = [
@@ -22,12 +27,19 @@ __all__ = [
     'u8', 'u16', 'u32', 'u64',
     'r32', 'r64',
     'array',
+    'buffer_pool',
     'bytes',
+    'decode_many',
+    'encode_many',
     'enum', 'enum8', 'enum_generator',
     'kind',
+    'message_registry',
     'optional',
     'ProphyError',
+    'ProphyTruncatedError',
+    'stream_decoder',
     'struct',
+    'struct_dtype',
     'struct_generator',
     'struct_packed',
     'union',
@@ -0,0 +1,1588 @@
+/*
+ * Optional accelerator of prophy codec, see prophy/records.py and fused_run in
+ * prophy/plan.py for pure Python implementations of the same coding.
+ *
+ * Layout is a struct module format compiled into offsets and codes of values,
+ * which are converted directly between bytes and Python numbers. Records and
+ * runs are coded with layouts: runs are programs of ops, compiled from items
+ * of fused runs, which move values between layout and fields of message and
+ * its nested structs, calling back Python only for items they don't cover.
+ */
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <stdint.h>
+#include <string.h>
+
+#if PY_MAJOR_VERSION >= 3
+#define BUFFER_ARG "y*"
+#define native_str PyUnicode_FromString
+#define int_from_long PyLong_FromLong
+#else
+#define BUFFER_ARG "s*"
+#define native_str PyString_FromString
+#define int_from_long PyInt_FromLong
+#endif
+
+/* Functions called per message take positional arguments as array, without tuple where possible. */
+#if PY_VERSION_HEX >= 0x03070000
+#define FASTCALL_FLAGS METH_FASTCALL
+#define FASTCALL(name) \
+    static PyObject *name##_call(PyObject *self, PyObject *const *args, Py_ssize_t nargs) \
+    { return name(self, args, nargs); }
+#else
+#define FASTCALL_FLAGS METH_VARARGS
+#define FASTCALL(name) \
+    static PyObject *name##_call(PyObject *self, PyObject *args) \
+    { return name(self, &PyTuple_GET_ITEM(args, 0), PyTuple_GET_SIZE(args)); }
+#endif
+
+static PyObject *str_fields;
+static PyObject *str_values;
+static PyObject *str_collect;
+static PyObject *str_distribute;
+static PyObject *str_wrap;
+static PyObject *empty_tuple;
+static PyObject *int_zero;
+static PyObject *int_one;
+static PyObject *struct_error;
+static PyObject *prophy_error;
+
+static int
+check_arguments(const char *name, Py_ssize_t nargs, Py_ssize_t expected)
+{
+    if (nargs != expected) {
+        PyErr_Format(PyExc_TypeError, "%s expects %zd arguments, got %zd", name, expected, nargs);
+        return -1;
+    }
+    return 0;
+}
+
+static int
+check_span(Py_ssize_t length, Py_ssize_t pos, Py_ssize_t size, const char *what)
+{
+    if (pos < 0 || length - pos < size) {
+        PyErr_Format(struct_error, "%s requires a buffer of at least %zd bytes at offset %zd "
+                     "(actual buffer size is %zd)", what, size, pos, length);
+        return -1;
+    }
+    return 0;
+}
+
+/* Input data: bytes are read in place, other objects through buffer protocol */
+
+typedef struct {
+    Py_buffer view;
+    int has_view;
+    const unsigned char *buf;
+    Py_ssize_t len;
+} input;
+
+static int
+input_open(input *in, PyObject *data)
+{
+    if (PyBytes_CheckExact(data)) {
+        in->has_view = 0;
+        in->buf = (const unsigned char *)PyBytes_AS_STRING(data);
+        in->len = PyBytes_GET_SIZE(data);
+        return 0;
+    }
+    if (PyObject_GetBuffer(data, &in->view, PyBUF_SIMPLE) < 0) {
+        return -1;
+    }
+    in->has_view = 1;
+    in->buf = (const unsigned char *)in->view.buf;
+    in->len = in->view.len;
+    return 0;
+}
+
+static void
+input_close(input *in)
+{
+    if (in->has_view) {
+        PyBuffer_Release(&in->view);
+    }
+}
+
+/* Layout: struct module format compiled into offsets of values */
+
+typedef struct {
+    char code;
+    Py_ssize_t offset;
+    Py_ssize_t size;
+} value_format;
+
+typedef struct {
+    PyObject_HEAD
+    PyObject *format;
+    Py_ssize_t size;
+    Py_ssize_t count;
+    int swap;
+    value_format *values;
+} layout_object;
+
+static PyTypeObject layout_type;
+
+static int
+host_little(void)
+{
+    const uint16_t one = 1;
+    return *(const unsigned char *)&one;
+}
+
+static Py_ssize_t
+value_size(char code)
+{
+    switch (code) {
+    case 'x': case 'b': case 'B': case 's':
+        return 1;
+    case 'h': case 'H':
+        return 2;
+    case 'i': case 'I': case 'f':
+        return 4;
+    case 'q': case 'Q': case 'd':
+        return 8;
+    }
+    return 0;
+}
+
+/* Returns number of values in format, filling `values` unless it's NULL. */
+static Py_ssize_t
+scan_format(const char *s, value_format *values, Py_ssize_t *size)
+{
+    Py_ssize_t count = 0, offset = 0, repeat, item_size, i;
+    char code;
+
+    while (*s) {
+        if (Py_ISSPACE(*s)) {
+            s++;
+            continue;
+        }
+        repeat = 1;
+        if (Py_ISDIGIT(*s)) {
+            repeat = 0;
+            while (Py_ISDIGIT(*s)) {
+                if (repeat > (PY_SSIZE_T_MAX >> 4)) {
+                    PyErr_SetString(struct_error, "total struct size too long");
+                    return -1;
+                }
+                repeat = repeat * 10 + (*s++ - '0');
+            }
+        }
+        code = *s++;
+        item_size = value_size(code);
+        if (item_size == 0) {
+            PyErr_SetString(struct_error, "bad char in struct format");
+            return -1;
+        }
+        if (code == 'x') {
+            offset += repeat;
+        } else if (code == 's') {
+            if (values) {
+                values[count].code = code;
+                values[count].offset = offset;
+                values[count].size = repeat;
+            }
+            count++;
+            offset += repeat;
+        } else {
+            for (i = 0; i < repeat; i++) {
+                if (values) {
+                    values[count].code = code;
+                    values[count].offset = offset;
+                    values[count].size = item_size;
+                }
+                count++;
+                offset += item_size;
+            }
+        }
+        if (offset > (PY_SSIZE_T_MAX >> 4)) {
+            PyErr_SetString(struct_error, "total struct size too long");
+            return -1;
+        }
+    }
+    *size = offset;
+    return count;
+}
+
+static PyObject *
+layout_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
+{
+    static char *keywords[] = {"format", NULL};
+    layout_object *self;
+    const char *format;
+    int little;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "s:layout", keywords, &format)) {
+        return NULL;
+    }
+    self = (layout_object *)type->tp_alloc(type, 0);
+    if (self == NULL) {
+        return NULL;
+    }
+    self->format = native_str(format);
+    if (self->format == NULL) {
+        goto error;
+    }
+    switch (*format++) {
+    case '<':
+        little = 1;
+        break;
+    case '>': case '!':
+        little = 0;
+        break;
+    case '=':
+        little = host_little();
+        break;
+    default:
+        PyErr_SetString(struct_error, "layout format needs explicit byte order");
+        goto error;
+    }
+    self->swap = little != host_little();
+    self->count = scan_format(format, NULL, &self->size);
+    if (self->count < 0) {
+        goto error;
+    }
+    self->values = PyMem_New(value_format, self->count ? self->count : 1);
+    if (self->values == NULL) {
+        PyErr_NoMemory();
+        goto error;
+    }
+    scan_format(format, self->values, &self->size);
+    return (PyObject *)self;
+
+error:
+    Py_DECREF(self);
+    return NULL;
+}
+
+static void
+layout_dealloc(layout_object *self)
+{
+    Py_XDECREF(self->format);
+    PyMem_Free(self->values);
+    Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+static uint16_t
+load16(const unsigned char *p, int swap)
+{
+    uint16_t x;
+    memcpy(&x, p, sizeof(x));
+    return swap ? (uint16_t)(x >> 8 | x << 8) : x;
+}
+
+static uint32_t
+load32(const unsigned char *p, int swap)
+{
+    uint32_t x;
+    memcpy(&x, p, sizeof(x));
+    if (swap) {
+        x = (x >> 24) | ((x >> 8) & 0xff00) | ((x << 8) & 0xff0000) | (x << 24);
+    }
+    return x;
+}
+
+static uint64_t
+load64(const unsigned char *p, int swap)
+{
+    uint64_t x;
+    memcpy(&x, p, sizeof(x));
+    if (swap) {
+        x = (uint64_t)load32((const unsigned char *)&x, 1) << 32 | load32((const unsigned char *)&x + 4, 1);
+    }
+    return x;
+}
+
+static void
+store16(unsigned char *p, int swap, uint16_t x)
+{
+    x = load16((const unsigned char *)&x, swap);
+    memcpy(p, &x, sizeof(x));
+}
+
+static void
+store32(unsigned char *p, int swap, uint32_t x)
+{
+    x = load32((const unsigned char *)&x, swap);
+    memcpy(p, &x, sizeof(x));
+}
+
+static void
+store64(unsigned char *p, int swap, uint64_t x)
+{
+    x = load64((const unsigned char *)&x, swap);
+    memcpy(p, &x, sizeof(x));
+}
+
+static PyObject *
+new_signed(int64_t x)
+{
+    if (x >= LONG_MIN && x <= LONG_MAX) {
+        return int_from_long((long)x);
+    }
+    return PyLong_FromLongLong(x);
+}
+
+static PyObject *
+new_unsigned(uint64_t x)
+{
+    if (x <= LONG_MAX) {
+        return int_from_long((long)x);
+    }
+    return PyLong_FromUnsignedLongLong(x);
+}
+
+static PyObject *
+unpack_value(const value_format *value, const unsigned char *base, int swap)
+{
+    const unsigned char *p = base + value->offset;
+
+    switch (value->code) {
+    case 'b':
+        return int_from_long((signed char)*p);
+    case 'B':
+        return int_from_long(*p);
+    case 'h':
+        return int_from_long((int16_t)load16(p, swap));
+    case 'H':
+        return int_from_long(load16(p, swap));
+    case 'i':
+        return new_signed((int32_t)load32(p, swap));
+    case 'I':
+        return new_unsigned(load32(p, swap));
+    case 'q':
+        return new_signed((int64_t)load64(p, swap));
+    case 'Q':
+        return new_unsigned(load64(p, swap));
+    case 'f': {
+        uint32_t bits = load32(p, swap);
+        float f;
+        memcpy(&f, &bits, sizeof(f));
+        return PyFloat_FromDouble(f);
+    }
+    case 'd': {
+        uint64_t bits = load64(p, swap);
+        double d;
+        memcpy(&d, &bits, sizeof(d));
+        return PyFloat_FromDouble(d);
+    }
+    case 's':
+        return PyBytes_FromStringAndSize((const char *)p, value->size);
+    }
+    PyErr_SetString(PyExc_SystemError, "bad code of layout value");
+    return NULL;
+}
+
+static int
+pack_integer(const value_format *value, unsigned char *p, int swap, PyObject *obj)
+{
+    PyObject *number;
+    long long x;
+    unsigned long long max;
+    int overflow, is_unsigned = Py_ISUPPER(value->code);
+    Py_ssize_t bits = 8 * value->size;
+
+    if (PyLong_Check(obj)) {
+        Py_INCREF(obj);
+        number = obj;
+    } else {
+        number = PyNumber_Index(obj);
+        if (number == NULL) {
+            if (PyErr_ExceptionMatches(PyExc_TypeError)) {
+                PyErr_SetString(struct_error, "required argument is not an integer");
+            }
+            return -1;
+        }
+    }
+    x = PyLong_AsLongLongAndOverflow(number, &overflow);
+    if (x == -1 && PyErr_Occurred()) {
+        Py_DECREF(number);
+        return -1;
+    }
+    if (overflow > 0 && is_unsigned && bits == 64) {
+        unsigned long long u = PyLong_AsUnsignedLongLong(number);
+        Py_DECREF(number);
+        if (u == (unsigned long long)-1 && PyErr_Occurred()) {
+            PyErr_Clear();
+            goto range;
+        }
+        store64(p, swap, u);
+        return 0;
+    }
+    Py_DECREF(number);
+    if (overflow) {
+        goto range;
+    }
+    if (is_unsigned ? (x < 0 || (bits < 64 && (unsigned long long)x >> bits))
+                    : (bits < 64 && (x < -(1LL << (bits - 1)) || x >= (1LL << (bits - 1))))) {
+        goto range;
+    }
+    switch (bits) {
+    case 8:
+        *p = (unsigned char)x;
+        break;
+    case 16:
+        store16(p, swap, (uint16_t)x);
+        break;
+    case 32:
+        store32(p, swap, (uint32_t)x);
+        break;
+    default:
+        store64(p, swap, (uint64_t)x);
+    }
+    return 0;
+
+range:
+    max = bits == 64 ? ~0ULL : (1ULL << bits) - 1;
+    if (is_unsigned) {
+        PyErr_Format(struct_error, "'%c' format requires 0 <= number <= %llu", value->code, max);
+    } else {
+        PyErr_Format(struct_error, "'%c' format requires %lld <= number <= %lld", value->code,
+                     -(long long)(max >> 1) - 1, (long long)(max >> 1));
+    }
+    return -1;
+}
+
+/* Packs value into bytes at base, which were zeroed before. */
+static int
+pack_value(const value_format *value, unsigned char *base, int swap, PyObject *obj)
+{
+    unsigned char *p = base + value->offset;
+
+    switch (value->code) {
+    case 's': {
+        const char *source;
+        Py_ssize_t length;
+        if (PyBytes_Check(obj)) {
+            source = PyBytes_AS_STRING(obj);
+            length = PyBytes_GET_SIZE(obj);
+        } else if (PyByteArray_Check(obj)) {
+            source = PyByteArray_AS_STRING(obj);
+            length = PyByteArray_GET_SIZE(obj);
+        } else {
+            PyErr_SetString(struct_error, "argument for 's' must be a bytes object");
+            return -1;
+        }
+        memcpy(p, source, length < value->size ? length : value->size);
+        return 0;
+    }
+    case 'f': case 'd': {
+        double d = PyFloat_AsDouble(obj);
+        if (d == -1.0 && PyErr_Occurred()) {
+            PyErr_SetString(struct_error, "required argument is not a float");
+            return -1;
+        }
+        if (value->code == 'f') {
+            float f = (float)d;
+            uint32_t bits;
+            if (Py_IS_INFINITY(f) && !Py_IS_INFINITY(d)) {
+                PyErr_SetString(PyExc_OverflowError, "float too large to pack with f format");
+                return -1;
+            }
+            memcpy(&bits, &f, sizeof(bits));
+            store32(p, swap, bits);
+        } else {
+            uint64_t bits;
+            memcpy(&bits, &d, sizeof(bits));
+            store64(p, swap, bits);
+        }
+        return 0;
+    }
+    }
+    return pack_integer(value, p, swap, obj);
+}
+
+/* Returns tuple or list of all values of layout unpacked from bytes at base. */
+static PyObject *
+layout_unpack(layout_object *self, const unsigned char *base, int as_list)
+{
+    PyObject *values, *value;
+    Py_ssize_t i;
+
+    values = as_list ? PyList_New(self->count) : PyTuple_New(self->count);
+    if (values == NULL) {
+        return NULL;
+    }
+    for (i = 0; i < self->count; i++) {
+        value = unpack_value(&self->values[i], base, self->swap);
+        if (value == NULL) {
+            Py_DECREF(values);
+            return NULL;
+        }
+        if (as_list) {
+            PyList_SET_ITEM(values, i, value);
+        } else {
+            PyTuple_SET_ITEM(values, i, value);
+        }
+    }
+    return values;
+}
+
+/* Packs all values of layout from list or tuple into bytes at base, which may be partially written on error. */
+static int
+layout_pack(layout_object *self, unsigned char *base, PyObject *values)
+{
+    PyObject *value;
+    Py_ssize_t i;
+    int result;
+
+    if (PySequence_Fast_GET_SIZE(values) != self->count) {
+        PyErr_Format(struct_error, "pack expected %zd items for packing (got %zd)",
+                     self->count, PySequence_Fast_GET_SIZE(values));
+        return -1;
+    }
+    memset(base, 0, self->size);
+    for (i = 0; i < self->count; i++) {
+        /* converting value may run Python code, which could shrink the list */
+        if (i >= PySequence_Fast_GET_SIZE(values)) {
+            PyErr_SetString(PyExc_RuntimeError, "values changed size during packing");
+            return -1;
+        }
+        value = PySequence_Fast_GET_ITEM(values, i);
+        Py_INCREF(value);
+        result = pack_value(&self->values[i], base, self->swap, value);
+        Py_DECREF(value);
+        if (result < 0) {
+            return -1;
+        }
+    }
+    return 0;
+}
+
+static PyObject *
+layout_unpack_from(layout_object *self, PyObject *args, PyObject *kwds)
+{
+    static char *keywords[] = {"buffer", "offset", NULL};
+    PyObject *values = NULL;
+    Py_buffer view;
+    Py_ssize_t pos = 0;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, BUFFER_ARG "|n:unpack_from", keywords, &view, &pos)) {
+        return NULL;
+    }
+    if (check_span(view.len, pos, self->size, "unpack_from") == 0) {
+        values = layout_unpack(self, (const unsigned char *)view.buf + pos, 0);
+    }
+    PyBuffer_Release(&view);
+    return values;
+}
+
+static PyObject *
+layout_pack_into(layout_object *self, PyObject *args)
+{
+    PyObject *values;
+    Py_buffer view;
+    Py_ssize_t pos;
+    int result = -1;
+
+    if (PyTuple_GET_SIZE(args) < 2) {
+        PyErr_SetString(PyExc_TypeError, "pack_into expects buffer, offset and values");
+        return NULL;
+    }
+    pos = PyNumber_AsSsize_t(PyTuple_GET_ITEM(args, 1), PyExc_OverflowError);
+    if (pos == -1 && PyErr_Occurred()) {
+        return NULL;
+    }
+    values = PyTuple_GetSlice(args, 2, PyTuple_GET_SIZE(args));
+    if (values == NULL) {
+        return NULL;
+    }
+    if (PyObject_GetBuffer(PyTuple_GET_ITEM(args, 0), &view, PyBUF_WRITABLE) == 0) {
+        if (check_span(view.len, pos, self->size, "pack_into") == 0) {
+            result = layout_pack(self, (unsigned char *)view.buf + pos, values);
+        }
+        PyBuffer_Release(&view);
+    }
+    Py_DECREF(values);
+    if (result < 0) {
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+layout_get_size(layout_object *self, void *closure)
+{
+    return PyLong_FromSsize_t(self->size);
+}
+
+static PyObject *
+layout_get_format(layout_object *self, void *closure)
+{
+    Py_INCREF(self->format);
+    return self->format;
+}
+
+static PyMethodDef layout_methods[] = {
+    {"unpack_from", (PyCFunction)(void (*)(void))layout_unpack_from, METH_VARARGS | METH_KEYWORDS,
+     "Returns tuple of values unpacked from buffer at offset."},
+    {"pack_into", (PyCFunction)layout_pack_into, METH_VARARGS,
+     "Packs values into writable buffer at offset."},
+    {NULL, NULL, 0, NULL}
+};
+
+static PyGetSetDef layout_getset[] = {
+    {"size", (getter)layout_get_size, NULL, "Number of bytes values take.", NULL},
+    {"format", (getter)layout_get_format, NULL, "Format layout was compiled from.", NULL},
+    {NULL, NULL, NULL, NULL, NULL}
+};
+
+static PyTypeObject layout_type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "prophy._speedups.layout",
+    sizeof(layout_object),
+};
+
+static layout_object *
+as_layout(PyObject *obj)
+{
+    if (!PyObject_TypeCheck(obj, &layout_type)) {
+        PyErr_SetString(PyExc_TypeError, "expected prophy._speedups.layout");
+        return NULL;
+    }
+    return (layout_object *)obj;
+}
+
+static int
+as_ssize(PyObject *obj, Py_ssize_t *value)
+{
+    *value = PyNumber_AsSsize_t(obj, PyExc_OverflowError);
+    return *value == -1 && PyErr_Occurred() ? -1 : 0;
+}
+
+/* Records: messages whose field storage is exactly the values of layout */
+
+static PyObject *
+decode_records(PyObject *self, PyObject *const *args, Py_ssize_t nargs)
+{
+    PyObject *cls, *records;
+    layout_object *layout;
+    input in;
+    Py_ssize_t pos, size, count, i;
+
+    if (check_arguments("decode_records", nargs, 6) < 0 || (layout = as_layout(args[1])) == NULL ||
+        as_ssize(args[3], &pos) < 0 || as_ssize(args[4], &size) < 0 || as_ssize(args[5], &count) < 0) {
+        return NULL;
+    }
+    cls = args[0];
+    if (!PyType_Check(cls)) {
+        PyErr_SetString(PyExc_TypeError, "decode_records expects a class");
+        return NULL;
+    }
+    if (count < 0) {
+        PyErr_SetString(PyExc_ValueError, "decode_records expects non-negative count");
+        return NULL;
+    }
+    if (input_open(&in, args[2]) < 0) {
+        return NULL;
+    }
+    records = PyList_New(count);
+    if (records == NULL) {
+        goto done;
+    }
+    for (i = 0; i < count; i++, pos += size) {
+        PyObject *fields, *record;
+
+        if (check_span(in.len, pos, layout->size, "unpack_from") < 0) {
+            goto error;
+        }
+        fields = layout_unpack(layout, in.buf + pos, 1);
+        if (fields == NULL) {
+            goto error;
+        }
+        record = ((PyTypeObject *)cls)->tp_new((PyTypeObject *)cls, empty_tuple, NULL);
+        if (record == NULL) {
+            Py_DECREF(fields);
+            goto error;
+        }
+        PyList_SET_ITEM(records, i, record);
+        if (PyObject_SetAttr(record, str_fields, fields) < 0) {
+            Py_DECREF(fields);
+            goto error;
+        }
+        Py_DECREF(fields);
+    }
+    goto done;
+
+error:
+    Py_CLEAR(records);
+done:
+    input_close(&in);
+    return records;
+}
+
+static PyObject *
+encode_records(PyObject *self, PyObject *const *args, Py_ssize_t nargs)
+{
+    PyObject *seq;
+    layout_object *layout;
+    Py_buffer view;
+    Py_ssize_t pos, size, i;
+
+    if (check_arguments("encode_records", nargs, 5) < 0 || (layout = as_layout(args[1])) == NULL ||
+        as_ssize(args[3], &pos) < 0 || as_ssize(args[4], &size) < 0) {
+        return NULL;
+    }
+    seq = PySequence_Fast(args[0], "encode_records expects a sequence");
+    if (seq == NULL) {
+        return NULL;
+    }
+    if (PyObject_GetBuffer(args[2], &view, PyBUF_WRITABLE) < 0) {
+        Py_DECREF(seq);
+        return NULL;
+    }
+    for (i = 0; i < PySequence_Fast_GET_SIZE(seq); i++, pos += size) {
+        PyObject *record, *fields, *values;
+        int result;
+
+        if (check_span(view.len, pos, layout->size, "pack_into") < 0) {
+            goto error;
+        }
+        record = PySequence_Fast_GET_ITEM(seq, i);
+        Py_INCREF(record);
+        fields = PyObject_GetAttr(record, str_fields);
+        Py_DECREF(record);
+        if (fields == NULL) {
+            goto error;
+        }
+        /* subclasses of list, like lazily decoded fields, load values on iteration */
+        if (PyList_CheckExact(fields)) {
+            values = fields;
+        } else {
+            values = PySequence_Tuple(fields);
+            Py_DECREF(fields);
+            if (values == NULL) {
+                goto error;
+            }
+        }
+        result = layout_pack(layout, (unsigned char *)view.buf + pos, values);
+        Py_DECREF(values);
+        if (result < 0) {
+            goto error;
+        }
+    }
+    PyBuffer_Release(&view);
+    Py_DECREF(seq);
+    return PyLong_FromSsize_t(pos);
+
+error:
+    PyBuffer_Release(&view);
+    Py_DECREF(seq);
+    return NULL;
+}
+
+FASTCALL(decode_records)
+FASTCALL(encode_records)
+
+/* Run: program of ops coding fused run of fields with a layout */
+
+enum {
+    OP_FIELDS,
+    OP_CHECK,
+    OP_OPTIONAL,
+    OP_ARRAY,
+    OP_COMPOSITE,
+    OP_COMPOSITE_ARRAY,
+    OP_ITEM
+};
+
+static const char *op_names[] = {"fields", "check", "optional", "array", "composite", "composite_array", "item", NULL};
+
+typedef struct {
+    int kind;
+    Py_ssize_t index;     /* index of field */
+    Py_ssize_t count;     /* number of layout values op takes by itself */
+    PyObject *name;       /* name of array or composite field */
+    PyObject *target;     /* check, nested run or item */
+    PyObject *defaults;   /* values of absent array or composite */
+    PyObject *type_name;  /* prefix of errors of nested run */
+} run_op;
+
+typedef struct {
+    PyObject_HEAD
+    PyObject *layouts;
+    run_op *ops;
+    Py_ssize_t count;
+    int sizers;
+} run_object;
+
+static PyTypeObject run_type;
+
+static int
+op_kind(PyObject *name)
+{
+    int kind;
+
+    for (kind = 0; op_names[kind]; kind++) {
+#if PY_MAJOR_VERSION >= 3
+        if (PyUnicode_Check(name) && PyUnicode_CompareWithASCIIString(name, op_names[kind]) == 0) {
+#else
+        if (PyString_Check(name) && strcmp(PyString_AS_STRING(name), op_names[kind]) == 0) {
+#endif
+            return kind;
+        }
+    }
+    PyErr_SetString(PyExc_ValueError, "unknown run op");
+    return -1;
+}
+
+static int
+parse_op(run_op *op, PyObject *spec)
+{
+    PyObject *kind, *target = NULL, *defaults = NULL, *name = NULL, *type_name = NULL;
+    int ok = 0;
+
+    if (!PyTuple_Check(spec) || PyTuple_GET_SIZE(spec) == 0) {
+        PyErr_SetString(PyExc_TypeError, "run op must be a tuple");
+        return -1;
+    }
+    op->kind = op_kind(PyTuple_GET_ITEM(spec, 0));
+    op->count = op->kind == OP_CHECK ? 1 : op->kind == OP_OPTIONAL ? 2 : 0;
+    switch (op->kind) {
+    case OP_FIELDS:
+        ok = PyArg_ParseTuple(spec, "Onn:fields", &kind, &op->index, &op->count);
+        break;
+    case OP_CHECK:
+    case OP_OPTIONAL:
+        ok = PyArg_ParseTuple(spec, "OnO:check", &kind, &op->index, &target);
+        break;
+    case OP_ARRAY:
+        ok = PyArg_ParseTuple(spec, "OnOnO!:array", &kind, &op->index, &name, &op->count,
+                              &PyList_Type, &defaults);
+        break;
+    case OP_COMPOSITE:
+    case OP_COMPOSITE_ARRAY:
+        ok = PyArg_ParseTuple(spec, "OnOO!O!O:composite", &kind, &op->index, &name, &run_type, &target,
+                              &PyList_Type, &defaults, &type_name);
+        break;
+    case OP_ITEM:
+        ok = PyArg_ParseTuple(spec, "OOn:item", &kind, &target, &op->count);
+        break;
+    default:
+        return -1;
+    }
+    if (!ok) {
+        return -1;
+    }
+    if (op->count < 0 || (op->kind == OP_ARRAY && PyList_GET_SIZE(defaults) != op->count)) {
+        PyErr_SetString(PyExc_ValueError, "bad count of values of run op");
+        return -1;
+    }
+    if (target == Py_None) {
+        target = NULL;
+    }
+    Py_XINCREF(target);
+    Py_XINCREF(defaults);
+    Py_XINCREF(name);
+    Py_XINCREF(type_name);
+    op->target = target;
+    op->defaults = defaults;
+    op->name = name;
+    op->type_name = type_name;
+    return 0;
+}
+
+static PyObject *
+run_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
+{
+    static char *keywords[] = {"layouts", "ops", "sizers", NULL};
+    run_object *self;
+    PyObject *layouts, *ops;
+    Py_ssize_t i;
+    int sizers;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!O!i:run", keywords, &PyDict_Type, &layouts,
+                                     &PyList_Type, &ops, &sizers)) {
+        return NULL;
+    }
+    self = (run_object *)type->tp_alloc(type, 0);
+    if (self == NULL) {
+        return NULL;
+    }
+    Py_INCREF(layouts);
+    self->layouts = layouts;
+    self->sizers = sizers;
+    self->ops = PyMem_New(run_op, PyList_GET_SIZE(ops) ? PyList_GET_SIZE(ops) : 1);
+    if (self->ops == NULL) {
+        PyErr_NoMemory();
+        Py_DECREF(self);
+        return NULL;
+    }
+    for (i = 0; i < PyList_GET_SIZE(ops); i++) {
+        if (parse_op(&self->ops[i], PyList_GET_ITEM(ops, i)) < 0) {
+            Py_DECREF(self);
+            return NULL;
+        }
+        self->count++;
+    }
+    return (PyObject *)self;
+}
+
+static void
+run_dealloc(run_object *self)
+{
+    Py_ssize_t i;
+
+    for (i = 0; i < self->count; i++) {
+        Py_XDECREF(self->ops[i].name);
+        Py_XDECREF(self->ops[i].target);
+        Py_XDECREF(self->ops[i].defaults);
+        Py_XDECREF(self->ops[i].type_name);
+    }
+    PyMem_Free(self->ops);
+    Py_XDECREF(self->layouts);
+    Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+static layout_object *
+run_layout(run_object *self, PyObject *endianness)
+{
+    PyObject *layout = PyDict_GetItem(self->layouts, endianness);
+
+    if (layout == NULL) {
+        if (!PyErr_Occurred()) {
+            PyErr_SetObject(PyExc_KeyError, endianness);
+        }
+        return NULL;
+    }
+    return as_layout(layout);
+}
+
+/* Position in values of layout, shared by ops of run and its nested runs. */
+typedef struct {
+    layout_object *layout;
+    unsigned char *base;
+    Py_ssize_t next;
+} cursor;
+
+static const value_format *
+take(cursor *c, Py_ssize_t count)
+{
+    Py_ssize_t next = c->next;
+
+    if (c->layout->count - next < count) {
+        PyErr_Format(struct_error, "layout of %zd values is too short for run", c->layout->count);
+        return NULL;
+    }
+    c->next += count;
+    return &c->layout->values[next];
+}
+
+static PyObject *
+take_values(cursor *c, Py_ssize_t count, int as_list)
+{
+    PyObject *values, *value;
+    const value_format *formats = take(c, count);
+    Py_ssize_t i;
+
+    if (formats == NULL) {
+        return NULL;
+    }
+    values = as_list ? PyList_New(count) : PyTuple_New(count);
+    for (i = 0; values != NULL && i < count; i++) {
+        value = unpack_value(&formats[i], c->base, c->layout->swap);
+        if (value == NULL) {
+            Py_CLEAR(values);
+        } else if (as_list) {
+            PyList_SET_ITEM(values, i, value);
+        } else {
+            PyTuple_SET_ITEM(values, i, value);
+        }
+    }
+    return values;
+}
+
+static int
+put_values(cursor *c, PyObject *values, Py_ssize_t start, Py_ssize_t count)
+{
+    const value_format *formats = take(c, count);
+    PyObject *value;
+    Py_ssize_t i;
+    int result;
+
+    if (formats == NULL) {
+        return -1;
+    }
+    for (i = 0; i < count; i++) {
+        if (start + i >= PySequence_Fast_GET_SIZE(values)) {
+            PyErr_SetString(PyExc_RuntimeError, "values changed size during packing");
+            return -1;
+        }
+        value = PySequence_Fast_GET_ITEM(values, start + i);
+        Py_INCREF(value);
+        result = pack_value(&formats[i], c->base, c->layout->swap, value);
+        Py_DECREF(value);
+        if (result < 0) {
+            return -1;
+        }
+    }
+    return 0;
+}
+
+/* Fields are a list, but lazily decoded fields are a subclass of it, which needs item protocol. */
+
+static PyObject *
+get_field(PyObject *fields, Py_ssize_t index)
+{
+    PyObject *value;
+
+    if (PyList_CheckExact(fields)) {
+        value = PyList_GetItem(fields, index);
+        Py_XINCREF(value);
+        return value;
+    }
+    return PySequence_GetItem(fields, index);
+}
+
+/* Sets field to value, stealing reference to it. */
+static int
+set_field(PyObject *fields, Py_ssize_t index, PyObject *value)
+{
+    int result;
+
+    if (value == NULL) {
+        return -1;
+    }
+    if (PyList_CheckExact(fields)) {
+        return PyList_SetItem(fields, index, value);
+    }
+    result = PySequence_SetItem(fields, index, value);
+    Py_DECREF(value);
+    return result;
+}
+
+static void
+wrap_error(PyObject *type_name)
+{
+    PyObject *type, *value, *traceback, *message;
+
+    if (!PyErr_ExceptionMatches(prophy_error)) {
+        return;
+    }
+    PyErr_Fetch(&type, &value, &traceback);
+    PyErr_NormalizeException(&type, &value, &traceback);
+    message = PyObject_CallMethod(str_wrap, "format", "OO", type_name, value);
+    if (message != NULL) {
+        /* keeps class of error, e.g. ProphyTruncatedError */
+        PyErr_SetObject(type, message);
+        Py_DECREF(message);
+    }
+    Py_XDECREF(type);
+    Py_XDECREF(value);
+    Py_XDECREF(traceback);
+}
+
+static int
+is_nonzero(const value_format *value, const unsigned char *base)
+{
+    Py_ssize_t i;
+
+    for (i = 0; i < value->size; i++) {
+        if (base[value->offset + i]) {
+            return 1;
+        }
+    }
+    return 0;
+}
+
+static int decode_run(run_object *self, PyObject *msg, cursor *c, PyObject *hints);
+
+static int
+decode_nested(run_op *op, PyObject *msg, cursor *c)
+{
+    run_object *run = (run_object *)op->target;
+    PyObject *hints;
+    int result;
+
+    hints = run->sizers ? PyDict_New() : (Py_INCREF(Py_None), Py_None);
+    if (hints == NULL) {
+        return -1;
+    }
+    result = decode_run(run, msg, c, hints);
+    Py_DECREF(hints);
+    if (result < 0) {
+        wrap_error(op->type_name);
+    }
+    return result;
+}
+
+static int
+decode_op(run_op *op, PyObject *msg, PyObject *fields, cursor *c, PyObject *hints)
+{
+    const value_format *formats;
+    PyObject *value, *obj, *items, *elem, *iter;
+    Py_ssize_t i;
+    int result;
+
+    switch (op->kind) {
+    case OP_FIELDS:
+        if ((formats = take(c, op->count)) == NULL) {
+            return -1;
+        }
+        for (i = 0; i < op->count; i++) {
+            if (set_field(fields, op->index + i, unpack_value(&formats[i], c->base, c->layout->swap)) < 0) {
+                return -1;
+            }
+        }
+        return 0;
+    case OP_CHECK:
+        if ((formats = take(c, 1)) == NULL || (value = unpack_value(formats, c->base, c->layout->swap)) == NULL) {
+            return -1;
+        }
+        obj = PyObject_CallFunctionObjArgs(op->target, value, NULL);
+        Py_DECREF(value);
+        return set_field(fields, op->index, obj);
+    case OP_OPTIONAL:
+        if ((formats = take(c, 2)) == NULL) {
+            return -1;
+        }
+        if (!is_nonzero(&formats[0], c->base)) {
+            Py_INCREF(Py_None);
+            return set_field(fields, op->index, Py_None);
+        }
+        value = unpack_value(&formats[1], c->base, c->layout->swap);
+        if (value != NULL && op->target != NULL) {
+            obj = PyObject_CallFunctionObjArgs(op->target, value, NULL);
+            Py_DECREF(value);
+            value = obj;
+        }
+        return set_field(fields, op->index, value);
+    case OP_ARRAY:
+        value = take_values(c, op->count, 0);
+        if (value == NULL) {
+            return -1;
+        }
+        obj = PyObject_GetAttr(msg, op->name);
+        items = obj == NULL ? NULL : PyObject_GetAttr(obj, str_values);
+        Py_XDECREF(obj);
+        result = items == NULL ? -1 : PySequence_SetSlice(items, 0, PY_SSIZE_T_MAX, value);
+        Py_XDECREF(items);
+        Py_DECREF(value);
+        return result;
+    case OP_COMPOSITE:
+        obj = PyObject_GetAttr(msg, op->name);
+        if (obj == NULL) {
+            return -1;
+        }
+        result = decode_nested(op, obj, c);
+        Py_DECREF(obj);
+        return result;
+    case OP_COMPOSITE_ARRAY:
+        obj = PyObject_GetAttr(msg, op->name);
+        if (obj == NULL) {
+            return -1;
+        }
+        iter = PyObject_GetIter(obj);
+        Py_DECREF(obj);
+        if (iter == NULL) {
+            return -1;
+        }
+        result = 0;
+        while (result == 0 && (elem = PyIter_Next(iter)) != NULL) {
+            result = decode_nested(op, elem, c);
+            Py_DECREF(elem);
+        }
+        Py_DECREF(iter);
+        return result < 0 || PyErr_Occurred() ? -1 : 0;
+    case OP_ITEM:
+        value = take_values(c, op->count, 0);
+        if (value == NULL) {
+            return -1;
+        }
+        obj = PyObject_CallMethodObjArgs(op->target, str_distribute, msg, value, int_zero, hints, NULL);
+        Py_DECREF(value);
+        Py_XDECREF(obj);
+        return obj == NULL ? -1 : 0;
+    }
+    return -1;
+}
+
+static int
+decode_run(run_object *self, PyObject *msg, cursor *c, PyObject *hints)
+{
+    PyObject *fields;
+    Py_ssize_t i;
+    int result = 0;
+
+    fields = PyObject_GetAttr(msg, str_fields);
+    if (fields == NULL) {
+        return -1;
+    }
+    for (i = 0; i < self->count && result == 0; i++) {
+        result = decode_op(&self->ops[i], msg, fields, c, hints);
+    }
+    Py_DECREF(fields);
+    return result;
+}
+
+static int encode_run(run_object *self, PyObject *msg, cursor *c);
+
+static int
+encode_array(run_op *op, PyObject *array, cursor *c)
+{
+    PyObject *items, *seq;
+    Py_ssize_t i, length;
+    int result = 0;
+
+    items = PyObject_GetAttr(array, str_values);
+    if (items == NULL) {
+        return -1;
+    }
+    seq = PySequence_Fast(items, "array values must be a sequence");
+    Py_DECREF(items);
+    if (seq == NULL) {
+        return -1;
+    }
+    if (op->kind == OP_COMPOSITE_ARRAY) {
+        for (i = 0; result == 0 && i < PySequence_Fast_GET_SIZE(seq); i++) {
+            PyObject *elem = PySequence_Fast_GET_ITEM(seq, i);
+            Py_INCREF(elem);
+            result = encode_run((run_object *)op->target, elem, c);
+            Py_DECREF(elem);
+        }
+    } else {
+        length = PySequence_Fast_GET_SIZE(seq);
+        if (length > op->count) {
+            PyErr_Format(struct_error, "array of %zd values has more than %zd", length, op->count);
+            result = -1;
+        } else {
+            result = put_values(c, seq, 0, length);
+            if (result == 0) {
+                result = put_values(c, op->defaults, length, op->count - length);
+            }
+        }
+    }
+    Py_DECREF(seq);
+    return result;
+}
+
+static int
+encode_op(run_op *op, PyObject *msg, PyObject *fields, cursor *c)
+{
+    const value_format *formats;
+    PyObject *value, *values, *result_obj;
+    Py_ssize_t i;
+    int result;
+
+    if (op->kind == OP_ITEM) {
+        values = PyList_New(0);
+        if (values == NULL) {
+            return -1;
+        }
+        result_obj = PyObject_CallMethodObjArgs(op->target, str_collect, msg, values, NULL);
+        Py_XDECREF(result_obj);
+        result = -1;
+        if (result_obj != NULL && PyList_GET_SIZE(values) != op->count) {
+            PyErr_Format(struct_error, "pack expected %zd items for packing (got %zd)",
+                         op->count, PyList_GET_SIZE(values));
+        } else if (result_obj != NULL) {
+            result = put_values(c, values, 0, op->count);
+        }
+        Py_DECREF(values);
+        return result;
+    }
+    if (op->kind == OP_FIELDS) {
+        if ((formats = take(c, op->count)) == NULL) {
+            return -1;
+        }
+        for (i = 0; i < op->count; i++) {
+            value = get_field(fields, op->index + i);
+            if (value == NULL) {
+                return -1;
+            }
+            result = pack_value(&formats[i], c->base, c->layout->swap, value);
+            Py_DECREF(value);
+            if (result < 0) {
+                return -1;
+            }
+        }
+        return 0;
+    }
+    value = get_field(fields, op->index);
+    if (value == NULL) {
+        return -1;
+    }
+    switch (op->kind) {
+    case OP_CHECK:
+        formats = take(c, 1);
+        result = formats == NULL ? -1 : pack_value(formats, c->base, c->layout->swap, value);
+        break;
+    case OP_OPTIONAL:
+        formats = take(c, 2);
+        if (formats == NULL) {
+            result = -1;
+        } else if (value == Py_None) {
+            result = 0;
+        } else {
+            result = pack_value(&formats[0], c->base, c->layout->swap, int_one);
+            if (result == 0) {
+                result = pack_value(&formats[1], c->base, c->layout->swap, value);
+            }
+        }
+        break;
+    case OP_COMPOSITE:
+        if (value == Py_None) {
+            result = put_values(c, op->defaults, 0, PyList_GET_SIZE(op->defaults));
+        } else {
+            result = encode_run((run_object *)op->target, value, c);
+        }
+        break;
+    default:
+        if (value == Py_None) {
+            result = put_values(c, op->defaults, 0, PyList_GET_SIZE(op->defaults));
+        } else {
+            result = encode_array(op, value, c);
+        }
+    }
+    Py_DECREF(value);
+    return result;
+}
+
+static int
+encode_run(run_object *self, PyObject *msg, cursor *c)
+{
+    PyObject *fields;
+    Py_ssize_t i;
+    int result = 0;
+
+    fields = PyObject_GetAttr(msg, str_fields);
+    if (fields == NULL) {
+        return -1;
+    }
+    for (i = 0; i < self->count && result == 0; i++) {
+        result = encode_op(&self->ops[i], msg, fields, c);
+    }
+    Py_DECREF(fields);
+    return result;
+}
+
+static PyObject *
+run_decode(PyObject *self, PyObject *const *args, Py_ssize_t nargs)
+{
+    cursor c;
+    input in;
+    Py_ssize_t pos;
+    int result;
+
+    if (check_arguments("decode", nargs, 5) < 0 || as_ssize(args[2], &pos) < 0 ||
+        (c.layout = run_layout((run_object *)self, args[3])) == NULL) {
+        return NULL;
+    }
+    c.next = 0;
+    if (c.layout->size == 0) {
+        /* run of no values doesn't look at data, which may be of any type */
+        c.base = NULL;
+        result = decode_run((run_object *)self, args[0], &c, args[4]);
+    } else {
+        if (input_open(&in, args[1]) < 0) {
+            return NULL;
+        }
+        result = check_span(in.len, pos, c.layout->size, "unpack_from");
+        if (result == 0) {
+            c.base = (unsigned char *)in.buf + pos;
+            result = decode_run((run_object *)self, args[0], &c, args[4]);
+        }
+        input_close(&in);
+    }
+    if (result < 0) {
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static int
+encode_values(run_object *self, PyObject *msg, layout_object *layout, unsigned char *base)
+{
+    cursor c;
+
+    c.layout = layout;
+    c.base = base;
+    c.next = 0;
+    memset(base, 0, layout->size);
+    if (encode_run(self, msg, &c) < 0) {
+        return -1;
+    }
+    if (c.next != layout->count) {
+        PyErr_Format(struct_error, "pack expected %zd items for packing (got %zd)", layout->count, c.next);
+        return -1;
+    }
+    return 0;
+}
+
+static PyObject *
+run_encode(PyObject *self, PyObject *const *args, Py_ssize_t nargs)
+{
+    PyObject *buf, *packed;
+    layout_object *layout;
+    Py_buffer view;
+    Py_ssize_t pos, end;
+    int result = -1;
+
+    if (check_arguments("encode", nargs, 4) < 0 || as_ssize(args[2], &pos) < 0 ||
+        (layout = run_layout((run_object *)self, args[3])) == NULL) {
+        return NULL;
+    }
+    buf = args[1];
+    if (PyObject_GetBuffer(buf, &view, PyBUF_WRITABLE) < 0) {
+        return NULL;
+    }
+    end = pos + layout->size;
+    if (pos >= 0 && view.len >= end) {
+        result = encode_values((run_object *)self, args[0], layout, (unsigned char *)view.buf + pos);
+        PyBuffer_Release(&view);
+    } else {
+        /* grows buffer of encode, which may be shorter than message */
+        PyBuffer_Release(&view);
+        packed = PyBytes_FromStringAndSize(NULL, layout->size);
+        if (packed != NULL) {
+            result = encode_values((run_object *)self, args[0], layout, (unsigned char *)PyBytes_AS_STRING(packed));
+            if (result == 0) {
+                result = PySequence_SetSlice(buf, pos, end, packed);
+            }
+            Py_DECREF(packed);
+        }
+    }
+    if (result < 0) {
+        return NULL;
+    }
+    return PyLong_FromSsize_t(end);
+}
+
+FASTCALL(run_decode)
+FASTCALL(run_encode)
+
+static PyMethodDef run_methods[] = {
+    {"decode", (PyCFunction)(void (*)(void))run_decode_call, FASTCALL_FLAGS,
+     "decode(msg, data, pos, endianness, hints): decodes run from data at position into message."},
+    {"encode", (PyCFunction)(void (*)(void))run_encode_call, FASTCALL_FLAGS,
+     "encode(msg, buf, pos, endianness): encodes run of message into buffer, returns end position."},
+    {NULL, NULL, 0, NULL}
+};
+
+static PyTypeObject run_type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "prophy._speedups.run",
+    sizeof(run_object),
+};
+
+static PyMethodDef speedups_methods[] = {
+    {"decode_records", (PyCFunction)(void (*)(void))decode_records_call, FASTCALL_FLAGS,
+     "Decodes consecutive fixed records into new messages."},
+    {"encode_records", (PyCFunction)(void (*)(void))encode_records_call, FASTCALL_FLAGS,
+     "Encodes messages as consecutive fixed records."},
+    {NULL, NULL, 0, NULL}
+};
+
+static int
+init_constants(void)
+{
+    PyObject *module;
+
+#if PY_MAJOR_VERSION >= 3
+    str_fields = PyUnicode_InternFromString("_fields");
+    str_values = PyUnicode_InternFromString("_values");
+    str_collect = PyUnicode_InternFromString("collect");
+    str_distribute = PyUnicode_InternFromString("distribute");
+    str_wrap = PyUnicode_FromString("{}: {}");
+#else
+    str_fields = PyString_InternFromString("_fields");
+    str_values = PyString_InternFromString("_values");
+    str_collect = PyString_InternFromString("collect");
+    str_distribute = PyString_InternFromString("distribute");
+    str_wrap = PyString_FromString("{}: {}");
+#endif
+    empty_tuple = PyTuple_New(0);
+    int_zero = int_from_long(0);
+    int_one = int_from_long(1);
+    if (!(str_fields && str_values && str_collect && str_distribute && str_wrap && empty_tuple &&
+          int_zero && int_one)) {
+        return -1;
+    }
+
+    module = PyImport_ImportModule("struct");
+    if (module == NULL) {
+        return -1;
+    }
+    struct_error = PyObject_GetAttrString(module, "error");
+    Py_DECREF(module);
+    module = PyImport_ImportModule("prophy.exception");
+    if (module == NULL) {
+        return -1;
+    }
+    prophy_error = PyObject_GetAttrString(module, "ProphyError");
+    Py_DECREF(module);
+    if (!(struct_error && prophy_error)) {
+        return -1;
+    }
+
+    layout_type.tp_dealloc = (destructor)layout_dealloc;
+    layout_type.tp_flags = Py_TPFLAGS_DEFAULT;
+    layout_type.tp_doc = "layout(format): values of struct module format with explicit byte order.";
+    layout_type.tp_methods = layout_methods;
+    layout_type.tp_getset = layout_getset;
+    layout_type.tp_new = layout_new;
+    run_type.tp_dealloc = (destructor)run_dealloc;
+    run_type.tp_flags = Py_TPFLAGS_DEFAULT;
+    run_type.tp_doc = "run(layouts, ops, sizers): program coding fused run, with layouts per endianness.";
+    run_type.tp_methods = run_methods;
+    run_type.tp_new = run_new;
+    if (PyType_Ready(&layout_type) < 0 || PyType_Ready(&run_type) < 0) {
+        return -1;
+    }
+    return 0;
+}
+
+static int
+add_types(PyObject *module)
+{
+    Py_INCREF(&layout_type);
+    if (PyModule_AddObject(module, "layout", (PyObject *)&layout_type) < 0) {
+        Py_DECREF(&layout_type);
+        return -1;
+    }
+    Py_INCREF(&run_type);
+    if (PyModule_AddObject(module, "run", (PyObject *)&run_type) < 0) {
+        Py_DECREF(&run_type);
+        return -1;
+    }
+    return 0;
+}
+
+#if PY_MAJOR_VERSION >= 3
+
+static struct PyModuleDef speedups_module = {
+    PyModuleDef_HEAD_INIT, "_speedups", NULL, -1, speedups_methods
+};
+
+PyMODINIT_FUNC
+PyInit__speedups(void)
+{
+    PyObject *module;
+
+    if (init_constants() < 0) {
+        return NULL;
+    }
+    module = PyModule_Create(&speedups_module);
+    if (module != NULL && add_types(module) < 0) {
+        Py_CLEAR(module);
+    }
+    return module;
+}
+
+#else
+
+PyMODINIT_FUNC
+init_speedups(void)
+{
+    PyObject *module;
+
+    if (init_constants() < 0) {
+        return;
+    }
+    module = Py_InitModule("_speedups", speedups_methods);
+    if (module != NULL) {
+        add_types(module);
+    }
+}
+
+#endif
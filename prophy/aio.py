@@ -0,0 +1,122 @@
+import asyncio
+import collections
+
+from .exception import ProphyError
+from .stream import DEFAULT_MAX_SIZE, stream_decoder
+
+
+class message_protocol(asyncio.Protocol):
+    """
+        Protocol exchanging back to back messages of given struct or union class.
+
+        Received messages are queued and handed out by `receive`; reading from the
+        transport is paused while `max_queued` messages wait. Messages passed to `send`
+        within one event loop iteration are encoded into one buffer and written at once.
+    """
+
+    def __init__(self, cls, endianness, max_queued=64, max_size=DEFAULT_MAX_SIZE):
+        self.endianness = endianness
+        self.max_queued = max_queued
+        self.transport = None
+        self._loop = None
+        self._decoder = stream_decoder(cls, endianness, max_size)
+        self._received = collections.deque()
+        self._receiver = None
+        self._reading_paused = False
+        self._closed = False
+        self._exception = None
+        self._outgoing = bytearray()
+        self._drainers = []
+        self._writing_paused = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self._loop = asyncio.get_event_loop()
+
+    def connection_lost(self, exc):
+        self._closed = True
+        if exc and not self._exception:
+            self._exception = exc
+        self._deliver()
+        self.resume_writing()
+
+    def data_received(self, data):
+        try:
+            messages = self._decoder.feed(data)
+        except ProphyError as e:
+            self._exception = e
+            self.transport.close()
+            self._deliver()
+            return
+        self._received.extend(messages)
+        self._deliver()
+        if len(self._received) >= self.max_queued and not self._reading_paused:
+            self._reading_paused = True
+            self.transport.pause_reading()
+
+    def eof_received(self):
+        self._closed = True
+        self._deliver()
+
+    def receive(self):
+        """ Returns future of next message, resolved with None at end of stream. """
+        if self._receiver is not None and not self._receiver.done():
+            raise ProphyError("message already awaited")
+        self._receiver = self._loop.create_future()
+        receiver = self._receiver
+        self._deliver()
+        return receiver
+
+    def send(self, msg):
+        """ Queues message for writing, nothing of it is queued if it fails to encode. """
+        start = len(self._outgoing)
+        try:
+            msg._encode_into(self._outgoing, start, self.endianness)
+        except Exception:
+            del self._outgoing[start:]
+            raise
+        if not start:
+            self._loop.call_soon(self._flush)
+
+    def drain(self):
+        """ Returns future resolved once transport accepts more data. """
+        future = self._loop.create_future()
+        if self._writing_paused:
+            self._drainers.append(future)
+        else:
+            future.set_result(None)
+        return future
+
+    def pause_writing(self):
+        self._writing_paused = True
+
+    def resume_writing(self):
+        self._writing_paused = False
+        drainers, self._drainers = self._drainers, []
+        for drainer in drainers:
+            if not drainer.done():
+                drainer.set_result(None)
+
+    def _flush(self):
+        if self._outgoing and not self.transport.is_closing():
+            self.transport.write(bytes(self._outgoing))
+        del self._outgoing[:]
+
+    def _deliver(self):
+        receiver = self._receiver
+        if receiver is None:
+            return
+        if receiver.done():
+            self._receiver = None
+        elif self._received:
+            self._receiver = None
+            receiver.set_result(self._received.popleft())
+            if self._reading_paused and len(self._received) < self.max_queued // 2 + 1:
+                self._reading_paused = False
+                self.transport.resume_reading()
+        elif self._exception:
+            self._receiver = None
+            receiver.set_exception(self._exception)
+        elif self._closed:
+            self._receiver = None
+            receiver.set_result(None)
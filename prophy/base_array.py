@@ -25,5 +25,43 @@ class base_array(prophy_data_object):
     def __repr__(self):
         return repr(self._values)
 
+    @classmethod
+    def _from_sequence(cls, values):
+        array = cls()
+        array[:] = values._values if isinstance(values, base_array) else values
+        return array
+
+    @classmethod
+    def _from_values(cls, values):
+        array = cls.__new__(cls)
+        array._values = list(values)
+        return array
+
+    def _to_list(self):
+        return list(self._values)
+
+    def _clone(self):
+        copy = self.__class__.__new__(self.__class__)
+        copy._values = self._values[:]
+        return copy
+
+    def _snapshot(self):
+        """ State of array, by which `_unchanged` tells whether it was modified since. """
+        if issubclass(self._TYPE, float):
+            # equal floats may differ in encoding
+            return self._encode_impl("<")
+        return self._values[:]
+
+    def _unchanged(self, snapshot):
+        if issubclass(self._TYPE, float):
+            return self._encode_impl("<") == snapshot
+        return self._values == snapshot
+
+    def _encode_into(self, buf, pos, endianness):
+        data = self._encode_impl(endianness)
+        end = pos + len(data)
+        buf[pos:end] = data
+        return end
+
     def sort(self, key_function=lambda x: x):
         self._values.sort(key=key_function)
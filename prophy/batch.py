@@ -0,0 +1,177 @@
+"""
+    Coding of many messages at once.
+
+    Messages of fixed layout class, coded entirely by one fused run of its codec plan,
+    are unpacked in chunks with a struct.Struct of run's format repeated per record.
+    Values of each field are then strided slices of unpacked tuple, so no per-record
+    Python objects are created. Consecutive messages of such class are encoded as
+    records when possible, see prophy/records.py.
+"""
+import collections
+import itertools
+import struct
+
+from .composite import codec_kind
+from .exception import ProphyError, ProphyTruncatedError, prefixed
+from .plan import _array_item, _composite_array_item, _composite_item, _optional_item
+from .records import encode_records
+from .scalar import ENDIANNESS_PREFIXES
+from .six import xrange
+
+CHUNK = 4096
+
+
+def _fixed(run):
+    return not run.sizers and all(_fixed(item.run) for item in run.items if isinstance(item, _composite_item))
+
+
+def _checked(column, check):
+    def checked(flat, width, offset):
+        values = column(flat, width, offset)
+        for value in set(values):
+            if value is not None:
+                check(value)
+        return values
+    return checked
+
+
+def _scalar_column(index):
+    def column(flat, width, offset):
+        return flat[offset + index::width]
+    return column
+
+
+def _optional_column(index):
+    def column(flat, width, offset):
+        start = offset + index
+        return [value if present else None for present, value in zip(flat[start::width], flat[start + 1::width])]
+    return column
+
+
+def _array_column(index, size):
+    def column(flat, width, offset):
+        start = offset + index
+        return list(zip(*[flat[start + i::width] for i in xrange(size)]))
+    return column
+
+
+def _elements_column(elem_column, index, elem_width, size):
+    def column(flat, width, offset):
+        start = offset + index
+        return list(zip(*[elem_column(flat, width, start + i * elem_width) for i in xrange(size)]))
+    return column
+
+
+def _check_elements(check):
+    def check_all(values):
+        for value in values:
+            check(value)
+    return check_all
+
+
+def _leaves(run, prefix, index):
+    """
+        Returns columns of run's fields, whose values start at `index`, and index past them.
+        Columns are (name, function) pairs, function taking flat values of records, number
+        of values per record and offset of values of enclosing array element.
+    """
+    leaves = []
+    for item, (field, _, _) in zip(run.items, run.layout):
+        name = prefix + field.name
+        if isinstance(item, _composite_array_item):
+            elem_leaves, elem_width = _leaves(item.run, "", 0)
+            size = len(item.defaults) // elem_width if elem_width else 0
+            for elem_name, elem_column in elem_leaves:
+                leaves.append(("{}.{}".format(name, elem_name),
+                               _elements_column(elem_column, index, elem_width, size)))
+            index += len(item.defaults)
+        elif isinstance(item, _composite_item):
+            nested, index = _leaves(item.run, name + ".", index)
+            leaves += nested
+        elif isinstance(item, _optional_item):
+            column = _optional_column(index)
+            if codec_kind.is_enum(field.type):
+                column = _checked(column, item.check)
+            leaves.append((name, column))
+            index += 2
+        elif isinstance(item, _array_item):
+            column = _array_column(index, item.size)
+            if codec_kind.is_enum(item.type):
+                column = _checked(column, _check_elements(item.type._check))
+            leaves.append((name, column))
+            index += item.size
+        else:
+            column = _scalar_column(index)
+            if codec_kind.is_enum(field.type):
+                column = _checked(column, item.check)
+            leaves.append((name, column))
+            index += 1
+    return leaves, index
+
+
+def decode_many(cls, data, endianness, count=None):
+    """
+        Decodes `count` consecutive messages of fixed layout class, or as many as data holds,
+        into columns: ordered dict mapping field names, dotted within nested structs, to lists
+        of their values. Array values are tuples, absent optional ones are None.
+    """
+    plan = getattr(cls, "_codec_plan", None)
+    if plan is None or not plan.fused or not plan.size or not _fixed(plan.fused):
+        raise ProphyError("{} has no fixed layout".format(cls.__name__))
+    size = plan.size
+    if count is None:
+        count, remainder = divmod(len(data), size)
+        if remainder:
+            raise ProphyError("not all bytes of {} read".format(cls.__name__))
+    elif count * size > len(data):
+        raise ProphyTruncatedError("too few bytes to decode {}".format(cls.__name__))
+
+    leaves, width = _leaves(plan.fused, "", 0)
+    columns = collections.OrderedDict((name, []) for name, _ in leaves)
+    prefix = ENDIANNESS_PREFIXES[endianness]
+    unpacker = None
+    for start in xrange(0, count, CHUNK):
+        records = min(CHUNK, count - start)
+        if unpacker is None or unpacker.size != records * size:
+            unpacker = struct.Struct(prefix + plan.fused.format * records)
+        flat = unpacker.unpack_from(data, start * size)
+        try:
+            for name, column in leaves:
+                columns[name] += column(flat, width, 0)
+        except ProphyError as e:
+            raise prefixed(e, cls.__name__)
+    return columns
+
+
+def _class_id(msg):
+    return id(msg.__class__)
+
+
+def encode_many(messages, endianness):
+    """
+        Encodes messages one after another into single preallocated buffer.
+        Returns the bytearray and list of offsets of messages within it.
+    """
+    groups = [list(group) for _, group in itertools.groupby(messages, _class_id)]
+    offsets = []
+    size = 0
+    for group in groups:
+        plan = getattr(group[0], "_codec_plan", None)
+        if plan is not None and plan.fused and plan.size:
+            offsets += xrange(size, size + plan.size * len(group), plan.size)
+            size += plan.size * len(group)
+        else:
+            for msg in group:
+                offsets.append(size)
+                size += msg.encoded_size()
+
+    buf = bytearray(size)
+    pos = 0
+    for group in groups:
+        plan = getattr(group[0], "_codec_plan", None)
+        if plan is not None and plan.records:
+            pos = encode_records(group, plan.records[endianness], buf, pos, plan.size)
+        else:
+            for msg in group:
+                pos = msg._encode_into(buf, pos, endianness)
+    return buf, offsets
@@ -0,0 +1,237 @@
+"""
+    Generation of specialized Python codecs from codec plans.
+
+    Steps of plan are unrolled into straight-line source of encoder and decoder
+    functions, with paddings, field indices and struct.Struct objects inlined as
+    constants, which is then compiled with exec. Generation is on unless
+    PROPHY_CODEGEN=0 is set in environment; with PROPHY_CODEGEN_DUMP=1 generated
+    source is written to stderr. Source is also kept in `codec_plan.source`.
+"""
+import itertools
+import linecache
+import os
+import struct
+import sys
+
+from .composite import as_bytes, codec_kind, write_padding
+from .plan import (
+    _array_item,
+    _bytes_item,
+    _fallback,
+    _no_hints,
+    _optional_item,
+    _scalar_item,
+    _sizer_item,
+    decode_fields,
+    field_step,
+    fused_run,
+    padding_step
+)
+
+enabled = os.environ.get("PROPHY_CODEGEN", "1") != "0"
+dump = os.environ.get("PROPHY_CODEGEN_DUMP", "0") != "0"
+
+# numbers filenames of generated sources, which classes of the same name would share otherwise
+_serial = itertools.count(1)
+
+
+class _source(object):
+    """ Lines of generated function and namespace of constants they refer to. """
+
+    def __init__(self, namespace):
+        self.lines = []
+        self.level = 1
+        self.namespace = namespace
+
+    def __call__(self, line):
+        self.lines.append("    " * self.level + line)
+
+    def const(self, prefix, value):
+        name = "%s%d" % (prefix, len(self.namespace))
+        self.namespace[name] = value
+        return name
+
+    def pad(self, alignment, encoding):
+        if alignment <= 1:
+            return
+        if encoding:
+            self("pos = write_padding(buf, pos, pos + (base - pos) %% %d)" % alignment)
+        else:
+            self("pos += -pos %% %d" % alignment)
+
+
+def _unchecked(item, field):
+    """ Decoded numbers are within type bounds, only enumerators need to be checked. """
+    return item.__class__ is _scalar_item and not codec_kind.is_enum(field.type)
+
+
+def _encode_run(src, run):
+    src.pad(run.alignment, encoding=True)
+    if run.native:
+        src("pos = %s.encode(msg, buf, pos, endianness)" % src.const("native", run.native))
+        return
+    args = []
+    chunks = []
+    for item in run.items:
+        if item.__class__ is _scalar_item:
+            args.append("f[%d]" % item.index)
+        elif item.__class__ is _bytes_item:
+            args.append("as_bytes(f[%d] or b'')" % item.index)
+        elif item.__class__ is _optional_item:
+            src("o%d = f[%d]" % (item.index, item.index))
+            args.append("0 if o{0} is None else 1, 0 if o{0} is None else o{0}".format(item.index))
+        elif item.__class__ is _sizer_item:
+            shift = item.type._BOUND_SHIFT
+            args.append("%s.evaluate_size(msg)" % src.const("sizer", item.type) + (" + %d" % shift if shift else ""))
+        else:
+            chunks.append((args, src.const("item", item)))
+            args = []
+    packer = src.const("structs", run.structs)
+    src("packer = %s[endianness]" % packer)
+    if chunks:
+        src("values = []")
+        for chunk_args, item in chunks:
+            if chunk_args:
+                src("values += (%s,)" % ", ".join(chunk_args))
+            src("%s.collect(msg, values)" % item)
+        if args:
+            src("values += (%s,)" % ", ".join(args))
+        args = ["*values"]
+    arguments = "".join(", " + arg for arg in args)
+    src("end = pos + %d" % run.size)
+    src("if len(buf) >= end:")
+    src("    packer.pack_into(buf, pos%s)" % arguments)
+    src("else:")
+    src("    buf[pos:end] = packer.pack(%s)" % arguments[2:])
+    src("pos = end")
+
+
+def _decode_run(src, run):
+    src.pad(run.alignment, encoding=False)
+    src("try:")
+    src.level += 1
+    if run.views:
+        src("if isinstance(data, memoryview):")
+        src("    raise _fallback()")
+    items = [(item, field) for item, (field, _, _) in zip(run.items, run.layout)]
+    if run.native:
+        src("%s.decode(msg, data, pos, endianness, hints)" % src.const("native", run.native))
+        items = []
+    elif run.size:
+        src("v = %s[endianness].unpack_from(data, pos)" % src.const("structs", run.structs))
+    else:
+        src("v = ()")
+    index = 0
+    while items:
+        item, field = items.pop(0)
+        if _unchecked(item, field):
+            count = 1
+            while items and _unchecked(*items[0]) and items[0][0].index == item.index + count:
+                items.pop(0)
+                count += 1
+            if count == 1:
+                src("f[%d] = v[%d]" % (item.index, index))
+            else:
+                src("f[%d:%d] = v[%d:%d]" % (item.index, item.index + count, index, index + count))
+            index += count
+        elif item.__class__ is _scalar_item:
+            src("f[%d] = %s(v[%d])" % (item.index, src.const("check", item.check), index))
+            index += 1
+        elif item.__class__ is _optional_item and item.check is None:
+            src("f[%d] = v[%d] if v[%d] else None" % (item.index, index + 1, index))
+            index += 2
+        elif item.__class__ is _optional_item:
+            check = src.const("check", item.check)
+            src("f[%d] = %s(v[%d]) if v[%d] else None" % (item.index, check, index + 1, index))
+            index += 2
+        elif item.__class__ is _sizer_item:
+            src("length = %s._decode_length(v[%d])" % (src.const("sizer", item.type), index))
+            for name in item.type._BOUND:
+                src("hints[%r] = length" % name)
+            index += 1
+        else:
+            src("%s.distribute(msg, v, %d, hints)" % (src.const("item", item), index))
+            index += _item_values(item)
+    src.level -= 1
+    src("except (struct_error, _fallback):")
+    src("    decode_fields(msg, %s, data, pos, endianness, hints)" % src.const("layout", run.layout))
+    src("pos += %d" % run.size)
+
+
+def _item_values(item):
+    """ Number of values bytes, array or composite item takes from run's tuple. """
+    if item.__class__ is _bytes_item:
+        return 1
+    if item.__class__ is _array_item:
+        return item.size
+    return len(item.defaults)
+
+
+def _encode_field(src, step):
+    field = step.field
+    src.pad(step.alignment, encoding=True)
+    if codec_kind.classify(field.type) in (codec_kind.ARRAY, codec_kind.COMPOSITE):
+        src("pos = getattr(msg, %r)._encode_into(buf, pos, endianness)" % field.name)
+    else:
+        src("pos = %s(msg, %s, buf, pos, endianness)" % (src.const("write", step.write), src.const("field", field)))
+    src.pad(step.partial_alignment, encoding=True)
+
+
+def _decode_field(src, step):
+    field = step.field
+    src.pad(step.alignment, encoding=False)
+    src("pos += %s(msg, %r, %s, data, pos, endianness, hints)" %
+        (src.const("decode", field.decode_fcn), field.name, src.const("type", field.type)))
+    src.pad(step.partial_alignment, encoding=False)
+
+
+def _compile(cls, encoder, decoder):
+    name = cls.__name__
+    source = "\n".join(
+        ["def encode_%s(msg, buf, pos, endianness):" % name] + encoder.lines + ["", ""] +
+        ["def decode_%s(msg, data, pos, endianness):" % name] + decoder.lines + [""]
+    )
+    filename = "<prophy codec %s.%s #%d>" % (cls.__module__, name, next(_serial))
+    linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+    namespace = dict(encoder.namespace)
+    exec(compile(source, filename, "exec"), namespace)
+    return source, namespace["encode_%s" % name], namespace["decode_%s" % name]
+
+
+def generate_codecs(plan, cls):
+    """ Replaces plan's encoder and decoder with functions generated from its steps. """
+    namespace = {
+        "as_bytes": as_bytes,
+        "write_padding": write_padding,
+        "decode_fields": decode_fields,
+        "struct_error": struct.error,
+        "_fallback": _fallback,
+        "_no_hints": _no_hints,
+        "plan": plan,
+    }
+    encoder = _source(namespace)
+    decoder = _source(namespace)
+
+    encoder("f = msg._fields")
+    encoder("base = pos")
+    decoder("hints = {}" if plan.sizers else "hints = _no_hints")
+    if plan.alignment > 1:
+        decoder("if pos %% %d:" % plan.alignment)
+        decoder("    return plan.decode_steps(msg, data, pos, endianness)")
+    decoder("f = msg._fields")
+    for step in plan.steps:
+        if isinstance(step, fused_run):
+            _encode_run(encoder, step)
+            _decode_run(decoder, step)
+        elif isinstance(step, field_step):
+            _encode_field(encoder, step)
+            _decode_field(decoder, step)
+        elif isinstance(step, padding_step):
+            encoder.pad(step.alignment, encoding=True)
+            decoder.pad(step.alignment, encoding=False)
+    encoder("return pos")
+    decoder("return pos")
+
+    plan.source, plan.encoder, plan.decoder = _compile(cls, encoder, decoder)
+    if dump:
+        sys.stderr.write("# codec of %s\n%s\n" % (cls.__name__, plan.source))
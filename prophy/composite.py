@@ -1,104 +1,248 @@
 from .base_array import base_array
 from .composite_base import _composite_base
-from .exception import ProphyError
-from .scalar import enum
+from .exception import ProphyError, ProphyTruncatedError, prefixed
+from .scalar import enum, prophy_data_object
 from .six import repr_bytes, long
 
 
+def as_bytes(value):
+    """ Bytes fields decoded from memoryview hold its slices, materialized here when needed. """
+    return value.tobytes() if isinstance(value, memoryview) else value
+
+
+def take_bytes(data, start, end):
+    """ Slices data keeping memoryview input as view, copying other buffers into bytes. """
+    value = data[start:end]
+    return bytes(value) if isinstance(value, bytearray) else value
+
+
 def distance_to_next_multiply(number, alignment):
     remainer = number % alignment
     return (alignment - remainer) % alignment
 
 
-def field_to_string(name, type_, value):
-    single_indent_level = " " * 2
+def write_padding(buf, pos, end):
+    if end <= pos:
+        return pos
+    buf[pos:end] = b"\x00" * (end - pos)
+    return end
+
+
+INDENT = "  "
 
-    def indent(text):
-        return '\n'.join(x and single_indent_level + x or '' for x in text.split('\n'))
 
+def write_field(write, indent, name, type_, value, limit):
+    """ Writes text lines of field by `write` function, nested structs indented one level more. """
     if issubclass(type_, base_array):
-        return "".join(field_to_string(name, type_._TYPE, elem) for elem in value)
+        write_array(write, indent, name, type_._TYPE, value, limit)
     elif issubclass(type_, (struct, union)):
-        return "%s {\n%s}\n" % (name, indent(str(value)))
+        write("%s%s {\n" % (indent, name))
+        value._write_text(write, indent + INDENT, limit)
+        write("%s}\n" % indent)
     elif issubclass(type_, bytes):
-        return "%s: %s\n" % (name, repr_bytes(value))
+        write("%s%s: %s\n" % (indent, name, repr_bytes(as_bytes(value))))
     elif issubclass(type_, enum):
-        return "%s: %s\n" % (name, type_._int_to_name[value])
+        write("%s%s: %s\n" % (indent, name, type_._int_to_name[value]))
     else:
-        return "%s: %s\n" % (name, value)
+        write("%s%s: %s\n" % (indent, name, value))
+
+
+def write_array(write, indent, name, type_, values, limit):
+    """ Writes line per element, up to `limit` elements followed by a line counting the rest. """
+    shown = values if limit is None or len(values) <= limit else values[:limit]
+    if issubclass(type_, (struct, union)):
+        for value in shown:
+            write_field(write, indent, name, type_, value, limit)
+    else:
+        lead = "%s%s: " % (indent, name)
+        if issubclass(type_, enum):
+            shown = [type_._int_to_name[value] for value in shown]
+        write("".join(["%s%s\n" % (lead, value) for value in shown]))
+    if len(shown) < len(values):
+        write("%s%s: ... (%d more)\n" % (indent, name, len(values) - len(shown)))
+
+
+def composite_value(type_, value):
+    """ Instance of composite type made from dict of field values or copied from instance. """
+    if isinstance(value, dict):
+        return type_.from_dict(value)
+    if value.__class__ is type_:
+        return value._clone()
+    base = type_.__bases__[0] if type_._OPTIONAL else type_
+    if not isinstance(value, base):
+        raise ProphyError("not a {} or dict".format(base.__name__))
+    copy = type_.__new__(type_)
+    copy._fields = value._clone_fields()
+    return copy
+
+
+def plain_value(value):
+    if isinstance(value, _composite_base):
+        return value.to_dict()
+    if isinstance(value, base_array):
+        return value._to_list()
+    return as_bytes(value)
 
 
 class struct(_composite_base):
-    _padding_byte = b'\x00'
     __slots__ = []
 
-    def __init__(self):
-        self._fields = {}
+    def __init__(self, **fields):
+        self._fields = self._field_defaults[:]
+        if fields:
+            self._fill(fields)
+
+    def _fill(self, values):
+        converters = self._field_converters
+        fields = self._fields
+        for name, value in values.items():
+            if name not in converters:
+                raise AttributeError("'{}' object has no attribute '{}'".format(self.__class__.__name__, name))
+            index, convert = converters[name]
+            fields[index] = convert(value)
+
+    def to_dict(self):
+        return {name: plain_value(getattr(self, name)) for name in self._field_converters}
+
+    def _equals(self, other):
+        lhs, rhs = self._fields, other._fields
+        if lhs.__class__ is lazy_fields and rhs.__class__ is lazy_fields and lhs.is_clean() and rhs.is_clean():
+            if lhs.end - lhs.start != rhs.end - rhs.start:
+                return False
+            if lhs.endianness == rhs.endianness and lhs.source() == rhs.source():
+                return True
+        if self._FLOATING:
+            # equal floats may be encoded differently, so equality follows encoding like digest
+            same = self._same_encoding(other)
+            if same is not None:
+                return same
+        lhs, rhs = list(lhs), list(rhs)
+        for index in self._nested_indices:
+            if (lhs[index] is None) != (rhs[index] is None) and not self._descriptor[index].type._OPTIONAL:
+                name = self._descriptor[index].name
+                lhs[index], rhs[index] = getattr(self, name), getattr(other, name)
+        return lhs == rhs
+
+    def digest(self):
+        """ Digest of lazily decoded struct is kept as long as it's encoded by copying source bytes. """
+        fields = self._fields
+        if fields.__class__ is lazy_fields:
+            if not fields.is_clean():
+                return self._encoding_digest()
+            if fields.digest is None:
+                fields.digest = self._encoding_digest()
+            return fields.digest
+        return super(struct, self).digest()
 
-    def __str__(self):
-        def to_str():
-            for field in self._descriptor:
-                value = getattr(self, field.name, None)
-                if value is not None:
-                    yield field_to_string(field.name, field.type, value)
-
-        return "".join(to_str())
+    @classmethod
+    def unchecked(cls, **fields):
+        """
+            Creates message storing given field values as they are, for producers which
+            validated them already. Arrays may be given as sequences of values, structs
+            and unions as instances, which are not copied.
+        """
+        msg = cls.__new__(cls)
+        msg._fields = storage = cls._field_defaults[:]
+        converters = cls._field_converters
+        try:
+            for name, value in fields.items():
+                storage[converters[name][0]] = value
+        except KeyError:
+            raise AttributeError("'{}' object has no attribute '{}'".format(cls.__name__, name))
+        for index in cls._nested_indices:
+            value = storage[index]
+            if value is None:
+                continue
+            field = cls._descriptor[index]
+            if not isinstance(value, prophy_data_object):
+                if not codec_kind.is_array(field.type):
+                    raise ProphyError("unchecked {} field must be given as instance".format(field.name))
+                value = storage[index] = field.type._from_values(value)
+            if codec_kind.is_array(field.type) and field.type._max_len:
+                # encoding trusts lengths of fixed and limited arrays, unlike their values
+                if len(value) > field.type._max_len or not field.type._BOUND and len(value) < field.type._max_len:
+                    raise ProphyError("unchecked {} field must have {} {} elements".format(
+                        field.name, "up to" if field.type._BOUND else "exactly", field.type._max_len))
+        return msg
+
+    def _write_text(self, write, indent, limit):
+        for field in self._descriptor:
+            value = getattr(self, field.name, None)
+            if value is not None:
+                write_field(write, indent, field.name, field.type, value, limit)
 
     @classmethod
     def get_descriptor(cls):
         return [field.descriptor_info for field in cls._descriptor]
 
-    @classmethod
-    def _get_padding(cls, offset, alignment):
-        return cls._padding_byte * cls._get_padding_size(offset, alignment)
-
     @staticmethod
     def _get_padding_size(offset, alignment):
         return distance_to_next_multiply(offset, alignment)
 
     def encode(self, endianness):
-        data = b""
-
-        for field in self._descriptor:
-            data += (self._get_padding(len(data), field.type._ALIGNMENT))
-            data += field.encode_fcn(self, field.type, getattr(self, field.name, None), endianness)
-
-            if field.type._PARTIAL_ALIGNMENT:
-                data += self._get_padding(len(data), field.type._PARTIAL_ALIGNMENT)
-
-        data += self._get_padding(len(data), self._ALIGNMENT)
-
-        return data
-
-    def decode(self, data, endianness):
+        data = bytearray(self._SIZE)
+        del data[self._encode_into(data, 0, endianness):]
+        return bytes(data)
+
+    def encoded_size(self):
+        return self._codec_plan.encoded_size(self)
+
+    def encode_into(self, buf, offset, endianness):
+        plan = self._codec_plan
+        # bound is cheap but loose for dynamic structs, exact size is checked only if it doesn't fit
+        if offset + plan.size_bound(self) > len(buf) and offset + plan.encoded_size(self) > len(buf):
+            raise ProphyError("buffer too small to encode {}".format(self.__class__.__name__))
+        return plan.encode_into(self, buf, offset, endianness)
+
+    def _encode_into(self, buf, pos, endianness):
+        return self._codec_plan.encode_into(self, buf, pos, endianness)
+
+    def decode(self, data, endianness, lazy=False):
+        if lazy:
+            if isinstance(data, bytearray):
+                # fields are decoded later, so they must not see later changes of caller's buffer
+                data = bytes(data)
+            return self._decode_lazy(data, 0, endianness, terminal=True)
         return self._decode_impl(data, 0, endianness, terminal=True)
 
     def _decode_impl(self, data, pos, endianness, terminal):
-        len_hints = {}
-        start_pos = pos
+        if self._fields.__class__ is lazy_fields:
+            self._fields = self._field_defaults[:]
+        self._digest = None
+        try:
+            end = self._codec_plan.decoder(self, data, pos, endianness)
+        except ProphyError as e:
+            raise prefixed(e, self.__class__.__name__)
+
+        if terminal and end < len(data):
+            raise ProphyError("not all bytes of {} read".format(self.__class__.__name__))
 
-        for field in self._descriptor:
-            pos += self._get_padding_size(pos, field.type._ALIGNMENT)
-            try:
-                pos += field.decode_fcn(self, field.name, field.type, data, pos, endianness, len_hints)
-            except ProphyError as e:
-                raise ProphyError("{}: {}".format(self.__class__.__name__, e))
-            if field.type._PARTIAL_ALIGNMENT:
-                pos += self._get_padding_size(pos, field.type._PARTIAL_ALIGNMENT)
+        return end - pos
 
-        pos += self._get_padding_size(pos, self._ALIGNMENT)
+    def _decode_lazy(self, data, pos, endianness, terminal):
+        try:
+            pending = {}
+            end = self._codec_plan.scan(data, pos, endianness, pending)
+        except ProphyError as e:
+            raise prefixed(e, self.__class__.__name__)
 
-        if terminal and pos < len(data):
+        if terminal and end < len(data):
             raise ProphyError("not all bytes of {} read".format(self.__class__.__name__))
 
-        return pos - start_pos
+        self._fields = lazy_fields(self._field_defaults, self.__class__.__name__, data, endianness, pos, end, pending)
+        self._digest = None
+        return end - pos
 
     def _copy_implementation(self, other):
-        for name, rhs in other._fields.items():
-            self.set_field(name, rhs)
+        for field, rhs in zip(self._descriptor, other._fields):
+            if rhs is not None and not codec_kind.is_array_sizer(field.type):
+                self.set_field(field.name, rhs)
 
     def set_field(self, name, rhs):
         lhs = getattr(self, name)
+        if lhs is None and codec_kind.is_composite(type(rhs)):
+            setattr(self, name, True)
+            lhs = getattr(self, name)
         if isinstance(rhs, base_array):
             if codec_kind.is_composite(rhs._TYPE):
                 if rhs._DYNAMIC:
@@ -112,7 +256,105 @@ class struct(_composite_base):
         elif codec_kind.is_composite(type(rhs)):
             lhs.copy_from(rhs)
         else:
-            self._fields[name] = rhs
+            setattr(self, name, rhs)
+
+
+def load_field(type_, data, pos, endianness, len_hint):
+    kind = codec_kind.classify(type_)
+    if kind == codec_kind.OPTIONAL:
+        flag, _ = type_._optional_type._decode(data, pos, endianness)
+        if not flag:
+            return None
+        pos += type_._OPTIONAL_ALIGNMENT
+        if codec_kind.is_composite(type_):
+            return load_composite(type_, data, pos, endianness)
+        return load_field(type_.__bases__[0], data, pos, endianness, len_hint)
+    elif kind == codec_kind.ARRAY:
+        value = type_()
+        value._decode_impl(data, pos, endianness, len_hint)
+        return value
+    elif kind == codec_kind.COMPOSITE:
+        return load_composite(type_, data, pos, endianness)
+    elif kind == codec_kind.BYTES:
+        value, _ = type_._decode(data, pos, len_hint)
+        return type_._check(value)
+    else:
+        value, _ = type_._decode(data, pos, endianness)
+    return trusted(type_, value)
+
+
+def load_composite(type_, data, pos, endianness):
+    """ Optional composite is decoded as instance of optional class, like one set with True. """
+    value = type_()
+    if codec_kind.is_struct(type_):
+        value._decode_lazy(data, pos, endianness, terminal=False)
+    else:
+        value._decode_impl(data, pos, endianness, terminal=False)
+    return value
+
+
+def trusted(type_, value):
+    """ Decoded numbers are stored without checks, except enumerators, which are looked up. """
+    return type_._check(value) if codec_kind.is_enum(type_) else value
+
+
+class lazy_fields(list):
+    """
+        Fields of lazily decoded struct, decoded from source data on first access.
+        As long as fields are not modified (accessing an array or a union counts as
+        modification), encoding with the same endianness copies the source bytes.
+    """
+    __slots__ = ["owner", "data", "endianness", "start", "end", "pending", "children", "dirty", "digest"]
+
+    def __init__(self, defaults, owner, data, endianness, start, end, pending):
+        super(lazy_fields, self).__init__(defaults)
+        self.owner = owner
+        self.data = data
+        self.endianness = endianness
+        self.start = start
+        self.end = end
+        self.pending = pending
+        self.children = []
+        self.dirty = False
+        self.digest = None
+
+    def load(self, index):
+        type_, pos, len_hint = self.pending.pop(index)
+        try:
+            value = load_field(type_, self.data, pos, self.endianness, len_hint)
+        except ProphyError as e:
+            raise prefixed(e, self.owner)
+        if isinstance(value, struct):
+            self.children.append(value)
+        elif isinstance(value, (base_array, union)):
+            self.dirty = True
+        list.__setitem__(self, index, value)
+
+    def load_all(self):
+        for index in list(self.pending):
+            self.load(index)
+
+    def is_clean(self, endianness=None):
+        return (not self.dirty and endianness in (None, self.endianness) and self.end <= len(self.data) and
+                all(child._fields.__class__ is lazy_fields and child._fields.is_clean(endianness)
+                    for child in self.children))
+
+    def source(self):
+        return as_bytes(take_bytes(self.data, self.start, self.end))
+
+    def __getitem__(self, index):
+        if index in self.pending:
+            self.load(index)
+        return list.__getitem__(self, index)
+
+    def __iter__(self):
+        self.load_all()
+        return list.__iter__(self)
+
+    def __setitem__(self, index, value):
+        self.pending.pop(index, None)
+        self.dirty = True
+        list.__setitem__(self, index, value)
 
 
 class struct_packed(struct):
@@ -126,25 +368,77 @@ class struct_packed(struct):
 class union(_composite_base):
     __slots__ = []
 
-    def __init__(self):
-        self._fields = {}
+    def __init__(self, **fields):
+        self._fields = self._field_defaults[:]
         self._discriminated = self._descriptor[0]
+        if fields:
+            self._fill(fields)
+
+    def _fill(self, values):
+        arms = [name for name in values if name != "discriminator"]
+        if len(arms) > 1:
+            raise ProphyError("only one of {} fields can be set".format(", ".join(sorted(arms))))
+        if "discriminator" in values:
+            self.discriminator = values["discriminator"]
+        if arms:
+            name = arms[0]
+            if name not in self._field_converters:
+                raise AttributeError("'{}' object has no attribute '{}'".format(self.__class__.__name__, name))
+            index, convert = self._field_converters[name]
+            if "discriminator" not in values:
+                self.discriminator = name
+            elif self._discriminated.name != name:
+                raise ProphyError("currently field %s is discriminated" % self._discriminated.discriminator)
+            self._fields[index] = convert(values[name])
+
+    def to_dict(self):
+        name = self._discriminated.name
+        return {name: plain_value(getattr(self, name))}
 
-    def __str__(self):
+    def _equals(self, other):
+        if self._FLOATING:
+            same = self._same_encoding(other)
+            if same is not None:
+                return same
         name = self._discriminated.name
-        value = getattr(self, name)
-        return field_to_string(name, self._discriminated.type, value)
+        return self._discriminated is other._discriminated and getattr(self, name) == getattr(other, name)
+
+    def _write_text(self, write, indent, limit):
+        name = self._discriminated.name
+        write_field(write, indent, name, self._discriminated.type, getattr(self, name), limit)
 
     def get_discriminated(self):
         return self._discriminated.descriptor_info
 
     def encode(self, endianness, **_):
+        data = bytearray(self._SIZE)
+        self._encode_into(data, 0, endianness)
+        return bytes(data)
+
+    def encoded_size(self):
+        d = self._discriminated
+        if codec_kind.is_composite(d.type):
+            return max(self._SIZE, self._ALIGNMENT + getattr(self, d.name).encoded_size())
+        return self._SIZE
+
+    def encode_into(self, buf, offset, endianness):
+        if offset + self.encoded_size() > len(buf):
+            raise ProphyError("buffer too small to encode {}".format(self.__class__.__name__))
+        return self._encode_into(buf, offset, endianness)
+
+    def _encode_into(self, buf, pos, endianness):
         d = self._discriminated
         value = getattr(self, d.name)
-        discriminator_bytes = self._discriminator_type._encode(
-            d.discriminator, endianness).ljust(self._ALIGNMENT, b'\x00')
-        body_bytes = d.encode_fcn(self, d.type, value, endianness)
-        return (discriminator_bytes + body_bytes).ljust(self._SIZE, b'\x00')
+        discriminator_bytes = self._discriminator_type._encode(d.discriminator, endianness)
+        buf[pos:pos + len(discriminator_bytes)] = discriminator_bytes
+        body_pos = write_padding(buf, pos + len(discriminator_bytes), pos + self._ALIGNMENT)
+        if codec_kind.is_composite(d.type):
+            body_end = value._encode_into(buf, body_pos, endianness)
+        else:
+            body_bytes = d.encode_fcn(self, d.type, value, endianness)
+            body_end = body_pos + len(body_bytes)
+            buf[body_pos:body_end] = body_bytes
+        return write_padding(buf, body_end, pos + self._SIZE)
 
     def decode(self, data, endianness):
         return self._decode_impl(data, 0, endianness, terminal=True)
@@ -153,21 +447,31 @@ class union(_composite_base):
         disc, _ = self._discriminator_type._decode(data, pos, endianness)
         field = self._get_discriminated_field(disc)
 
+        self._digest = None
         self._discriminated = field
         field.decode_fcn(self, field.name, field.type, data, pos + self._ALIGNMENT, endianness, {})
 
         bytes_read = len(data) - pos
         if bytes_read < self._SIZE:
-            raise ProphyError("not enough bytes")
+            raise ProphyTruncatedError("not enough bytes")
         if terminal and bytes_read > self._SIZE:
             raise ProphyError("not all bytes of {} read".format(self.__class__.__name__))
         return self._SIZE
 
     def _get_discriminated_field(self, discriminator):
-        for field in self._descriptor:
-            if field.discriminator == discriminator:
-                return field
-        raise ProphyError("unknown discriminator: {!r}".format(discriminator))
+        field = self._discriminated_fields.get(discriminator)
+        if field is None or field.discriminator != discriminator:
+            raise ProphyError("unknown discriminator: {!r}".format(discriminator))
+        return field
+
+    def copy_from(self, other):
+        super(union, self).copy_from(other)
+        self._discriminated = other._discriminated
+
+    def _clone(self):
+        copy = super(union, self)._clone()
+        copy._discriminated = self._discriminated
+        return copy
 
     def _copy_implementation(self, other):
         self._discriminated = other._discriminated
@@ -192,7 +496,7 @@ def bytes_(**kwargs):
         _SIZE = size
         _DYNAMIC = not size
         _UNLIMITED = not size and not bound
-        _DEFAULT = b"\x00" * size if size and not bound else ""
+        _DEFAULT = b"\x00" * size if size and not bound else b""
         _OPTIONAL = False
         _ALIGNMENT = 1
         _BOUND = bound
@@ -202,32 +506,32 @@ def bytes_(**kwargs):
 
         @staticmethod
         def _check(value):
-            if not isinstance(value, bytes):
+            if not isinstance(value, (bytes, memoryview)):
                 raise ProphyError("not a bytes")
             if size and len(value) > size:
                 raise ProphyError("too long")
-            if size and not bound:
-                return value.ljust(size, b'\x00')
+            if size and not bound and len(value) < size:
+                return as_bytes(value).ljust(size, b'\x00')
             return value
 
         @staticmethod
         def _encode(value):
-            return value.ljust(size, b'\x00')
+            return as_bytes(value).ljust(size, b'\x00')
 
         @staticmethod
         def _decode(data, pos, len_hint):
             if (len(data) - pos) < size:
-                raise ProphyError("too few bytes to decode string")
+                raise ProphyTruncatedError("too few bytes to decode string")
             if size and not bound:
-                return data[pos:(pos + size)], size
+                return take_bytes(data, pos, pos + size), size
             elif size and bound:
-                return data[pos:(pos + len_hint)], size
+                return take_bytes(data, pos, pos + len_hint), size
             elif bound:
                 if (len(data) - pos) < len_hint:
-                    raise ProphyError("too few bytes to decode string")
-                return data[pos:(pos + len_hint)], len_hint
+                    raise ProphyTruncatedError("too few bytes to decode string")
+                return take_bytes(data, pos, pos + len_hint), len_hint
             else:  # greedy
-                return data[pos:], (len(data) - pos)
+                return take_bytes(data, pos, len(data)), (len(data) - pos)
 
     return _bytes
 
@@ -1,22 +1,136 @@
+import hashlib
+
 from .scalar import prophy_data_object
 
+# digest of nested message sealed along with message holding it, which is not computed by itself
+SEALED = b""
+
 
 class _composite_base(prophy_data_object):
     __slots__ = []
 
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._equals(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        """ Hash follows digest, so it changes when message is modified, like equality does. """
+        try:
+            return hash(self.digest())
+        except Exception:
+            return id(self.__class__)
+
+    def __str__(self):
+        parts = []
+        self._write_text(parts.append, "", None)
+        return "".join(parts)
+
+    def write_text(self, stream, array_limit=None):
+        """ Writes text of message, as returned by str, to stream; arrays cut after `array_limit` elements. """
+        self._write_text(stream.write, "", array_limit)
+
+    def digest(self):
+        """
+            SHA-1 of little endian encoding, equal for equal messages. It's kept until message is
+            modified: fields are set, arrays or nested structs and unions are changed.
+        """
+        state = getattr(self, "_digest", None)
+        if state is not None and state[0] and self._sealed():
+            return state[0]
+        digest = self._encoding_digest()
+        self._seal(digest)
+        return digest
+
+    def _same_encoding(self, other):
+        """ Tells if messages encode to the same bytes, None if either of them can't be encoded. """
+        try:
+            return self.encode("<") == other.encode("<")
+        except Exception:
+            return None
+
+    def _encoding_digest(self):
+        return hashlib.sha1(self.encode("<")).digest()
+
+    def _seal(self, digest):
+        """ Keeps digest with state of nested fields, sealing nested structs and unions as well. """
+        fields = self._fields
+        snapshots = []
+        for index in self._nested_indices:
+            value = fields[index]
+            if value is None or isinstance(value, _composite_base):
+                if value is not None and not value._sealed():
+                    value._seal(SEALED)
+                snapshots.append(value)
+            else:
+                snapshots.append(value._snapshot())
+        self._digest = (digest, snapshots)
+
+    def _sealed(self):
+        """ Tells if message is unmodified since it was sealed. Setters drop the seal, nested fields are checked. """
+        state = getattr(self, "_digest", None)
+        if state is None:
+            return False
+        fields = self._fields
+        for index, snapshot in zip(self._nested_indices, state[1]):
+            value = fields[index]
+            if snapshot is None or isinstance(snapshot, _composite_base):
+                if value is not snapshot or value is not None and not value._sealed():
+                    return False
+            elif not value._unchanged(snapshot):
+                return False
+        return True
+
     def copy_from(self, other):
         self.validate_copy_from(other)
         if other is self:
             return
 
-        self._fields.clear()
+        self._digest = None
+        if other.__class__ is self.__class__:
+            self._fields = other._clone_fields()
+            return
+        self._fields = self._field_defaults[:]
         self._copy_implementation(other)
 
+    @classmethod
+    def from_dict(cls, values):
+        """ Creates message from dict of field values, with nested structs and unions given as dicts. """
+        msg = cls()
+        msg._fill(values)
+        return msg
+
+    def clone(self):
+        """ Returns deep copy of message, sharing with it only immutable values. """
+        return self._clone()
+
+    def _clone(self):
+        copy = self.__class__.__new__(self.__class__)
+        copy._fields = self._clone_fields()
+        return copy
+
+    def _clone_fields(self):
+        """ Copy of field storage, with arrays and composites in it cloned. """
+        fields = list(self._fields)
+        for index in self._nested_indices:
+            value = fields[index]
+            if value is not None:
+                fields[index] = value._clone()
+        return fields
+
     @classmethod
     def validate_copy_from(cls, rhs):
         if not isinstance(rhs, cls):
             raise TypeError("Parameter to copy_from must be instance of same class.")
 
+    def _write_text(self, write, indent, limit):
+        " To be overrided in derived class "
+
     def _copy_implementation(self, other):
         " To be overrided in derived class "
 
@@ -1,6 +1,11 @@
+from array import array as typed_buffer
+
 from .base_array import base_array
-from .composite import struct, union
-from .exception import ProphyError
+from .composite import composite_value, struct, union, write_padding
+from .composite_base import SEALED
+from .exception import ProphyError, ProphyTruncatedError
+from .ndarray import bound_ndarray, fixed_ndarray, ndarray_attributes
+from .records import decode_records, encode_records
 from .six import xrange
 
 
@@ -8,6 +13,9 @@ def decode_scalar_array(tp, data, pos, endianness, count):
     if count is None:
         items, remainder = divmod(len(data) - pos, tp._SIZE)
         count = items + bool(remainder)
+    size = count * tp._SIZE
+    if size <= len(data) - pos:
+        return tp._decode_array(data, pos, endianness, count), size
     cursor = 0
     values = []
     for _ in xrange(count):
@@ -17,6 +25,20 @@ def decode_scalar_array(tp, data, pos, endianness, count):
     return values, cursor
 
 
+def check_scalars(tp, values):
+    """ Values of typed buffer matching element type are taken without per-element checks. """
+    if tp._TYPECODE and isinstance(values, typed_buffer) and values.typecode == tp._TYPECODE:
+        return values.tolist()
+    return list(map(tp._check, values))
+
+
+def checked_decoded(tp, values):
+    """ Decoded numbers are within type bounds, only enumerators need to be checked. """
+    if tp._TYPECODE:
+        return list(values)
+    return list(map(tp._check, values))
+
+
 def scalar_array_eq(self, other):
     if self is other:
         return True
@@ -36,6 +58,18 @@ def composite_array_eq(self, other):
     return self._values == other._values
 
 
+def composite_snapshot(values):
+    """ Elements are sealed, so that changes of them are seen, and kept to see replaced ones. """
+    for value in values:
+        if not value._sealed():
+            value._seal(SEALED)
+    return list(values)
+
+
+def composite_unchanged(values, snapshot):
+    return len(values) == len(snapshot) and all(a is b and a._sealed() for a, b in zip(values, snapshot))
+
+
 class fixed_scalar_array(base_array):
     __slots__ = []
 
@@ -53,16 +87,17 @@ class fixed_scalar_array(base_array):
     def __setslice__(self, start, stop, values):
         if len(self._values[start:stop]) != len(values):
             raise ProphyError("setting slice with different length collection")
-        self._values[start:stop] = map(self._TYPE._check, values)
+        self._values[start:stop] = check_scalars(self._TYPE, values)
 
     def __eq__(self, other):
         return scalar_array_eq(self, other)
 
     def _encode_impl(self, endianness):
-        return b"".join(self._TYPE._encode(value, endianness) for value in self)
+        return self._TYPE._encode_array(self._values, endianness)
 
     def _decode_impl(self, data, pos, endianness, _):
-        self[:], size = decode_scalar_array(self._TYPE, data, pos, endianness, len(self))
+        values, size = decode_scalar_array(self._TYPE, data, pos, endianness, len(self))
+        self._values[:] = checked_decoded(self._TYPE, values)
         return size
 
 
@@ -89,7 +124,7 @@ class bound_scalar_array(base_array):
             return
         if self._max_len and len(self) + len(values) > self._max_len:
             raise ProphyError("exceeded array limit")
-        self._values.extend(map(self._TYPE._check, values))
+        self._values.extend(check_scalars(self._TYPE, values))
 
     def remove(self, elem):
         self._values.remove(elem)
@@ -104,7 +139,7 @@ class bound_scalar_array(base_array):
     def __setslice__(self, start, stop, values):
         if self._max_len and len(self) + len(values) - len(self._values[start:stop]) > self._max_len:
             raise ProphyError("exceeded array limit")
-        self._values[start:stop] = map(self._TYPE._check, values)
+        self._values[start:stop] = check_scalars(self._TYPE, values)
 
     def __delitem__(self, idx):
         del self._values[idx]
@@ -116,12 +151,15 @@ class bound_scalar_array(base_array):
         return scalar_array_eq(self, other)
 
     def _encode_impl(self, endianness):
-        return b"".join(self._TYPE._encode(value, endianness) for value in self).ljust(self._SIZE, b"\x00")
+        return self._TYPE._encode_array(self._values, endianness).ljust(self._SIZE, b"\x00")
 
     def _decode_impl(self, data, pos, endianness, len_hint):
         if self._SIZE > (len(data) - pos):
-            raise ProphyError("too few bytes to decode array")
-        self[:], size = decode_scalar_array(self._TYPE, data, pos, endianness, len_hint)
+            raise ProphyTruncatedError("too few bytes to decode array")
+        values, size = decode_scalar_array(self._TYPE, data, pos, endianness, len_hint)
+        if self._max_len and len(values) > self._max_len:
+            raise ProphyError("exceeded array limit")
+        self._values[:] = checked_decoded(self._TYPE, values)
         return max(size, self._SIZE)
 
 
@@ -132,12 +170,40 @@ class fixed_composite_array(base_array):
         super(fixed_composite_array, self).__init__()
         self._values = [self._TYPE() for _ in xrange(self._max_len)]
 
+    @classmethod
+    def _from_sequence(cls, values):
+        values = values._values if isinstance(values, base_array) else list(values)
+        if len(values) != cls._max_len:
+            raise ProphyError("setting slice with different length collection")
+        array = cls.__new__(cls)
+        array._values = [composite_value(cls._TYPE, value) for value in values]
+        return array
+
     def __eq__(self, other):
         return composite_array_eq(self, other)
 
+    def _clone(self):
+        copy = self.__class__.__new__(self.__class__)
+        copy._values = [value._clone() for value in self._values]
+        return copy
+
+    def _to_list(self):
+        return [value.to_dict() for value in self._values]
+
+    def _snapshot(self):
+        return composite_snapshot(self._values)
+
+    def _unchanged(self, snapshot):
+        return composite_unchanged(self._values, snapshot)
+
     def _encode_impl(self, endianness):
         return b"".join(value.encode(endianness) for value in self)
 
+    def _encode_into(self, buf, pos, endianness):
+        for value in self._values:
+            pos = value._encode_into(buf, pos, endianness)
+        return pos
+
     def _decode_impl(self, data, pos, endianness, _):
         cursor = 0
         for elem in self:
@@ -151,18 +217,21 @@ class bound_composite_array(base_array):
     def __init__(self):
         super(bound_composite_array, self).__init__()
 
+    @classmethod
+    def _from_sequence(cls, values):
+        values = values._values if isinstance(values, base_array) else list(values)
+        if cls._max_len and len(values) > cls._max_len:
+            raise ProphyError("exceeded array limit")
+        array = cls.__new__(cls)
+        array._values = [composite_value(cls._TYPE, value) for value in values]
+        return array
+
     def add(self, **attributes):
         if self._max_len and len(self) == self._max_len:
             raise ProphyError("exceeded array limit")
 
-        new_element = self._TYPE()
+        new_element = self._TYPE(**attributes)
         self._values.append(new_element)
-        for name, value in attributes.items():
-            attr = getattr(new_element, name)
-            if isinstance(attr, base_array):
-                attr[:] = value
-            else:
-                setattr(new_element, name, value)
         return new_element
 
     def extend(self, elem_seq):
@@ -184,12 +253,42 @@ class bound_composite_array(base_array):
     def __eq__(self, other):
         return composite_array_eq(self, other)
 
+    def _clone(self):
+        copy = self.__class__.__new__(self.__class__)
+        copy._values = [value._clone() for value in self._values]
+        return copy
+
+    def _to_list(self):
+        return [value.to_dict() for value in self._values]
+
+    def _snapshot(self):
+        return composite_snapshot(self._values)
+
+    def _unchanged(self, snapshot):
+        return composite_unchanged(self._values, snapshot)
+
     def _encode_impl(self, endianness):
         return b"".join(value.encode(endianness) for value in self).ljust(self._SIZE, b"\x00")
 
+    def _encode_into(self, buf, pos, endianness):
+        start = pos
+        records = self._RECORDS
+        if records:
+            # grows buffer of encode, which is never too small otherwise
+            write_padding(buf, len(buf), pos + len(self._values) * self._TYPE._SIZE)
+            pos = encode_records(self._values, records[endianness], buf, pos, self._TYPE._SIZE)
+        else:
+            for value in self._values:
+                pos = value._encode_into(buf, pos, endianness)
+        return write_padding(buf, pos, start + self._SIZE)
+
     def _decode_impl(self, data, pos, endianness, len_hint):
         if self._SIZE > (len(data) - pos):
-            raise ProphyError("too few bytes to decode array")
+            raise ProphyTruncatedError("too few bytes to decode array")
+        if self._RECORDS and not pos % self._ALIGNMENT:
+            size = self._decode_records(data, pos, endianness, len_hint)
+            if size is not None:
+                return size
         del self[:]
         cursor = 0
         if not self._SIZE and not self._BOUND:
@@ -200,11 +299,27 @@ class bound_composite_array(base_array):
                 cursor += self.add()._decode_impl(data, pos + cursor, endianness, terminal=False)
         return max(cursor, self._SIZE)
 
+    def _decode_records(self, data, pos, endianness, len_hint):
+        """ Decodes array of records at once, returns None if elements need to be decoded one by one. """
+        record_size = self._TYPE._SIZE
+        if not self._SIZE and not self._BOUND:
+            len_hint, remainder = divmod(len(data) - pos, record_size)
+            if remainder:
+                return None
+        if pos + len_hint * record_size > len(data):
+            return None
+        if self._max_len and len_hint > self._max_len:
+            raise ProphyError("exceeded array limit")
+        layout = self._RECORDS[endianness]
+        self._values[:] = decode_records(self._TYPE, layout, data, pos, record_size, len_hint)
+        return max(len_hint * record_size, self._SIZE)
+
 
 def array(type_, **kwargs):
     size = kwargs.pop("size", 0)
     bound = kwargs.pop("bound", None)
     shift = kwargs.pop("shift", 0)
+    ndarray = kwargs.pop("ndarray", False)
     if kwargs:
         raise ProphyError("unknown arguments to array field")
 
@@ -229,6 +344,13 @@ def array(type_, **kwargs):
     else:
         base = fixed_scalar_array if is_static else bound_scalar_array
 
+    dtype, wire_dtypes = None, None
+    if ndarray:
+        if is_composite:
+            raise ProphyError("ndarray array of non-numeric type not allowed")
+        dtype, wire_dtypes = ndarray_attributes(type_)
+        base = fixed_ndarray if is_static else bound_ndarray
+
     class _array(base):
         __slots__ = []
         _max_len = size
@@ -241,5 +363,8 @@ def array(type_, **kwargs):
         _BOUND = bound
         _BOUND_SHIFT = shift
         _PARTIAL_ALIGNMENT = None
+        _DTYPE = dtype
+        _WIRE_DTYPES = wire_dtypes
+        _RECORDS = getattr(getattr(type_, "_codec_plan", None), "records", None)
 
     return _array
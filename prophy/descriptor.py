@@ -3,7 +3,7 @@ from collections import namedtuple
 import renew
 
 from .exception import ProphyError
-from .composite import codec_kind
+from .composite import codec_kind, trusted
 
 FieldDescriptor = namedtuple("FieldDescriptor", "name, type, kind")
 FieldDescriptor.__repr__ = lambda self: "<{}, {!r}, {!r}>".format(*self)
@@ -106,7 +106,7 @@ def decode_optional(parent, name, type_, data, pos, endianness, len_hints):
         pos += opt_alignment
         return opt_alignment + type_._decode(parent, name, sub_type, data, pos, endianness, len_hints)
     else:
-        setattr(parent, name, None)
+        parent._fields[parent._field_indices[name]] = None
         return opt_alignment + type_._SIZE
 
 
@@ -129,13 +129,13 @@ def decode_composite(parent, name, _, data, pos, endianness, __):
 
 def decode_bytes(parent, name, type_, data, pos, _, len_hints):
     value, size = type_._decode(data, pos, len_hints.get(name))
-    setattr(parent, name, value)
+    parent._fields[parent._field_indices[name]] = type_._check(value)
     return size
 
 
 def decode_scalar(parent, name, type_, data, pos, endianness, _):
     value, size = type_._decode(data, pos, endianness)
-    setattr(parent, name, value)
+    parent._fields[parent._field_indices[name]] = trusted(type_, value)
     return size
 
 
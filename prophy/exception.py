@@ -1,2 +1,11 @@
 class ProphyError(Exception):
     pass
+
+
+class ProphyTruncatedError(ProphyError):
+    """ Raised when data ends before decoded message does, so that more data may complete it. """
+
+
+def prefixed(error, name):
+    """ Error of the same class as given one, with message prefixed by name of type it was raised in. """
+    return error.__class__("{}: {}".format(name, error))
@@ -1,9 +1,11 @@
 import collections
 
+from . import codegen
 from .base_array import base_array
-from .composite import codec_kind, distance_to_next_multiply, struct_packed
+from .composite import codec_kind, composite_value, distance_to_next_multiply, struct_packed
 from .descriptor import DescriptorField
 from .exception import ProphyError
+from .plan import compile_codec_plan
 from .scalar import u32
 from .six import long
 
@@ -109,6 +111,7 @@ class _composite_generator_base(_generator_base):
         cls.extend_descriptor()
         cls.add_properties()
         cls.add_sizers()
+        cls.add_codec_plans()
 
     def _types(cls):
         for field in cls._descriptor:
@@ -127,6 +130,9 @@ class _composite_generator_base(_generator_base):
     def add_sizers(cls):
         """To be implemented in derived class."""
 
+    def add_codec_plans(cls):
+        """To be implemented in derived class."""
+
     def validate(cls):
         """To be implemented in derived class."""
 
@@ -172,6 +178,7 @@ class enum_generator(_generator_base):
         self._name_to_int = name_to_int
         self._int_to_name = int_to_name
         self._check = classmethod(check)
+        self._TYPECODE = None
 
     def __eq__(cls, other):
         if not isinstance(other, cls.__class__):
@@ -180,7 +187,7 @@ class enum_generator(_generator_base):
 
 
 class struct_generator(_composite_generator_base):
-    _slots = ["_fields"]
+    _slots = ["_fields", "_digest"]
 
     def validate(cls):
         for field in cls._descriptor:
@@ -203,6 +210,7 @@ class struct_generator(_composite_generator_base):
         cls._PARTIAL_ALIGNMENT = None
         cls._SIZE = sum((type_._OPTIONAL_SIZE if type_._OPTIONAL else type_._SIZE) for type_ in cls._types())
         cls._UNLIMITED = any(type_._UNLIMITED for type_ in cls._types())
+        cls._FLOATING = any(floating(type_) for type_ in cls._types())
         if not cls._descriptor:
             cls._ALIGNMENT = 1
         else:
@@ -231,13 +239,17 @@ class struct_generator(_composite_generator_base):
             cls._SIZE += sum(get_padded_sizes())
 
     def add_properties(cls):
-        for field in cls._descriptor:
+        cls._field_defaults = [field_default(field.type) for field in cls._descriptor]
+        cls._nested_indices = nested_indices(cls._descriptor)
+        cls._field_indices = {field.name: index for index, field in enumerate(cls._descriptor)}
+        cls._field_converters = field_converters(cls._descriptor)
+        for index, field in enumerate(cls._descriptor):
             if codec_kind.is_array(field.type):
-                cls.add_repeated_property(field)
+                cls.add_repeated_property(field, index)
             elif codec_kind.is_composite(field.type):
-                cls.add_composite_property(field)
+                cls.add_composite_property(field, index)
             else:
-                cls.add_scalar_property(field)
+                cls.add_scalar_property(field, index)
 
     def add_sizers(cls):
         for field in cls._descriptor:
@@ -245,12 +257,16 @@ class struct_generator(_composite_generator_base):
                 if field.type._BOUND:
                     cls.substitute_len_field(field)
 
-    def add_repeated_property(cls, descriptor_field):
+    def add_codec_plans(cls):
+        cls._codec_plan = compile_codec_plan(cls)
+        if codegen.enabled:
+            codegen.generate_codecs(cls._codec_plan, cls)
+
+    def add_repeated_property(cls, descriptor_field, index):
         def getter(self):
-            value = self._fields.get(descriptor_field.name)
+            value = self._fields[index]
             if value is None:
-                value = descriptor_field.type()
-                self._fields[descriptor_field.name] = value
+                value = self._fields[index] = descriptor_field.type()
             return value
 
         def setter(self, new_value):
@@ -258,43 +274,42 @@ class struct_generator(_composite_generator_base):
 
         setattr(cls, descriptor_field.name, property(getter, setter))
 
-    def add_scalar_property(cls, descriptor_field):
-        if descriptor_field.type._OPTIONAL:
-            def getter(self):
-                return self._fields.get(descriptor_field.name)
+    def add_scalar_property(cls, descriptor_field, index):
+        def getter(self):
+            return self._fields[index]
 
+        if descriptor_field.type._OPTIONAL:
             def setter(self, new_value):
+                self._digest = None
                 if new_value is None:
-                    self._fields[descriptor_field.name] = None
+                    self._fields[index] = None
                 else:
-                    self._fields[descriptor_field.name] = descriptor_field.type._check(new_value)
+                    self._fields[index] = descriptor_field.type._check(new_value)
         else:
-            def getter(self):
-                return self._fields.get(descriptor_field.name, descriptor_field.type._DEFAULT)
-
             def setter(self, new_value):
-                self._fields[descriptor_field.name] = descriptor_field.type._check(new_value)
+                self._digest = None
+                self._fields[index] = descriptor_field.type._check(new_value)
         setattr(cls, descriptor_field.name, property(getter, setter))
 
-    def add_composite_property(cls, descriptor_field):
+    def add_composite_property(cls, descriptor_field, index):
         if descriptor_field.type._OPTIONAL:
             def getter(self):
-                return self._fields.get(descriptor_field.name)
+                return self._fields[index]
 
             def setter(self, new_value):
+                self._digest = None
                 if new_value is True:
-                    self._fields[descriptor_field.name] = descriptor_field.type()
+                    self._fields[index] = descriptor_field.type()
                 elif new_value is None:
-                    self._fields.pop(descriptor_field.name, None)
+                    self._fields[index] = None
                 else:
                     raise ProphyError("assignment to composite field not allowed")
         else:
             def getter(self):
-                value = self._fields.get(descriptor_field.name)
-                if value:
-                    return value
-                else:
-                    return self._fields.setdefault(descriptor_field.name, descriptor_field.type())
+                value = self._fields[index]
+                if value is None:
+                    value = self._fields[index] = descriptor_field.type()
+                return value
 
             def setter(self, new_value):
                 raise ProphyError("assignment to composite field not allowed")
@@ -314,6 +329,7 @@ class struct_generator(_composite_generator_base):
             sizer_item.type = build_container_length_field(sizer_item.type, container_item.name, bound_shift)
             sizer_item.evaluate_codecs()
             delattr(cls, sizer_item.name)
+            del cls._field_converters[sizer_item.name]
 
     def validate_and_fix_sizer_name(cls, container_item):
         sizer_name = container_item.type._BOUND
@@ -370,6 +386,7 @@ class struct_generator(_composite_generator_base):
 def build_container_length_field(sizer_item_type, container_name, bound_shift):
     class container_len(sizer_item_type):
         _BOUND = [container_name]
+        _BOUND_SHIFT = bound_shift
         _TYPE = sizer_item_type
 
         @classmethod
@@ -391,19 +408,23 @@ def build_container_length_field(sizer_item_type, container_name, bound_shift):
         @staticmethod
         def _decode(data, pos, endianness):
             value, size = sizer_item_type._decode(data, pos, endianness)
+            return container_len._decode_length(value), size
+
+        @staticmethod
+        def _decode_length(value):
             array_guard = 65536
             if value > array_guard:
                 raise ProphyError("decoded array length over %s" % array_guard)
             value -= bound_shift
             if value < 0:
                 raise ProphyError("decoded array length smaller than shift")
-            return value, size
+            return value
 
     return container_len
 
 
 class union_generator(_composite_generator_base):
-    _slots = ["_fields", "_discriminated"]
+    _slots = ["_fields", "_discriminated", "_digest"]
 
     def validate(cls):
         for type_ in cls._types():
@@ -425,39 +446,52 @@ class union_generator(_composite_generator_base):
         natural_size = cls._ALIGNMENT + max(type_._SIZE for type_ in cls._types())
         cls._SIZE = natural_size + distance_to_next_multiply(natural_size, cls._ALIGNMENT)
         cls._UNLIMITED = False
+        cls._FLOATING = any(floating(type_) for type_ in cls._types())
         cls._discriminator_type = u32
 
     def add_properties(cls):
+        cls._field_defaults = [field_default(field.type) for field in cls._descriptor]
+        cls._nested_indices = nested_indices(cls._descriptor)
+        cls._field_indices = {field.name: index for index, field in enumerate(cls._descriptor)}
+        cls._field_converters = field_converters(cls._descriptor)
+        cls.add_discriminated_fields()
         cls.add_union_discriminator_property()
-        for field in cls._descriptor:
+        for index, field in enumerate(cls._descriptor):
             if codec_kind.is_composite(field.type):
-                cls.add_union_composite_property(field)
+                cls.add_union_composite_property(field, index)
             else:
-                cls.add_union_scalar_property(field)
+                cls.add_union_scalar_property(field, index)
+
+    def add_discriminated_fields(cls):
+        """ Maps arm names and discriminators to fields, first of arms sharing a key wins. """
+        cls._discriminated_fields = {}
+        for field in reversed(cls._descriptor):
+            cls._discriminated_fields[field.name] = field
+            cls._discriminated_fields[field.discriminator] = field
 
     def add_union_discriminator_property(cls):
         def getter(self):
             return self._discriminated.discriminator
 
         def setter(self, discriminator_name_or_value):
-            for field in self._descriptor:
-                if discriminator_name_or_value in (field.name, field.discriminator):
-                    if field != self._discriminated:
-                        self._discriminated = field
-                        self._fields = {}
-                    return
-            raise ProphyError("unknown discriminator: {!r}".format(discriminator_name_or_value))
+            try:
+                field = self._discriminated_fields[discriminator_name_or_value]
+            except (KeyError, TypeError):
+                raise ProphyError("unknown discriminator: {!r}".format(discriminator_name_or_value))
+            if field != self._discriminated:
+                self._digest = None
+                self._discriminated = field
+                self._fields = self._field_defaults[:]
 
         setattr(cls, "discriminator", property(getter, setter))
 
-    def add_union_composite_property(cls, field):
+    def add_union_composite_property(cls, field, index):
         def getter(self):
             if self._discriminated is not field:
                 raise ProphyError("currently field %s is discriminated" % self._discriminated.discriminator)
-            value = self._fields.get(field.name)
+            value = self._fields[index]
             if value is None:
-                value = field.type()
-                value = self._fields.setdefault(field.name, value)
+                value = self._fields[index] = field.type()
             return value
 
         def setter(self, new_value):
@@ -465,21 +499,72 @@ class union_generator(_composite_generator_base):
 
         setattr(cls, field.name, property(getter, setter))
 
-    def add_union_scalar_property(cls, field):
+    def add_union_scalar_property(cls, field, index):
         def getter(self):
             if self._discriminated is not field:
                 raise ProphyError("currently field %s is discriminated" % self._discriminated.discriminator)
-            return self._fields.get(field.name, field.type._DEFAULT)
+            return self._fields[index]
 
         def setter(self, new_value):
             if self._discriminated is not field:
                 raise ProphyError("currently field %s is discriminated" % self._discriminated.discriminator)
-            new_value = field.type._check(new_value)
-            self._fields[field.name] = new_value
+            self._digest = None
+            self._fields[index] = field.type._check(new_value)
 
         setattr(cls, field.name, property(getter, setter))
 
 
+def field_default(type_):
+    """ Initial value kept in field storage, None for fields created on first access or unset optionals. """
+    if type_._OPTIONAL or codec_kind.is_array(type_) or codec_kind.is_composite(type_):
+        return None
+    return type_._DEFAULT
+
+
+def floating(type_):
+    """ Tells if floats, whose equal values may differ in encoding (0.0 and -0.0), are held by type. """
+    if codec_kind.is_array(type_):
+        type_ = type_._TYPE
+    return issubclass(type_, float) or getattr(type_, "_FLOATING", False)
+
+
+def nested_indices(descriptor):
+    """ Positions of fields holding arrays or composites, which are not shared by copies. """
+    return [index for index, field in enumerate(descriptor)
+            if codec_kind.is_array(field.type) or codec_kind.is_composite(field.type)]
+
+
+def field_converters(descriptor):
+    """ Maps field names to positions and functions validating values given for them, e.g. to __init__. """
+    return collections.OrderedDict((field.name, (index, field_converter(field.type)))
+                                   for index, field in enumerate(descriptor))
+
+
+def field_converter(type_):
+    if codec_kind.is_array(type_):
+        return type_._from_sequence
+    elif codec_kind.is_composite(type_):
+        if type_._OPTIONAL:
+            def convert_optional(value):
+                if value is None:
+                    return None
+                if value is True:
+                    return type_()
+                return composite_value(type_, value)
+            return convert_optional
+
+        def convert(value):
+            return composite_value(type_, value)
+        return convert
+    elif type_._OPTIONAL:
+        check = type_._check
+
+        def convert_optional(value):
+            return None if value is None else check(value)
+        return convert_optional
+    return type_._check
+
+
 def _list_duplicates(iterable):
     iterable = list(iterable)
     return sorted((collections.Counter(iterable) - collections.Counter(set(iterable))).keys())
@@ -0,0 +1,226 @@
+from .base_array import base_array
+from .composite import codec_kind, distance_to_next_multiply, struct_packed
+from .exception import ProphyError, ProphyTruncatedError, prefixed
+from .scalar import enum
+
+numpy = None
+
+BYTE_ORDERS = {'<': '<', '>': '>', '=': '=', '!': '>', '@': '='}
+
+
+def import_numpy(purpose="ndarray array"):
+    global numpy
+    if numpy is None:
+        try:
+            import numpy as numpy_module
+        except ImportError:
+            raise ProphyError("{} requires numpy".format(purpose))
+        numpy = numpy_module
+    return numpy
+
+
+def ndarray_attributes(type_):
+    """ Returns dtypes of ndarray holding given element type: native one and per endianness. """
+    if not hasattr(type_, "_FORMAT") or issubclass(type_, enum):
+        raise ProphyError("ndarray array of non-numeric type not allowed")
+    dtype = import_numpy().dtype(type_._FORMAT)
+    return dtype, {endianness: dtype.newbyteorder(order) for endianness, order in BYTE_ORDERS.items()}
+
+
+def _field_dtype(type_, order):
+    kind = codec_kind.classify(type_)
+    if kind == codec_kind.OPTIONAL:
+        value = _field_dtype(type_.__bases__[0], order)
+        return numpy.dtype({
+            "names": ["present", "value"],
+            "formats": [_field_dtype(type_._optional_type, order), value],
+            "offsets": [0, type_._OPTIONAL_ALIGNMENT],
+            "itemsize": type_._OPTIONAL_ALIGNMENT + value.itemsize
+        })
+    elif kind == codec_kind.COMPOSITE:
+        if codec_kind.is_union(type_):
+            raise ProphyError("union {} has no fixed layout".format(type_.__name__))
+        return _struct_dtype(type_, order)
+    elif kind == codec_kind.ARRAY:
+        return numpy.dtype((_field_dtype(type_._TYPE, order), (type_._max_len,)))
+    elif kind == codec_kind.BYTES:
+        return numpy.dtype("S%d" % type_._SIZE)
+    return numpy.dtype(type_._FORMAT).newbyteorder(order)
+
+
+def _struct_dtype(cls, order):
+    if not codec_kind.is_struct(cls) or cls._DYNAMIC:
+        raise ProphyError("{} has no fixed layout".format(cls.__name__))
+    packed = issubclass(cls, struct_packed)
+    names, formats, offsets = [], [], []
+    offset = 0
+    for field in cls._descriptor:
+        if not packed:
+            offset += distance_to_next_multiply(offset, field.type._ALIGNMENT)
+        try:
+            dtype = _field_dtype(field.type, order)
+        except ProphyError as e:
+            raise prefixed(e, "{}.{}".format(cls.__name__, field.name))
+        names.append(field.name)
+        formats.append(dtype)
+        offsets.append(offset)
+        offset += dtype.itemsize
+    if not packed:
+        offset += distance_to_next_multiply(offset, cls._ALIGNMENT)
+    return numpy.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": offset})
+
+
+def struct_dtype(cls, endianness):
+    """
+        Returns NumPy structured dtype laying out encoded messages of fixed layout struct,
+        with nested structs and arrays as nested dtypes and subarrays, optionals as pairs
+        of `present` flag and `value`.
+    """
+    import_numpy("struct dtype")
+    return _struct_dtype(cls, BYTE_ORDERS[endianness])
+
+
+def convert(tp, values):
+    values = numpy.asarray(values)
+    if numpy.can_cast(values.dtype, tp._DTYPE):
+        return values.astype(tp._DTYPE)
+    if tp._DTYPE.kind == 'f':
+        if values.dtype.kind not in 'iuf':
+            raise ProphyError("not a float")
+        return values.astype(tp._DTYPE)
+    if values.dtype.kind not in 'iu':
+        raise ProphyError("not an int")
+    info = numpy.iinfo(tp._DTYPE)
+    for value in (values.min(), values.max()) if values.size else ():
+        if not info.min <= value <= info.max:
+            raise ProphyError("value: {} out of {}B integer's bounds: [{}, {}]".format(
+                value, tp._TYPE._SIZE, info.min, info.max))
+    return values.astype(tp._DTYPE)
+
+
+def decode_ndarray(tp, data, pos, endianness, count):
+    if count is None:
+        count, remainder = divmod(len(data) - pos, tp._TYPE._SIZE)
+        if remainder:
+            raise ProphyTruncatedError("too few bytes to decode integer")
+    if count * tp._TYPE._SIZE > len(data) - pos:
+        raise ProphyTruncatedError("too few bytes to decode integer")
+    wire = numpy.frombuffer(data, dtype=tp._WIRE_DTYPES[endianness], count=count, offset=pos)
+    return wire.astype(tp._DTYPE), count * tp._TYPE._SIZE
+
+
+class base_ndarray(base_array):
+    """ Storage of fixed and bound ndarray arrays, which differ only in sizing and changing length. """
+    __slots__ = []
+
+    @property
+    def ndarray(self):
+        return self._values
+
+    def __setitem__(self, idx, value):
+        if isinstance(idx, slice):
+            self.__setslice__(idx.start, idx.stop, value)
+        else:
+            self._values[idx] = self._TYPE._check(value)
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if isinstance(other, base_array):
+            other = other._values
+        return numpy.array_equal(self._values, other)
+
+    def _clone(self):
+        copy = self.__class__.__new__(self.__class__)
+        copy._values = self._values.copy()
+        return copy
+
+    @classmethod
+    def _from_values(cls, values):
+        array = cls.__new__(cls)
+        array._values = numpy.array(values, dtype=cls._DTYPE)
+        return array
+
+    def _to_list(self):
+        return self._values.tolist()
+
+    def _snapshot(self):
+        return self._values.tobytes()
+
+    def _unchanged(self, snapshot):
+        return self._values.tobytes() == snapshot
+
+    def sort(self, key_function=None):
+        if key_function is None:
+            self._values.sort()
+        else:
+            self._values[:] = sorted(self._values, key=key_function)
+
+    def _encode_impl(self, endianness):
+        return self._values.astype(self._WIRE_DTYPES[endianness]).tobytes().ljust(self._SIZE, b"\x00")
+
+
+class fixed_ndarray(base_ndarray):
+    __slots__ = []
+
+    def __init__(self):
+        self._values = numpy.zeros(self._max_len, dtype=self._DTYPE)
+
+    def __setslice__(self, start, stop, values):
+        if len(self._values[start:stop]) != len(values):
+            raise ProphyError("setting slice with different length collection")
+        self._values[start:stop] = convert(self, values)
+
+    def _decode_impl(self, data, pos, endianness, _):
+        self._values, size = decode_ndarray(self, data, pos, endianness, self._max_len)
+        return size
+
+
+class bound_ndarray(base_ndarray):
+    __slots__ = []
+
+    def __init__(self):
+        self._values = numpy.zeros(0, dtype=self._DTYPE)
+
+    def append(self, value):
+        self.insert(len(self), value)
+
+    def insert(self, idx, value):
+        value = self._TYPE._check(value)
+        if self._max_len and len(self) == self._max_len:
+            raise ProphyError("exceeded array limit")
+        self._values = numpy.insert(self._values, idx, value)
+
+    def extend(self, values):
+        if not len(values):
+            return
+        if self._max_len and len(self) + len(values) > self._max_len:
+            raise ProphyError("exceeded array limit")
+        self._values = numpy.concatenate((self._values, convert(self, values)))
+
+    def remove(self, elem):
+        found = numpy.flatnonzero(self._values == elem)
+        if not found.size:
+            raise ValueError("ndarray.remove(x): x not in array")
+        self._values = numpy.delete(self._values, found[0])
+
+    def __setslice__(self, start, stop, values):
+        if self._max_len and len(self) + len(values) - len(self._values[start:stop]) > self._max_len:
+            raise ProphyError("exceeded array limit")
+        start, stop, _ = slice(start, stop).indices(len(self))
+        stop = max(start, stop)
+        self._values = numpy.concatenate((self._values[:start], convert(self, values), self._values[stop:]))
+
+    def __delitem__(self, idx):
+        self._values = numpy.delete(self._values, idx)
+
+    def __delslice__(self, start, stop):
+        self.__delitem__(slice(start, stop))
+
+    def _decode_impl(self, data, pos, endianness, len_hint):
+        if self._SIZE > (len(data) - pos):
+            raise ProphyTruncatedError("too few bytes to decode array")
+        if self._max_len and len_hint is not None and len_hint > self._max_len:
+            raise ProphyError("exceeded array limit")
+        self._values, size = decode_ndarray(self, data, pos, endianness, len_hint)
+        return max(size, self._SIZE)
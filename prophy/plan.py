@@ -0,0 +1,742 @@
+import struct
+
+from .composite import as_bytes, codec_kind, distance_to_next_multiply, lazy_fields, struct_packed, write_padding
+from .container import checked_decoded
+from .exception import ProphyError, ProphyTruncatedError, prefixed
+from .records import compile_layouts, speedups
+from .scalar import compile_structs
+from .six import xrange
+
+
+def guaranteed_alignment(alignment, offset):
+    while offset % alignment:
+        alignment //= 2
+    return alignment
+
+
+class _fallback(Exception):
+    """ Raised by fused items on input which only per-field decoding reports faithfully. """
+
+
+def decode_fields(msg, layout, data, pos, endianness, hints):
+    for field, alignment, partial_alignment in layout:
+        pos += distance_to_next_multiply(pos, alignment)
+        pos += field.decode_fcn(msg, field.name, field.type, data, pos, endianness, hints)
+        if partial_alignment > 1:
+            pos += distance_to_next_multiply(pos, partial_alignment)
+    return pos
+
+
+def decoded_check(type_):
+    """ Decoded numbers are within type bounds, only enumerators need to be checked. """
+    return type_._check if codec_kind.is_enum(type_) else None
+
+
+class _scalar_item(object):
+    __slots__ = ["name", "index", "check"]
+
+    def __init__(self, name, index, type_):
+        self.name = name
+        self.index = index
+        self.check = decoded_check(type_)
+
+    def collect(self, msg, values):
+        values.append(msg._fields[self.index])
+
+    def distribute(self, msg, values, index, _):
+        value = values[index]
+        msg._fields[self.index] = self.check(value) if self.check else value
+        return index + 1
+
+
+class _bytes_item(_scalar_item):
+    __slots__ = ["size", "bound"]
+
+    def __init__(self, name, index, type_):
+        super(_bytes_item, self).__init__(name, index, type_)
+        self.check = type_._check
+        self.size = type_._SIZE
+        self.bound = type_._BOUND
+
+    def collect(self, msg, values):
+        values.append(as_bytes(msg._fields[self.index] or b""))
+
+    def distribute(self, msg, values, index, hints):
+        value = values[index]
+        if self.bound:
+            length = hints.get(self.name)
+            if length is None or length > self.size:
+                raise _fallback()
+            value = value[:length]
+        msg._fields[self.index] = self.check(value)
+        return index + 1
+
+
+class _optional_item(object):
+    __slots__ = ["index", "check"]
+
+    def __init__(self, index, type_):
+        self.index = index
+        self.check = decoded_check(type_)
+
+    def collect(self, msg, values):
+        value = msg._fields[self.index]
+        if value is None:
+            values += (0, 0)
+        else:
+            values += (1, value)
+
+    def distribute(self, msg, values, index, _):
+        if values[index]:
+            value = values[index + 1]
+            msg._fields[self.index] = self.check(value) if self.check else value
+        else:
+            msg._fields[self.index] = None
+        return index + 2
+
+
+class _sizer_item(object):
+    __slots__ = ["type"]
+
+    def __init__(self, type_):
+        self.type = type_
+
+    def collect(self, msg, values):
+        values.append(self.type.evaluate_size(msg) + self.type._BOUND_SHIFT)
+
+    def distribute(self, _, values, index, hints):
+        length = self.type._decode_length(values[index])
+        for name in self.type._BOUND:
+            hints[name] = length
+        return index + 1
+
+
+class _array_item(object):
+    __slots__ = ["name", "index", "type", "filler", "size", "bound"]
+
+    def __init__(self, name, index, type_):
+        self.name = name
+        self.index = index
+        self.type = type_._TYPE
+        self.size = type_._max_len
+        self.bound = type_._BOUND
+        self.filler = [0 if self.bound else type_._TYPE._DEFAULT] * self.size
+
+    def collect(self, msg, values):
+        array = msg._fields[self.index]
+        if array is None:
+            values += self.filler
+        else:
+            values += array._values
+            values += self.filler[len(array._values):]
+
+    def distribute(self, msg, values, index, hints):
+        length = self.size
+        if self.bound:
+            length = hints.get(self.name)
+            if length is None or length > self.size:
+                raise _fallback()
+        getattr(msg, self.name)._values[:] = checked_decoded(self.type, values[index:index + length])
+        return index + self.size
+
+
+class _composite_item(object):
+    __slots__ = ["name", "index", "run", "defaults", "type_name"]
+
+    def __init__(self, name, index, type_, run, defaults):
+        self.name = name
+        self.index = index
+        self.run = run
+        self.defaults = defaults
+        self.type_name = type_.__name__
+
+    def collect(self, msg, values):
+        value = msg._fields[self.index]
+        if value is None:
+            values += self.defaults
+        else:
+            self.run.collect(value, values)
+
+    def distribute(self, msg, values, index, _):
+        try:
+            return self.run.distribute(getattr(msg, self.name), values, index)
+        except ProphyError as e:
+            raise prefixed(e, self.type_name)
+
+
+class _composite_array_item(_composite_item):
+    __slots__ = []
+
+    def collect(self, msg, values):
+        array = msg._fields[self.index]
+        if array is None:
+            values += self.defaults
+        else:
+            for elem in array._values:
+                self.run.collect(elem, values)
+
+    def distribute(self, msg, values, index, _):
+        for elem in getattr(msg, self.name):
+            try:
+                index = self.run.distribute(elem, values, index)
+            except ProphyError as e:
+                raise prefixed(e, self.type_name)
+        return index
+
+
+class fused_run(object):
+    """
+        Run of consecutive fixed-size fields coded with a single struct.Struct.
+        Format covers paddings between fields, so the run is position independent
+        once its start is padded to `alignment`.
+
+        With prophy._speedups available, items are also compiled into `native` run,
+        which codes them in C, calling back only items of bytes, sizers and bound or
+        enumerator arrays.
+    """
+    __slots__ = ["alignment", "items", "layout", "format", "structs", "size", "sizers", "views", "native"]
+
+    def __init__(self, alignment, items, layout, fmt):
+        self.alignment = alignment
+        self.items = items
+        self.layout = layout
+        self.format = fmt
+        self.structs = compile_structs(fmt)
+        self.size = self.structs['<'].size
+        self.sizers = any(isinstance(item, _sizer_item) for item in items)
+        self.views = any(isinstance(item, _bytes_item) or
+                         isinstance(item, _composite_item) and item.run.views for item in items)
+        self.native = _native_run(self) if speedups else None
+
+    def collect(self, msg, values):
+        for item in self.items:
+            item.collect(msg, values)
+
+    def distribute(self, msg, values, index, hints=None):
+        if hints is None and self.sizers:
+            hints = {}
+        for item in self.items:
+            index = item.distribute(msg, values, index, hints)
+        return index
+
+    def size_bound(self, _):
+        return self.size + self.alignment - 1
+
+    def measure(self, _, pos):
+        return pos + distance_to_next_multiply(pos, self.alignment) + self.size
+
+    def encode(self, msg, buf, pos, base, endianness):
+        if self.alignment > 1:
+            pos = write_padding(buf, pos, pos + distance_to_next_multiply(pos - base, self.alignment))
+        if self.native:
+            return self.native.encode(msg, buf, pos, endianness)
+        values = []
+        for item in self.items:
+            item.collect(msg, values)
+        packer = self.structs[endianness]
+        end = pos + self.size
+        if len(buf) >= end:
+            packer.pack_into(buf, pos, *values)
+        else:
+            buf[pos:end] = packer.pack(*values)
+        return end
+
+    def decode(self, msg, data, pos, endianness, hints):
+        if self.alignment > 1:
+            pos += distance_to_next_multiply(pos, self.alignment)
+        try:
+            if self.views and isinstance(data, memoryview):
+                raise _fallback()
+            if self.native:
+                self.native.decode(msg, data, pos, endianness, hints)
+                return pos + self.size
+            values = self.structs[endianness].unpack_from(data, pos) if self.size else ()
+            index = 0
+            for item in self.items:
+                index = item.distribute(msg, values, index, hints)
+        except (struct.error, _fallback):
+            decode_fields(msg, self.layout, data, pos, endianness, hints)
+        return pos + self.size
+
+
+def _native_run(run):
+    """ Compiles run into ops of prophy._speedups.run, see _speedups.c. """
+    ops = []
+    for item in run.items:
+        if item.__class__ is _scalar_item and item.check is None:
+            if ops and ops[-1][0] == "fields" and ops[-1][1] + ops[-1][2] == item.index:
+                ops[-1] = ("fields", ops[-1][1], ops[-1][2] + 1)
+            else:
+                ops.append(("fields", item.index, 1))
+        elif item.__class__ is _scalar_item:
+            ops.append(("check", item.index, item.check))
+        elif item.__class__ is _optional_item:
+            ops.append(("optional", item.index, item.check))
+        elif item.__class__ is _array_item and not item.bound and item.type._TYPECODE:
+            ops.append(("array", item.index, item.name, item.size, item.filler))
+        elif item.__class__ is _composite_item:
+            ops.append(("composite", item.index, item.name, item.run.native, item.defaults, item.type_name))
+        elif item.__class__ is _composite_array_item:
+            ops.append(("composite_array", item.index, item.name, item.run.native, item.defaults, item.type_name))
+        else:
+            ops.append(("item", item, item.size if item.__class__ is _array_item else 1))
+    return speedups.run(compile_layouts(run.structs), ops, run.sizers)
+
+
+class padding_step(object):
+    __slots__ = ["alignment"]
+
+    def __init__(self, alignment):
+        self.alignment = alignment
+
+    def size_bound(self, _):
+        return self.alignment - 1
+
+    def measure(self, _, pos):
+        return pos + distance_to_next_multiply(pos, self.alignment)
+
+    def encode(self, _, buf, pos, base, __):
+        return write_padding(buf, pos, pos + distance_to_next_multiply(pos - base, self.alignment))
+
+    def decode(self, _, __, pos, ___, ____):
+        return pos + distance_to_next_multiply(pos, self.alignment)
+
+
+class field_step(object):
+    """ Field which cannot be fused, coded on its own between runtime-computed paddings. """
+    __slots__ = ["field", "alignment", "partial_alignment", "write"]
+
+    def __init__(self, field, alignment, partial_alignment):
+        self.field = field
+        self.alignment = alignment
+        self.partial_alignment = partial_alignment
+        if codec_kind.classify(field.type) in (codec_kind.ARRAY, codec_kind.COMPOSITE):
+            self.write = _write_value
+        else:
+            self.write = _write_encoded
+
+    def size_bound(self, msg):
+        field = self.field
+        return self.alignment + self.partial_alignment - 2 + size_bound(field.type, getattr(msg, field.name, None))
+
+    def measure(self, msg, pos):
+        field = self.field
+        pos += distance_to_next_multiply(pos, self.alignment)
+        pos += encoded_size(field.type, getattr(msg, field.name, None))
+        return pos + distance_to_next_multiply(pos, self.partial_alignment)
+
+    def encode(self, msg, buf, pos, base, endianness):
+        if self.alignment > 1:
+            pos = write_padding(buf, pos, pos + distance_to_next_multiply(pos - base, self.alignment))
+        pos = self.write(msg, self.field, buf, pos, endianness)
+        if self.partial_alignment > 1:
+            pos = write_padding(buf, pos, pos + distance_to_next_multiply(pos - base, self.partial_alignment))
+        return pos
+
+    def decode(self, msg, data, pos, endianness, hints):
+        field = self.field
+        if self.alignment > 1:
+            pos += distance_to_next_multiply(pos, self.alignment)
+        pos += field.decode_fcn(msg, field.name, field.type, data, pos, endianness, hints)
+        if self.partial_alignment > 1:
+            pos += distance_to_next_multiply(pos, self.partial_alignment)
+        return pos
+
+
+def size_bound(type_, value):
+    """ Upper bound of field's encoded size, exact but for paddings of nested structs. """
+    kind = codec_kind.classify(type_)
+    if kind == codec_kind.OPTIONAL:
+        if value is None:
+            return type_._OPTIONAL_SIZE
+        return type_._OPTIONAL_ALIGNMENT + max(type_._SIZE, size_bound(type_.__bases__[0], value))
+    elif kind == codec_kind.ARRAY:
+        if codec_kind.is_composite(type_._TYPE):
+            return max(type_._SIZE, sum(size_bound(type_._TYPE, elem) for elem in value))
+        return max(type_._SIZE, len(value) * type_._TYPE._SIZE)
+    elif kind == codec_kind.COMPOSITE:
+        if codec_kind.is_struct(type_):
+            return value._codec_plan.size_bound(value)
+        return value.encoded_size()
+    elif kind == codec_kind.BYTES:
+        return max(type_._SIZE, len(value))
+    return type_._SIZE
+
+
+def encoded_size(type_, value):
+    """ Exact encoded size of field, nested structs pad relative to their own start. """
+    kind = codec_kind.classify(type_)
+    if kind == codec_kind.OPTIONAL:
+        if value is None:
+            return type_._OPTIONAL_SIZE
+        return type_._OPTIONAL_ALIGNMENT + encoded_size(type_.__bases__[0], value)
+    elif kind == codec_kind.ARRAY:
+        if codec_kind.is_composite(type_._TYPE):
+            size = sum(encoded_size(type_._TYPE, elem) for elem in value)
+            return max(type_._SIZE, size) if type_._BOUND else size
+        return max(type_._SIZE, len(value) * type_._TYPE._SIZE)
+    elif kind == codec_kind.COMPOSITE:
+        return value.encoded_size()
+    elif kind == codec_kind.BYTES:
+        return max(type_._SIZE, len(value))
+    return type_._SIZE
+
+
+def extent(type_, data, pos, endianness, len_hint):
+    """ Number of bytes field occupies in data, checking only what eager decoding needs to size it. """
+    if not type_._OPTIONAL and codec_kind.is_struct(type_):
+        try:
+            return type_._codec_plan.scan(data, pos, endianness) - pos
+        except ProphyError as e:
+            raise prefixed(e, type_.__name__)
+    available = len(data) - pos
+    kind = codec_kind.classify(type_)
+    if kind == codec_kind.OPTIONAL:
+        flag, _ = type_._optional_type._decode(data, pos, endianness)
+        if flag:
+            base = type_.__bases__[0]
+            return type_._OPTIONAL_ALIGNMENT + extent(base, data, pos + type_._OPTIONAL_ALIGNMENT, endianness, len_hint)
+        return type_._OPTIONAL_ALIGNMENT + type_._SIZE
+    elif kind == codec_kind.ARRAY:
+        return _array_extent(type_, data, pos, endianness, len_hint)
+    elif kind == codec_kind.COMPOSITE:
+        if available < type_._SIZE:
+            raise ProphyTruncatedError("not enough bytes")
+        return type_._SIZE
+    elif kind == codec_kind.BYTES:
+        return type_._decode(data, pos, len_hint)[1]
+    if available < type_._SIZE:
+        raise ProphyTruncatedError("too few bytes to decode integer")
+    return type_._SIZE
+
+
+def _static_extent(type_):
+    """ Size of scalar, fixed bytes or fixed scalar array, which take fixed number of bytes, 0 otherwise. """
+    kind = codec_kind.classify(type_)
+    if type_._DYNAMIC or type_._BOUND:
+        return 0
+    if kind == codec_kind.ARRAY and not codec_kind.is_composite(type_._TYPE):
+        return type_._SIZE
+    if kind in (codec_kind.BYTES, codec_kind.SCALAR):
+        return type_._SIZE
+    return 0
+
+
+def _array_extent(type_, data, pos, endianness, len_hint):
+    if codec_kind.is_composite(type_._TYPE):
+        cursor = 0
+        if not type_._DYNAMIC and not type_._BOUND:
+            for _ in xrange(type_._max_len):
+                cursor += extent(type_._TYPE, data, pos + cursor, endianness, None)
+            return cursor
+        if type_._SIZE > len(data) - pos:
+            raise ProphyTruncatedError("too few bytes to decode array")
+        if not type_._SIZE and not type_._BOUND:
+            while pos + cursor < len(data):
+                cursor += extent(type_._TYPE, data, pos + cursor, endianness, None)
+            return cursor
+        if type_._max_len and len_hint > type_._max_len:
+            raise ProphyError("exceeded array limit")
+        for _ in xrange(len_hint):
+            cursor += extent(type_._TYPE, data, pos + cursor, endianness, None)
+        return max(cursor, type_._SIZE)
+    elem_size = type_._TYPE._SIZE
+    if type_._BOUND:
+        if type_._SIZE > len(data) - pos:
+            raise ProphyTruncatedError("too few bytes to decode array")
+        if type_._max_len and len_hint > type_._max_len:
+            raise ProphyError("exceeded array limit")
+        count = len_hint
+    elif not type_._DYNAMIC:
+        count = type_._max_len
+    else:
+        count = -(-(len(data) - pos) // elem_size)
+    if count * elem_size > len(data) - pos:
+        raise ProphyTruncatedError("too few bytes to decode integer")
+    return max(count * elem_size, type_._SIZE)
+
+
+def _write_value(msg, field, buf, pos, endianness):
+    return getattr(msg, field.name)._encode_into(buf, pos, endianness)
+
+
+def _write_encoded(msg, field, buf, pos, endianness):
+    data = field.encode_fcn(msg, field.type, getattr(msg, field.name, None), endianness)
+    end = pos + len(data)
+    buf[pos:end] = data
+    return end
+
+
+_no_hints = {}
+
+
+class codec_plan(object):
+    """
+        Per-class coding program: fused runs of fixed fields and single-field steps.
+        Offsets are static only as long as all preceding fields are fused, so `size`
+        is set just for classes coded entirely by a single run, kept in `fused`.
+
+        Encoding pads relative to the message start, decoding relative to the input
+        start like the descriptor-driven codec, which for inputs misaligned against
+        `alignment` is still used as is.
+
+        Steps are interpreted by `encode_steps` and `decode_steps`, unless `encoder`
+        and `decoder` are replaced with functions generated from them.
+    """
+    __slots__ = ["steps", "size", "fused", "alignment", "layout", "sizers", "extents", "encoder", "decoder",
+                 "source", "records"]
+
+    def __init__(self, steps, size, alignment, layout):
+        self.steps = steps
+        self.size = size
+        self.alignment = alignment
+        self.layout = layout
+        self.sizers = any(codec_kind.is_array_sizer(field.type) for field, _, _ in layout)
+        self.extents = [_static_extent(field.type) for field, _, _ in layout]
+        if size is not None and len(steps) == 1 and isinstance(steps[0], fused_run):
+            self.fused = steps[0]
+        else:
+            self.fused = None
+        self.encoder = self.encode_steps
+        self.decoder = self.decode_steps
+        self.source = None
+        self.records = None
+
+    def size_bound(self, msg):
+        if self.fused:
+            return self.size
+        if msg._fields.__class__ is lazy_fields and msg._fields.is_clean():
+            return msg._fields.end - msg._fields.start
+        return sum(step.size_bound(msg) for step in self.steps)
+
+    def encoded_size(self, msg):
+        if self.fused:
+            return self.size
+        if msg._fields.__class__ is lazy_fields and msg._fields.is_clean():
+            return msg._fields.end - msg._fields.start
+        pos = 0
+        for step in self.steps:
+            pos = step.measure(msg, pos)
+        return pos
+
+    def encode_into(self, msg, buf, pos, endianness):
+        if msg._fields.__class__ is lazy_fields and msg._fields.is_clean(endianness):
+            data = msg._fields.source()
+            buf[pos:pos + len(data)] = data
+            return pos + len(data)
+        return self.encoder(msg, buf, pos, endianness)
+
+    def encode_steps(self, msg, buf, pos, endianness):
+        if self.fused:
+            return self.fused.encode(msg, buf, pos, pos, endianness)
+        base = pos
+        for step in self.steps:
+            pos = step.encode(msg, buf, pos, base, endianness)
+        return pos
+
+    def decode(self, msg, data, pos, endianness):
+        return self.decoder(msg, data, pos, endianness)
+
+    def decode_steps(self, msg, data, pos, endianness):
+        hints = {} if self.sizers else _no_hints
+        if pos % self.alignment:
+            pos = decode_fields(msg, self.layout, data, pos, endianness, hints)
+            return pos + distance_to_next_multiply(pos, self.alignment)
+        for step in self.steps:
+            pos = step.decode(msg, data, pos, endianness, hints)
+        return pos
+
+    def scan(self, data, pos, endianness, pending=None):
+        """ Returns end position, collecting positions of fields as {name: (type, pos, len_hint)} into pending. """
+        if pending is None and self.fused and not pos % self.alignment and self.size <= len(data) - pos:
+            return pos + self.size
+        hints = {}
+        for index, ((field, alignment, partial_alignment), size) in enumerate(zip(self.layout, self.extents)):
+            pos += distance_to_next_multiply(pos, alignment)
+            if size and size <= len(data) - pos:
+                if pending is not None:
+                    pending[index] = (field.type, pos, None)
+                pos += size
+            elif codec_kind.is_array_sizer(field.type):
+                length, size = field.type._decode(data, pos, endianness)
+                for name in field.type._BOUND:
+                    hints[name] = length
+                pos += size
+            else:
+                len_hint = hints.get(field.name)
+                if pending is not None:
+                    pending[index] = (field.type, pos, len_hint)
+                pos += extent(field.type, data, pos, endianness, len_hint)
+            if partial_alignment > 1:
+                pos += distance_to_next_multiply(pos, partial_alignment)
+        return pos + distance_to_next_multiply(pos, self.alignment)
+
+
+class _plan_builder(object):
+    """
+        Groups fields into runs. Position is tracked as a static `offset` until the first
+        unfused field, later only as alignment `known` to hold at runtime, which decides
+        whether next field still fits into the current run.
+    """
+
+    def __init__(self, packed):
+        self.packed = packed
+        self.steps = []
+        self.layout = []
+        self.offset = 0
+        self.known = 1
+        self.run_items = None
+        self.run_layout = None
+        self.run_format = None
+        self.run_alignment = None
+        self.run_known = None
+        self.run_offset = None
+
+    def alignment(self, alignment):
+        return 1 if self.packed else (alignment or 1)
+
+    def add_fused(self, field, item, fmt, size):
+        alignment = self.alignment(field.type._ALIGNMENT)
+        if self.run_items is not None and self.run_known % alignment:
+            self.close_run()
+        if self.run_items is None:
+            self.open_run(alignment)
+        padding = distance_to_next_multiply(self.run_offset, alignment)
+        self.run_items.append(item)
+        self.run_layout.append((field, alignment, 1))
+        self.run_format.append("%dx%s" % (padding, fmt) if padding else fmt)
+        self.run_offset += padding + size
+        self.layout.append((field, alignment, 1))
+
+    def open_run(self, alignment):
+        self.run_items = []
+        self.run_layout = []
+        self.run_format = []
+        if self.offset is not None:
+            self.run_alignment = 1
+            self.run_known = 0
+            self.run_offset = self.offset
+        else:
+            self.run_alignment = 1 if self.known % alignment == 0 else alignment
+            self.run_known = max(self.known, alignment)
+            self.run_offset = 0
+
+    def close_run(self):
+        if self.run_items is None:
+            return
+        run = fused_run(self.run_alignment, self.run_items, self.run_layout, "".join(self.run_format))
+        self.steps.append(run)
+        if self.offset is not None:
+            self.offset = self.run_offset
+        else:
+            self.known = guaranteed_alignment(self.run_known, self.run_offset)
+        self.run_items = None
+
+    def add_field(self, field):
+        self.close_run()
+        alignment = self.alignment(field.type._ALIGNMENT)
+        partial_alignment = self.alignment(field.type._PARTIAL_ALIGNMENT)
+        self.steps.append(field_step(field, alignment, partial_alignment))
+        self.layout.append((field, alignment, partial_alignment))
+        self.offset = None
+        self.known = partial_alignment
+
+    def finish(self, alignment):
+        alignment = self.alignment(alignment)
+        if self.run_items is None and self.offset is not None:
+            self.open_run(alignment)
+        if self.run_items is not None and self.run_known % alignment == 0:
+            padding = distance_to_next_multiply(self.run_offset, alignment)
+            if padding:
+                self.run_format.append("%dx" % padding)
+                self.run_offset += padding
+            self.close_run()
+        else:
+            self.close_run()
+            if alignment > 1:
+                self.steps.append(padding_step(alignment))
+        return codec_plan(self.steps, self.offset, alignment, self.layout)
+
+
+def _inlined_run(type_, packed):
+    """ Fused run of nested struct, unless decoding it within packed parent would pad differently. """
+    plan = getattr(type_, "_codec_plan", None)
+    if plan is None or (packed and plan.alignment > 1):
+        return None
+    return plan.fused
+
+
+def _fused_layout(field, index, packed):
+    """ Returns (item, format, size) of field codable within a fused run or None. """
+    type_ = field.type
+    kind = codec_kind.classify(type_)
+    if kind == codec_kind.SCALAR:
+        fmt = getattr(type_, "_FORMAT", None)
+        if fmt is None:
+            return None
+        return _scalar_item(field.name, index, type_), fmt, type_._SIZE
+    elif kind == codec_kind.ARRAY_SIZER:
+        return _sizer_item(type_), type_._FORMAT, type_._SIZE
+    elif kind == codec_kind.OPTIONAL:
+        base = type_.__bases__[0]
+        if codec_kind.classify(base) != codec_kind.SCALAR or not hasattr(base, "_FORMAT"):
+            return None
+        flag = type_._optional_type
+        padding = type_._OPTIONAL_ALIGNMENT - flag._SIZE
+        fmt = flag._FORMAT + ("%dx" % padding if padding else "") + base._FORMAT
+        return _optional_item(index, type_), fmt, type_._OPTIONAL_SIZE
+    elif kind == codec_kind.BYTES:
+        if type_._DYNAMIC:
+            return None
+        return _bytes_item(field.name, index, type_), "%ds" % type_._SIZE, type_._SIZE
+    elif kind == codec_kind.ARRAY:
+        elem = type_._TYPE
+        if type_._DYNAMIC or type_._DTYPE is not None:
+            return None
+        if codec_kind.is_composite(elem):
+            run = _inlined_run(elem, packed)
+            if run is None or type_._BOUND:
+                return None
+            defaults = []
+            run.collect(elem(), defaults)
+            item = _composite_array_item(field.name, index, elem, run, defaults * type_._max_len)
+            return item, run.format * type_._max_len, run.size * type_._max_len
+        fmt = getattr(elem, "_FORMAT", None)
+        if fmt is None:
+            return None
+        return _array_item(field.name, index, type_), "%d%s" % (type_._max_len, fmt), type_._SIZE
+    elif kind == codec_kind.COMPOSITE:
+        run = _inlined_run(type_, packed)
+        if run is None:
+            return None
+        defaults = []
+        run.collect(type_(), defaults)
+        return _composite_item(field.name, index, type_, run, defaults), run.format, run.size
+    return None
+
+
+def compile_codec_plan(cls):
+    packed = issubclass(cls, struct_packed)
+    builder = _plan_builder(packed)
+    for index, field in enumerate(cls._descriptor):
+        layout = _fused_layout(field, index, packed)
+        if layout:
+            builder.add_fused(field, *layout)
+        else:
+            builder.add_field(field)
+    plan = builder.finish(cls._ALIGNMENT)
+    plan.records = _record_layouts(plan, cls)
+    return plan
+
+
+def _record_layouts(plan, cls):
+    """
+        Layouts of fixed class, whose fields are all plain scalars coded in order, which
+        makes its field storage exactly the tuple of values packed and unpacked by them.
+    """
+    if not plan.fused or not plan.size or len(plan.fused.items) != len(cls._descriptor):
+        return None
+    for index, (item, (field, _, _)) in enumerate(zip(plan.fused.items, plan.fused.layout)):
+        if item.__class__ is not _scalar_item or item.index != index or codec_kind.is_enum(field.type):
+            return None
+    return compile_layouts(plan.fused.structs)
@@ -0,0 +1,55 @@
+from .exception import ProphyError
+
+
+class buffer_pool(object):
+    """
+        Reusable bytearray slabs for encoding, kept in buckets of power of two sizes.
+        Slab acquired for a message, e.g. by `encode`, should be released once the
+        encoded data is sent; up to `max_free` slabs are kept per bucket. Acquisitions
+        served from kept slabs count as `hits`, ones allocating new slabs as `misses`.
+        Releasing slab which is already kept is an error, as it would be acquired twice.
+    """
+    __slots__ = ["max_free", "min_size", "hits", "misses", "_buckets", "_kept"]
+
+    def __init__(self, max_free=64, min_size=64):
+        self.max_free = max_free
+        self.min_size = min_size
+        self.hits = 0
+        self.misses = 0
+        self._buckets = {}
+        self._kept = set()
+
+    @property
+    def free(self):
+        return sum(len(slabs) for slabs in self._buckets.values())
+
+    def _bucket(self, size):
+        return 1 << (max(size, self.min_size) - 1).bit_length()
+
+    def acquire(self, size):
+        """ Returns slab of at least given size. """
+        bucket = self._bucket(size)
+        slabs = self._buckets.get(bucket)
+        if slabs:
+            self.hits += 1
+            buf = slabs.pop()
+            self._kept.discard(id(buf))
+            return buf
+        self.misses += 1
+        return bytearray(bucket)
+
+    def release(self, buf):
+        if not isinstance(buf, bytearray) or len(buf) != self._bucket(len(buf)):
+            raise ProphyError("not a slab of buffer pool")
+        # kept slabs are referenced by pool, so their ids are unique
+        if id(buf) in self._kept:
+            raise ProphyError("slab released twice")
+        slabs = self._buckets.setdefault(len(buf), [])
+        if len(slabs) < self.max_free:
+            slabs.append(buf)
+            self._kept.add(id(buf))
+
+    def encode(self, msg, endianness):
+        """ Encodes message into acquired slab, returns the slab and size of encoded data. """
+        buf = self.acquire(msg.encoded_size())
+        return buf, msg._encode_into(buf, 0, endianness)
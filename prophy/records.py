@@ -0,0 +1,53 @@
+"""
+    Coding of arrays of records: fixed structs of plain scalars, whose field
+    storage maps one to one onto values of their struct.Struct format.
+
+    Functions are taken from compiled prophy._speedups extension if it was built,
+    unless PROPHY_NO_SPEEDUPS=1 is set in environment. Pure Python ones below
+    are the reference implementation and fallback. Extension codes records with
+    its own layouts, which unpack and pack values of formats without calling
+    Python, and also provides runs coding fused runs of fields, see plan.py.
+"""
+import os
+
+from .six import xrange
+
+
+def decode_records_py(cls, layout, data, pos, size, count):
+    """ Returns list of `count` messages of class `cls` decoded from consecutive records. """
+    records = []
+    for _ in xrange(count):
+        record = cls.__new__(cls)
+        record._fields = list(layout.unpack_from(data, pos))
+        records.append(record)
+        pos += size
+    return records
+
+
+def encode_records_py(records, layout, buf, pos, size):
+    """ Encodes messages one after another into buffer large enough, returns end position. """
+    for record in records:
+        layout.pack_into(buf, pos, *record._fields)
+        pos += size
+    return pos
+
+
+def compile_layouts(structs):
+    """ Returns layouts of records per endianness, given their struct.Struct objects. """
+    if speedups is None:
+        return structs
+    return {endianness: speedups.layout(packer.format) for endianness, packer in structs.items()}
+
+
+decode_records = decode_records_py
+encode_records = encode_records_py
+speedups = None
+
+if os.environ.get("PROPHY_NO_SPEEDUPS", "0") == "0":
+    try:
+        from ._speedups import decode_records, encode_records  # noqa: F401
+        from . import _speedups as speedups
+    except ImportError:
+        pass
+
+accelerated = speedups is not None
@@ -0,0 +1,65 @@
+from .exception import ProphyError
+
+
+class message_registry(object):
+    """
+        Maps message ids to classes of messages following a common header.
+
+        Header's `id_field` selects class of message body, which is decoded from the
+        same buffer right past the header. Decoding pads relative to buffer start, so
+        registered classes need alignment dividing header size, like when header and
+        body are encoded one after another. Decoded messages are counted by id.
+    """
+    __slots__ = ["header", "id_field", "classes", "ids", "counters", "_id_type"]
+
+    def __init__(self, header, id_field):
+        fields = [field for field in header._descriptor if field.name == id_field]
+        if not fields:
+            raise ProphyError("{} has no field {!r}".format(header.__name__, id_field))
+        self.header = header
+        self.id_field = id_field
+        self.classes = {}
+        self.ids = {}  # classes are not hashable, they are keyed by identity
+        self.counters = {}
+        self._id_type = fields[0].type
+
+    def register(self, id_, cls=None):
+        """ Registers class under id, which may be enumerator name; returns decorator if class is not given. """
+        if cls is None:
+            def decorator(cls):
+                self.register(id_, cls)
+                return cls
+            return decorator
+
+        id_ = self._id_type._check(id_)
+        if id_ in self.classes:
+            raise ProphyError("id {!r} already registered for {}".format(id_, self.classes[id_].__name__))
+        if not self.header._DYNAMIC and self.header._SIZE % cls._ALIGNMENT:
+            raise ProphyError("{} misaligned after {}".format(cls.__name__, self.header.__name__))
+        self.classes[id_] = cls
+        self.ids[id(cls)] = id_
+        self.counters[id_] = 0
+
+    def decode(self, data, endianness):
+        """ Returns (header, body) decoded from whole data. """
+        header = self.header()
+        pos = header._decode_impl(data, 0, endianness, terminal=False)
+        id_ = getattr(header, self.id_field)
+        cls = self.classes.get(id_)
+        if cls is None:
+            raise ProphyError("unknown message id: {!r}".format(id_))
+        body = cls()
+        body._decode_impl(data, pos, endianness, terminal=True)
+        self.counters[id_] += 1
+        return header, body
+
+    def encode(self, header, body, endianness):
+        """ Encodes header, with id field set to one of body's class, followed by body. """
+        id_ = self.ids.get(id(body.__class__))
+        if id_ is None:
+            raise ProphyError("{} not registered".format(body.__class__.__name__))
+        setattr(header, self.id_field, id_)
+        data = bytearray(header._SIZE + body._SIZE)
+        pos = header._encode_into(data, 0, endianness)
+        del data[body._encode_into(data, pos, endianness):]
+        return bytes(data)
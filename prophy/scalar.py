@@ -1,30 +1,63 @@
+import array
 import struct
 
-from .exception import ProphyError
+from .exception import ProphyError, ProphyTruncatedError
 from .six import long
 
 
+ENDIANNESS_PREFIXES = {'<': '<', '>': '>', '=': '=', '!': '!', '@': '='}
+
+
+def compile_structs(fmt):
+    return {endianness: struct.Struct(prefix + fmt) for endianness, prefix in ENDIANNESS_PREFIXES.items()}
+
+
+def array_typecode(id_, size):
+    """ Returns array.array typecode of matching item size or None if platform lacks it. """
+    try:
+        if array.array(id_).itemsize == size:
+            return id_
+    except ValueError:
+        pass
+    return None
+
+
 class prophy_data_object(object):
     _is_prophy_object = True
     __slots__ = []
 
 
 def numeric_decorator(cls, size, id_):
+    structs = compile_structs(id_)
+
     @staticmethod
     def encode(value, endianness):
-        return struct.pack(endianness + id_, value)
+        return structs[endianness].pack(value)
 
     @staticmethod
     def decode(data, pos, endianness):
         if (len(data) - pos) < size:
-            raise ProphyError("too few bytes to decode integer")
-        value, = struct.unpack(endianness + id_, data[pos:(pos + size)])
+            raise ProphyTruncatedError("too few bytes to decode integer")
+        value, = structs[endianness].unpack_from(data, pos)
         return value, size
 
+    @staticmethod
+    def encode_array(values, endianness):
+        return struct.pack("%s%d%s" % (ENDIANNESS_PREFIXES[endianness], len(values), id_), *values)
+
+    @staticmethod
+    def decode_array(data, pos, endianness, count):
+        return struct.unpack_from("%s%d%s" % (ENDIANNESS_PREFIXES[endianness], count, id_), data, pos)
+
     cls._is_prophy_object = True
     cls._encode = encode
     cls._decode = decode
+    cls._encode_array = encode_array
+    cls._decode_array = decode_array
 
+    cls._FORMAT = id_
+    cls._STRUCTS = structs
+    cls._TYPECODE = array_typecode(id_, size)
     cls._SIZE = size
     cls._ALIGNMENT = size
     cls._DYNAMIC = False
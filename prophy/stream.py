@@ -0,0 +1,83 @@
+from .exception import ProphyError, ProphyTruncatedError
+
+DEFAULT_MAX_SIZE = 1 << 24
+
+
+class stream_decoder(object):
+    """
+        Incremental decoder of back to back messages of given struct or union class.
+        Chunks passed to `feed` are buffered and messages are returned as soon as
+        they are complete. Size of message is found by scanning its sizers, so it's
+        decoded only once it's buffered whole. Data ending before the size can be told
+        is a sign of incomplete message until `max_size` bytes are buffered (no limit
+        if 0), decoding errors, e.g. unknown union discriminator, are raised at once.
+
+        Messages start at offsets aligned to class alignment, since decoding pads
+        relative to buffer start. Consumed bytes are dropped once per feed, so only
+        the incomplete remainder is moved.
+    """
+    __slots__ = ["cls", "endianness", "max_size", "_buffer", "_plan", "_min_size", "_needed"]
+
+    def __init__(self, cls, endianness, max_size=DEFAULT_MAX_SIZE):
+        if cls._UNLIMITED:
+            raise ProphyError("stream of unlimited messages not allowed")
+        if not cls._SIZE and not cls._DYNAMIC:
+            raise ProphyError("stream of empty messages not allowed")
+        self.cls = cls
+        self.endianness = endianness
+        self.max_size = max_size
+        self._buffer = bytearray()
+        self._plan = getattr(cls, "_codec_plan", None)
+        if self._plan is None:
+            self._min_size = max(cls._SIZE, 1)
+        else:
+            # _SIZE of struct with optional fields may exceed its encoded size
+            self._min_size = self._plan.size if self._plan.fused else 1
+        self._needed = self._min_size
+
+    @property
+    def pending(self):
+        return len(self._buffer)
+
+    def feed(self, data):
+        buf = self._buffer
+        buf += data
+        messages = []
+        offset = 0
+        while len(buf) - offset >= self._needed:
+            if offset % self.cls._ALIGNMENT:
+                del buf[:offset]
+                offset = 0
+            try:
+                end = self._end(buf, offset)
+                if end is None:
+                    break
+                msg = self.cls()
+                msg._decode_impl(buf, offset, self.endianness, terminal=False)
+            except ProphyError:
+                del buf[:offset]
+                raise
+            messages.append(msg)
+            offset = end
+        if offset:
+            del buf[:offset]
+        return messages
+
+    def _end(self, buf, offset):
+        """ End of message starting at offset, None if it's incomplete; size of incomplete one is kept if known. """
+        available = len(buf) - offset
+        if self._plan is None:
+            size = self.cls._SIZE
+        else:
+            try:
+                size = self._plan.scan(buf, offset, self.endianness) - offset
+            except ProphyTruncatedError:
+                if self.max_size and available >= self.max_size:
+                    raise
+                return None
+        if size <= available:
+            self._needed = self._min_size
+            return offset + size
+        # decoding tolerates missing trailing padding, which is yet to come as well
+        self._needed = size
+        return None
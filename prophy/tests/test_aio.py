@@ -0,0 +1,164 @@
+import socket
+import struct
+
+import prophy
+import pytest
+
+asyncio = pytest.importorskip("asyncio")
+aio = pytest.importorskip("prophy.aio")
+
+
+@pytest.fixture(scope='session')
+def Message():
+    class Message(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("id", prophy.u16),
+                       ("n", prophy.u32),
+                       ("payload", prophy.bytes(bound="n"))]
+    return Message
+
+
+class fake_transport(object):
+    def __init__(self):
+        self.written = []
+        self.paused = False
+        self.closed = False
+
+    def write(self, data):
+        self.written.append(data)
+
+    def pause_reading(self):
+        self.paused = True
+
+    def resume_reading(self):
+        self.paused = False
+
+    def is_closing(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+def make(Message, id_, payload=b""):
+    x = Message()
+    x.id = id_
+    x.payload = payload
+    return x
+
+
+def test_protocol_backpressure(loop, Message):
+    protocol = aio.message_protocol(Message, ">", max_queued=2)
+    transport = fake_transport()
+    protocol.connection_made(transport)
+
+    data = b"".join(make(Message, i).encode(">") for i in range(3))
+    protocol.data_received(data[:5])
+    protocol.data_received(data[5:])
+    assert transport.paused
+
+    assert loop.run_until_complete(protocol.receive()).id == 0
+    assert transport.paused
+    assert loop.run_until_complete(protocol.receive()).id == 1
+    assert not transport.paused
+
+    future = protocol.receive()
+    assert future.result().id == 2
+    future = protocol.receive()
+    assert not future.done()
+    protocol.connection_lost(None)
+    assert future.result() is None
+
+
+def test_protocol_receive_after_timeout(loop, Message):
+    protocol = aio.message_protocol(Message, ">")
+    transport = fake_transport()
+    protocol.connection_made(transport)
+
+    with pytest.raises(asyncio.TimeoutError):
+        loop.run_until_complete(asyncio.wait_for(protocol.receive(), 0.01))
+
+    future = protocol.receive()
+    protocol.data_received(make(Message, 1).encode(">"))
+    assert loop.run_until_complete(future).id == 1
+
+
+def test_protocol_decode_error(loop, Message):
+    protocol = aio.message_protocol(Message, ">", max_size=8)
+    transport = fake_transport()
+    protocol.connection_made(transport)
+
+    future = protocol.receive()
+    protocol.data_received(b"\x00\x01\x00\x00\x00\x00\x00\xff")
+    assert transport.closed
+    with pytest.raises(prophy.ProphyError, match="too few bytes to decode string"):
+        future.result()
+
+
+def test_protocol_coalesces_writes(loop, Message):
+    protocol = aio.message_protocol(Message, ">")
+    transport = fake_transport()
+    protocol.connection_made(transport)
+
+    protocol.send(make(Message, 1, b"a"))
+    protocol.send(make(Message, 2, b"bc"))
+    assert transport.written == []
+    loop.run_until_complete(asyncio.sleep(0))
+
+    assert transport.written == [make(Message, 1, b"a").encode(">") + make(Message, 2, b"bc").encode(">")]
+
+
+def test_protocol_drops_message_failing_to_encode(loop, Message):
+    protocol = aio.message_protocol(Message, ">")
+    transport = fake_transport()
+    protocol.connection_made(transport)
+
+    protocol.send(make(Message, 1, b"a"))
+    with pytest.raises(struct.error):
+        protocol.send(Message.unchecked(id=70000))
+    with pytest.raises(Exception):
+        protocol.send(Message.unchecked(payload=[1]))
+    protocol.send(make(Message, 2, b"bc"))
+    loop.run_until_complete(asyncio.sleep(0))
+
+    assert transport.written == [make(Message, 1, b"a").encode(">") + make(Message, 2, b"bc").encode(">")]
+
+
+def test_protocol_concurrent_drains(loop, Message):
+    protocol = aio.message_protocol(Message, ">")
+    protocol.connection_made(fake_transport())
+
+    protocol.pause_writing()
+    first = protocol.drain()
+    second = protocol.drain()
+    assert not first.done() and not second.done()
+    protocol.resume_writing()
+    assert first.done() and second.done()
+    assert protocol.drain().done()
+
+
+def test_protocol_over_socket(loop, Message):
+    def connect(sock):
+        connecting = loop.create_connection(lambda: aio.message_protocol(Message, "<"), sock=sock)
+        return loop.run_until_complete(connecting)[1]
+
+    left, right = socket.socketpair()
+    sender, receiver = connect(left), connect(right)
+
+    for i in range(10):
+        sender.send(make(Message, i, b"x" * i))
+    received = [loop.run_until_complete(receiver.receive()) for _ in range(10)]
+    assert [(x.id, x.payload) for x in received] == [(i, b"x" * i) for i in range(10)]
+
+    sender.transport.close()
+    assert loop.run_until_complete(receiver.receive()) is None
+    receiver.transport.close()
+    loop.run_until_complete(asyncio.sleep(0))
@@ -1,3 +1,5 @@
+import array
+
 import pytest
 
 import prophy
@@ -179,6 +181,29 @@ def test_bound_scalar_array_extend(BoundScalarArray):
     assert x.value == [1, 2]
 
 
+def test_bound_scalar_array_typed_buffer(BoundScalarArray):
+    x = BoundScalarArray()
+    x.value[:] = array.array('I', [1, 2, 3])
+    assert x.value == [1, 2, 3]
+    x.value.extend(array.array('I', [4]))
+    assert x.value == [1, 2, 3, 4]
+
+    with pytest.raises(prophy.ProphyError, match="out of 4B integer's bounds"):
+        x.value[:] = array.array('i', [-1])
+
+
+def test_bound_scalar_array_bulk_codec(BoundScalarArray):
+    x = BoundScalarArray()
+    x.value[:] = range(0x10000)
+    data = x.encode(">")
+    assert data[:12] == b"\x00\x01\x00\x00\x00\x00\x00\x00\x00\x00\x00\x01"
+    assert len(data) == 4 + 4 * 0x10000
+
+    y = BoundScalarArray()
+    y.decode(data, ">")
+    assert y.value == list(range(0x10000))
+
+
 def test_bound_composite_array_assignment(BoundScalarArray, BoundCompositeArray):
     x = BoundCompositeArray()
     assert len(x.value) == 0
@@ -0,0 +1,120 @@
+import pytest
+
+import prophy
+
+numpy = pytest.importorskip("numpy")
+
+
+@pytest.fixture(scope='session')
+def Samples():
+    class Samples(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("num", prophy.u32),
+                       ("samples", prophy.array(prophy.r32, bound="num", ndarray=True)),
+                       ("ids", prophy.array(prophy.u16, size=3, ndarray=True))]
+    return Samples
+
+
+def test_ndarray_assignment(Samples):
+    x = Samples()
+    assert x.samples.ndarray.dtype == numpy.float32
+    assert x.ids.ndarray.dtype == numpy.uint16
+    assert x.samples == []
+    assert x.ids == [0, 0, 0]
+
+    x.samples[:] = numpy.arange(4, dtype=numpy.float64)
+    x.samples.append(5)
+    x.samples.extend([6.5, 7])
+    x.ids[:] = [1, 2, 3]
+    x.ids[1] = 4
+    assert x.samples == [0, 1, 2, 3, 5, 6.5, 7]
+    assert x.samples.ndarray.dtype == numpy.float32
+    assert x.ids == [1, 4, 3]
+
+    del x.samples[1:]
+    x.samples.insert(0, 8)
+    assert x.samples == [8, 0]
+
+    with pytest.raises(prophy.ProphyError, match="setting slice with different length collection"):
+        x.ids[:] = [1, 2]
+    with pytest.raises(prophy.ProphyError, match=r"value: 65536 out of 2B integer's bounds: \[0, 65535\]"):
+        x.ids[:] = [1, 2, 0x10000]
+    with pytest.raises(prophy.ProphyError, match="not an int"):
+        x.ids[:] = [1.5, 2, 3]
+    with pytest.raises(prophy.ProphyError, match="not a float"):
+        x.samples[:] = ["a"]
+
+
+def test_ndarray_codec(Samples):
+    x = Samples()
+    x.samples[:] = [1.5, -2]
+    x.ids[:] = [1, 2, 3]
+
+    assert x.encode(">") == (b"\x00\x00\x00\x02"
+                             b"\x3f\xc0\x00\x00"
+                             b"\xc0\x00\x00\x00"
+                             b"\x00\x01\x00\x02\x00\x03\x00\x00")
+    assert x.encode("<") == (b"\x02\x00\x00\x00"
+                             b"\x00\x00\xc0\x3f"
+                             b"\x00\x00\x00\xc0"
+                             b"\x01\x00\x02\x00\x03\x00\x00\x00")
+
+    y = Samples()
+    y.decode(bytearray(x.encode(">")), ">")
+    assert y.samples == [1.5, -2]
+    assert y.ids == [1, 2, 3]
+    assert y.samples.ndarray.dtype == numpy.float32
+    assert y.samples.ndarray.flags.writeable
+    assert str(y) == """\
+samples: 1.5
+samples: -2.0
+ids: 1
+ids: 2
+ids: 3
+"""
+
+    with pytest.raises(prophy.ProphyError, match="too few bytes to decode integer"):
+        y.decode(b"\x00\x00\x00\x03\x3f\xc0\x00\x00", ">")
+
+
+def test_ndarray_limited_and_greedy():
+    class X(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("num", prophy.u8),
+                       ("limited", prophy.array(prophy.u8, bound="num", size=2, ndarray=True)),
+                       ("greedy", prophy.array(prophy.i16, ndarray=True))]
+
+    x = X()
+    x.limited[:] = [1]
+    x.greedy[:] = [-1, 2]
+    assert x.encode(">") == b"\x01\x01\x00\x00\xff\xff\x00\x02"
+    with pytest.raises(prophy.ProphyError, match="exceeded array limit"):
+        x.limited.extend([2, 3])
+
+    y = X()
+    y.decode(b"\x02\x03\x04\x00\x00\x05", ">")
+    assert y.limited == [3, 4]
+    assert y.greedy == [5]
+    with pytest.raises(prophy.ProphyError, match="exceeded array limit"):
+        y.decode(b"\x03\x03\x04\x00\x00\x05", ">")
+
+
+def test_ndarray_of_non_numeric_type():
+    E = prophy.with_metaclass(prophy.enum_generator, prophy.enum)
+
+    class Enum(E):
+        _enumerators = [("one", 1)]
+
+    with pytest.raises(prophy.ProphyError, match="ndarray array of non-numeric type not allowed"):
+        prophy.array(Enum, size=2, ndarray=True)
+
+
+def test_ndarray_clone(Samples):
+    x = Samples()
+    x.samples[:] = [1, 2]
+    x.ids[:] = [3, 4, 5]
+
+    y = x.clone()
+    y.samples[0] = 6
+    y.ids[0] = 7
+    assert x.samples == [1, 2]
+    assert x.ids == [3, 4, 5]
+    assert y.ids == [7, 4, 5]
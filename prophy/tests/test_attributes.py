@@ -103,7 +103,7 @@ def test_bytes_limited_attributes():
     assert B._SIZE == 3
     assert B._DYNAMIC is False
     assert B._UNLIMITED is False
-    assert B._DEFAULT == ''
+    assert B._DEFAULT == b''
     assert B._OPTIONAL is False
     assert B._ALIGNMENT == 1
     assert B._BOUND == "a_len"
@@ -116,7 +116,7 @@ def test_bytes_bound_attributes():
     assert B._SIZE == 0
     assert B._DYNAMIC is True
     assert B._UNLIMITED is False
-    assert B._DEFAULT == ''
+    assert B._DEFAULT == b''
     assert B._OPTIONAL is False
     assert B._ALIGNMENT == 1
     assert B._BOUND == "a_len"
@@ -129,7 +129,7 @@ def test_bytes_greedy_attributes():
     assert B._SIZE == 0
     assert B._DYNAMIC is True
     assert B._UNLIMITED is True
-    assert B._DEFAULT == ''
+    assert B._DEFAULT == b''
     assert B._OPTIONAL is False
     assert B._ALIGNMENT == 1
     assert B._BOUND is None
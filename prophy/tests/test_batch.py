@@ -0,0 +1,100 @@
+import prophy
+import pytest
+
+
+@pytest.fixture(scope='session')
+def Record():
+    class E(prophy.with_metaclass(prophy.enum_generator, prophy.enum)):
+        _enumerators = [("E_1", 1),
+                        ("E_2", 2)]
+
+    class Point(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("x", prophy.u8),
+                       ("y", prophy.i16)]
+
+    class Record(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", prophy.u32),
+                       ("e", E),
+                       ("o", prophy.optional(prophy.u16)),
+                       ("v", prophy.array(prophy.u8, size=2)),
+                       ("p", Point),
+                       ("ps", prophy.array(Point, size=2)),
+                       ("s", prophy.bytes(size=2)),
+                       ("r", prophy.r64)]
+    return Record
+
+
+def make(Record, a, e, o):
+    x = Record()
+    x.a = a
+    x.e = e
+    x.o = o
+    x.v[:] = [a, a + 1]
+    x.p.y = -a
+    x.ps[1].x = a
+    x.s = b"z"
+    x.r = a / 2.0
+    return x
+
+
+def test_decode_many(Record):
+    data = b"".join(make(Record, a, 2 - a % 2, a or None).encode("<") for a in range(3))
+
+    columns = prophy.decode_many(Record, data, "<")
+    assert list(columns) == ["a", "e", "o", "v", "p.x", "p.y", "ps.x", "ps.y", "s", "r"]
+    assert columns["a"] == [0, 1, 2]
+    assert columns["e"] == [2, 1, 2]
+    assert columns["o"] == [None, 1, 2]
+    assert columns["v"] == [(0, 1), (1, 2), (2, 3)]
+    assert columns["p.y"] == [0, -1, -2]
+    assert columns["ps.x"] == [(0, 0), (0, 1), (0, 2)]
+    assert columns["s"] == [b"z\x00"] * 3
+    assert columns["r"] == [0.0, 0.5, 1.0]
+
+    assert prophy.decode_many(Record, data, "<", 2)["a"] == [0, 1]
+
+
+def test_decode_many_in_chunks(Record, monkeypatch):
+    monkeypatch.setattr(prophy.batch, "CHUNK", 2)
+    data = b"".join(make(Record, a, 1, None).encode(">") for a in range(5))
+    assert prophy.decode_many(Record, data, ">")["v"] == [(a, a + 1) for a in range(5)]
+
+
+def test_decode_many_errors(Record):
+    data = make(Record, 1, 1, None).encode(">")
+    with pytest.raises(prophy.ProphyError, match="not all bytes of Record read"):
+        prophy.decode_many(Record, data + b"\x00", ">")
+    with pytest.raises(prophy.ProphyError, match="too few bytes to decode Record"):
+        prophy.decode_many(Record, data, ">", 2)
+    with pytest.raises(prophy.ProphyError, match="Record: unknown enumerator E value"):
+        prophy.decode_many(Record, data[:4] + b"\x00\x00\x00\x03" + data[8:], ">")
+
+    class Dynamic(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("n", prophy.u32),
+                       ("v", prophy.array(prophy.u32, bound="n", size=2))]
+    with pytest.raises(prophy.ProphyError, match="Dynamic has no fixed layout"):
+        prophy.decode_many(Dynamic, b"", ">")
+
+
+def test_encode_many(Record):
+    class Sample(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", prophy.u16),
+                       ("b", prophy.u32)]
+
+    class Dynamic(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("n", prophy.u32),
+                       ("v", prophy.array(prophy.u8, bound="n"))]
+
+    samples = [Sample() for _ in range(3)]
+    for i, x in enumerate(samples):
+        x.a = i
+        x.b = i * 2
+    dynamic = Dynamic()
+    dynamic.v[:] = [1, 2, 3]
+    messages = samples[:2] + [dynamic, make(Record, 1, 1, 2)] + samples[2:]
+
+    buf, offsets = prophy.encode_many(messages, ">")
+    assert bytes(buf) == b"".join(x.encode(">") for x in messages)
+    assert offsets == [0, 8, 16, 24, 64]
+
+    assert prophy.encode_many([], "<") == (bytearray(), [])
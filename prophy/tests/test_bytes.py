@@ -1,3 +1,5 @@
+import mmap
+
 import prophy
 import pytest
 
@@ -123,7 +125,7 @@ y: 'fghij'
 
 def test_bound_bytes_assignment(BoundBytes):
     x = BoundBytes()
-    assert x.value == ""
+    assert x.value == b""
 
     x.value = b"\x00\x00\x01"
     assert x.value == b"\x00\x00\x01"
@@ -237,7 +239,7 @@ def test_shift_bound_bytes_exceptions(bytes_type):
 
 def test_limited_bytes_assignment(LimitedBytes):
     x = LimitedBytes()
-    assert x.value == ""
+    assert x.value == b""
 
     x.value = b"\x00\x00\x01"
     assert x.value == b"\x00\x00\x01"
@@ -308,7 +310,7 @@ def test_limited_bytes_twice_in_struct():
 
 def test_greedy_bytes_assignment(GreedyBytes):
     x = GreedyBytes()
-    assert x.value == ""
+    assert x.value == b""
     x.value = b"\x00\x00\x01"
     assert x.value == b"\x00\x00\x01"
     x.value = b"\x00\x00"
@@ -418,3 +420,37 @@ def test_bytes_non_7bit_ascii_to_string(FixedBytes):
     x = FixedBytes()
     x.value = b'\xff\x80\xbb'
     assert str(x) == "value: '\\xff\\x80\\xbb\\x00\\x00'\n"
+
+
+def test_bytes_decode_from_buffers(BoundBytes):
+    data = b"\x00\x00\x00\x03abc"
+    for buffer_type in (bytearray, memoryview):
+        x = BoundBytes()
+        x.decode(buffer_type(data), ">")
+        assert x.value == b"abc"
+        assert x.encode(">") == data
+        assert str(x) == "value: 'abc'\n"
+
+
+def test_bytes_decode_from_memoryview_keeps_views(tmpdir):
+    class X(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", prophy.bytes(size=2)),
+                       ("b", prophy.bytes())]
+
+    path = tmpdir.join("capture")
+    path.write_binary(b"ab" + b"x" * 4096)
+    with path.open("rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        x = X()
+        x.decode(mapped, ">")
+        assert type(x.b) is bytes
+
+        view = memoryview(mapped)
+        x.decode(view, ">")
+        assert type(x.a) is memoryview
+        assert type(x.b) is memoryview
+        assert x.b.obj is mapped
+        assert x.a == b"ab"
+        assert x.encode(">") == b"ab" + b"x" * 4096
+        del x, view
+        mapped.close()
@@ -0,0 +1,183 @@
+import prophy
+import pytest
+
+from prophy.plan import field_step, fused_run
+
+
+@pytest.fixture(scope='session')
+def Inner():
+    class Inner(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", prophy.u8),
+                       ("b", prophy.u32)]
+    return Inner
+
+
+@pytest.fixture(scope='session')
+def Fixed(Inner):
+    class Fixed(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("x", prophy.u16),
+                       ("y", Inner),
+                       ("z", prophy.array(prophy.u8, size=3)),
+                       ("w", prophy.optional(prophy.u8)),
+                       ("v", prophy.bytes(size=2))]
+    return Fixed
+
+
+@pytest.fixture(scope='session')
+def Dynamic(Inner):
+    class Dynamic(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", prophy.u8),
+                       ("b", prophy.u32),
+                       ("n", prophy.u32),
+                       ("c", prophy.array(prophy.u8, bound="n")),
+                       ("d", prophy.u8),
+                       ("e", prophy.u64)]
+    return Dynamic
+
+
+def test_fixed_struct_is_fused_into_single_run(Fixed):
+    plan = Fixed._codec_plan
+
+    assert plan.fused is plan.steps[0]
+    assert len(plan.steps) == 1
+    assert plan.fused.format == "H2xB3xI3BIB2s2x"
+    assert plan.size == Fixed._SIZE == 24
+
+
+def test_fixed_struct_encode(Fixed):
+    x = Fixed()
+    x.x = 1
+    x.y.a = 2
+    x.y.b = 3
+    x.z[:] = [4, 5, 6]
+    x.v = b"ab"
+    assert x.encode(">") == (b"\x00\x01\x00\x00"
+                             b"\x02\x00\x00\x00"
+                             b"\x00\x00\x00\x03"
+                             b"\x04\x05\x06"
+                             b"\x00\x00\x00\x00\x00"
+                             b"ab\x00\x00")
+    x.w = 7
+    assert x.encode("<") == (b"\x01\x00\x00\x00"
+                             b"\x02\x00\x00\x00"
+                             b"\x03\x00\x00\x00"
+                             b"\x04\x05\x06"
+                             b"\x01\x00\x00\x00\x07"
+                             b"ab\x00\x00")
+
+
+def test_dynamic_struct_plan(Dynamic):
+    steps = Dynamic._codec_plan.steps
+
+    assert [type(step) for step in steps] == [fused_run, field_step, fused_run]
+    assert steps[0].format == "B3xII"
+    assert steps[2].format == "B7xQ"
+    assert steps[2].alignment == 1
+    assert Dynamic._codec_plan.fused is None
+    assert Dynamic._codec_plan.size is None
+
+
+def test_dynamic_struct_encode(Dynamic):
+    x = Dynamic()
+    x.a = 1
+    x.c[:] = [2, 3]
+    x.e = 4
+    assert x.encode(">") == (b"\x01\x00\x00\x00"
+                             b"\x00\x00\x00\x00"
+                             b"\x00\x00\x00\x02"
+                             b"\x02\x03\x00\x00"
+                             b"\x00\x00\x00\x00\x00\x00\x00\x00"
+                             b"\x00\x00\x00\x00\x00\x00\x00\x04")
+
+
+def test_run_split_on_unknown_alignment():
+    class X(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("n", prophy.u8),
+                       ("a", prophy.bytes(bound="n"))]
+
+    class Y(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("x", X),
+                       ("c", prophy.u8),
+                       ("d", prophy.u32)]
+
+    steps = Y._codec_plan.steps
+    assert [type(step) for step in steps] == [field_step, fused_run, fused_run]
+    assert [(steps[1].alignment, steps[1].format), (steps[2].alignment, steps[2].format)] == [(1, "B"), (4, "I")]
+
+    y = Y()
+    y.x.a = b"abc"
+    y.c = 1
+    y.d = 2
+    assert y.encode(">") == b"\x03abc\x01\x00\x00\x00\x00\x00\x00\x02"
+
+
+def test_packed_struct_plan():
+    class X(prophy.with_metaclass(prophy.struct_generator, prophy.struct_packed)):
+        _descriptor = [("a", prophy.u8),
+                       ("b", prophy.u32),
+                       ("c", prophy.u16)]
+
+    assert X._codec_plan.fused.format == "BIH"
+
+    x = X()
+    x.a, x.b, x.c = 1, 2, 3
+    assert x.encode(">") == b"\x01\x00\x00\x00\x02\x00\x03"
+
+
+def test_empty_struct_plan():
+    class X(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = []
+
+    assert X._codec_plan.fused.format == ""
+    assert X().encode(">") == b""
+
+
+def test_fixed_struct_decode(Fixed):
+    x = Fixed()
+    x.decode(b"\x00\x01\x00\x00"
+             b"\x02\x00\x00\x00"
+             b"\x00\x00\x00\x03"
+             b"\x04\x05\x06"
+             b"\x01\x00\x00\x00\x07"
+             b"ab\x00\x00", ">")
+    assert (x.x, x.y.a, x.y.b, x.z[:], x.w, x.v) == (1, 2, 3, [4, 5, 6], 7, b"ab")
+
+
+def test_dynamic_struct_decode(Dynamic):
+    x = Dynamic()
+    x.decode(b"\x01\x00\x00\x00"
+             b"\x00\x00\x00\x05"
+             b"\x00\x00\x00\x02"
+             b"\x02\x03\x00\x00"
+             b"\x06\x00\x00\x00\x00\x00\x00\x00"
+             b"\x00\x00\x00\x00\x00\x00\x00\x04", ">")
+    assert (x.a, x.b, x.c[:], x.d, x.e) == (1, 5, [2, 3], 6, 4)
+
+
+def test_fused_bound_fields_decode():
+    class X(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("n", prophy.u8),
+                       ("a", prophy.array(prophy.u8, bound="n", size=3)),
+                       ("m", prophy.u8),
+                       ("b", prophy.bytes(bound="m", size=3))]
+
+    assert X._codec_plan.fused.format == "B3BB3s"
+
+    x = X()
+    x.decode(b"\x02\x01\x02\x00\x01a\x00\x00", ">")
+    assert (x.a[:], x.b) == ([1, 2], b"a")
+
+    with pytest.raises(prophy.ProphyError) as e:
+        x.decode(b"\x04\x01\x02\x00\x01a\x00\x00", ">")
+    assert "X: exceeded array limit" == str(e.value)
+
+
+def test_fused_run_decode_errors(Fixed):
+    x = Fixed()
+    with pytest.raises(prophy.ProphyError) as e:
+        x.decode(b"\x00\x01\x00\x00\x02", ">")
+    assert "Fixed: Inner: too few bytes to decode integer" == str(e.value)
+
+    with pytest.raises(prophy.ProphyError) as e:
+        x.decode(b"\x00" * 25, ">")
+    assert "not all bytes of Fixed read" == str(e.value)
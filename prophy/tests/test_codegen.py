@@ -0,0 +1,81 @@
+import linecache
+
+import prophy
+import pytest
+
+from prophy import codegen
+
+
+@pytest.fixture(scope='session')
+def Inner():
+    class Inner(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", prophy.u8),
+                       ("b", prophy.u32),
+                       ("o", prophy.optional(prophy.u16))]
+    return Inner
+
+
+@pytest.fixture(scope='session')
+def Dynamic(Inner):
+    class Dynamic(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("n", prophy.u32),
+                       ("v", prophy.array(prophy.u16, bound="n")),
+                       ("i", Inner),
+                       ("b", prophy.bytes(size=3))]
+    return Dynamic
+
+
+@pytest.mark.skipif(not codegen.enabled, reason="code generation disabled")
+def test_generated_source(Inner):
+    plan = Inner._codec_plan
+    assert "def encode_Inner(msg, buf, pos, endianness):" in plan.source
+    assert "def decode_Inner(msg, data, pos, endianness):" in plan.source
+    assert plan.encoder.__name__ == "encode_Inner"
+    assert plan.decoder.__name__ == "decode_Inner"
+
+
+def test_generated_codec_matches_plan(Dynamic):
+    x = Dynamic()
+    x.v[:] = [1, 2, 3]
+    x.i.b = 4
+    x.i.o = 5
+    x.b = b"abc"
+    plan = Dynamic._codec_plan
+
+    for endianness in "<>":
+        data = x.encode(endianness)
+        buf = bytearray(len(data))
+        assert plan.encode_steps(x, buf, 0, endianness) == len(data)
+        assert buf == data
+
+        y = Dynamic()
+        assert plan.decoder(y, data, 0, endianness) == len(data)
+        z = Dynamic()
+        assert plan.decode_steps(z, data, 0, endianness) == len(data)
+        assert str(y) == str(z) == str(x)
+
+
+@pytest.mark.skipif(not codegen.enabled, reason="code generation disabled")
+def test_generated_source_dump(monkeypatch, capsys):
+    monkeypatch.setattr(codegen, "dump", True)
+
+    class X(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", prophy.u8),
+                       ("b", prophy.u32)]
+
+    assert "# codec of X\ndef encode_X(msg, buf, pos, endianness):" in capsys.readouterr().err
+
+
+@pytest.mark.skipif(not codegen.enabled, reason="code generation disabled")
+def test_generated_source_of_classes_with_same_name():
+    def make(fields):
+        class X(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+            _descriptor = fields
+        return X
+
+    plans = [make([("a", prophy.u8)])._codec_plan, make([("b", prophy.u32)])._codec_plan]
+    filenames = [plan.encoder.__code__.co_filename for plan in plans]
+    assert filenames[0] != filenames[1]
+    for plan, filename in zip(plans, filenames):
+        assert __name__ in filename
+        assert "".join(linecache.getlines(filename)) == plan.source
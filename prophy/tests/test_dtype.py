@@ -0,0 +1,97 @@
+import prophy
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+
+@pytest.fixture(scope='session')
+def Record():
+    class Point(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("x", prophy.u8),
+                       ("y", prophy.u32)]
+
+    class Record(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", prophy.u8),
+                       ("o", prophy.optional(prophy.u64)),
+                       ("p", Point),
+                       ("ps", prophy.array(Point, size=2)),
+                       ("n", prophy.u8),
+                       ("v", prophy.array(prophy.i16, bound="n", size=3)),
+                       ("s", prophy.bytes(size=3)),
+                       ("r", prophy.r32)]
+    return Record
+
+
+@pytest.mark.parametrize("endianness", ["<", ">"])
+def test_struct_dtype(Record, endianness):
+    x = Record()
+    x.a = 1
+    x.o = 2
+    x.p.y = 3
+    x.ps[1].x = 4
+    x.v[:] = [-5, 6]
+    x.s = b"ab"
+    x.r = 0.5
+    data = x.encode(endianness) * 2
+
+    dtype = prophy.struct_dtype(Record, endianness)
+    assert dtype.names == ("a", "o", "p", "ps", "n", "v", "s", "r")
+    assert dtype.fields["o"][1] == 8
+    assert dtype.itemsize * 2 == len(data)
+
+    records = numpy.frombuffer(data, dtype)
+    assert records["a"].tolist() == [1, 1]
+    assert records["o"]["present"].tolist() == [1, 1]
+    assert records["o"]["value"].tolist() == [2, 2]
+    assert records["p"]["y"].tolist() == [3, 3]
+    assert records["ps"]["x"].tolist() == [[0, 4], [0, 4]]
+    assert records["n"].tolist() == [2, 2]
+    assert records["v"][0].tolist() == [-5, 6, 0]
+    assert records["s"].tolist() == [b"ab", b"ab"]
+    assert records["r"].tolist() == [0.5, 0.5]
+
+
+def test_struct_dtype_packed():
+    class Inner(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("x", prophy.u8),
+                       ("y", prophy.u16)]
+
+    class Packed(prophy.with_metaclass(prophy.struct_generator, prophy.struct_packed)):
+        _descriptor = [("a", prophy.u8),
+                       ("b", Inner),
+                       ("c", prophy.u32)]
+
+    x = Packed()
+    x.b.y = 1
+    x.c = 2
+    dtype = prophy.struct_dtype(Packed, ">")
+    assert [dtype.fields[name][1] for name in dtype.names] == [0, 1, 5]
+    assert numpy.frombuffer(x.encode(">"), dtype)["c"].tolist() == [2]
+
+
+def test_struct_dtype_of_dynamic_struct():
+    class Dynamic(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("n", prophy.u32),
+                       ("v", prophy.array(prophy.u32, bound="n"))]
+
+    with pytest.raises(prophy.ProphyError, match="Dynamic has no fixed layout"):
+        prophy.struct_dtype(Dynamic, "<")
+
+
+def test_struct_dtype_of_struct_with_union():
+    class U(prophy.with_metaclass(prophy.union_generator, prophy.union)):
+        _descriptor = [("a", prophy.u32, 0),
+                       ("b", prophy.u16, 1)]
+
+    class Inner(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("x", prophy.u8),
+                       ("u", U)]
+
+    class Outer(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", prophy.u8),
+                       ("i", prophy.array(Inner, size=2))]
+
+    with pytest.raises(prophy.ProphyError, match="^Outer.i: Inner.u: union U has no fixed layout$"):
+        prophy.struct_dtype(Outer, "<")
+    with pytest.raises(prophy.ProphyError, match="^U has no fixed layout$"):
+        prophy.struct_dtype(U, "<")
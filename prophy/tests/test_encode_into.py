@@ -0,0 +1,79 @@
+import prophy
+import pytest
+
+
+@pytest.fixture(scope='session')
+def Dynamic():
+    class Dynamic(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", prophy.u8),
+                       ("n", prophy.u32),
+                       ("b", prophy.array(prophy.u16, bound="n"))]
+    return Dynamic
+
+
+@pytest.fixture(scope='session')
+def Union():
+    class Union(prophy.with_metaclass(prophy.union_generator, prophy.union)):
+        _descriptor = [("a", prophy.u8, 0),
+                       ("b", prophy.u64, 1)]
+    return Union
+
+
+def test_encode_into_back_to_back(Dynamic):
+    x = Dynamic()
+    x.a = 1
+    x.b[:] = [2, 3]
+    buf = bytearray(b"\xff" * 32)
+
+    offset = x.encode_into(buf, 0, ">")
+    assert offset == 12
+    offset = x.encode_into(buf, offset + 1, ">")
+    assert offset == 25
+    assert buf == (b"\x01\x00\x00\x00\x00\x00\x00\x02\x00\x02\x00\x03"
+                   b"\xff"
+                   b"\x01\x00\x00\x00\x00\x00\x00\x02\x00\x02\x00\x03" +
+                   b"\xff" * 7)
+
+
+def test_encode_into_memoryview(Dynamic, Union):
+    x = Dynamic()
+    x.b[:] = [1]
+    u = Union()
+    u.discriminator = "b"
+    u.b = 2
+    buf = bytearray(32)
+    view = memoryview(buf)
+
+    offset = u.encode_into(view, 0, "<")
+    offset = x.encode_into(view, offset, "<")
+    assert offset == 16 + 12
+    assert bytes(buf[:offset]) == u.encode("<") + x.encode("<")
+
+
+def test_encode_into_too_small_buffer(Dynamic, Union):
+    x = Dynamic()
+    x.b[:] = [1, 2, 3]
+    buf = bytearray(13)
+
+    with pytest.raises(prophy.ProphyError, match="buffer too small to encode Dynamic"):
+        x.encode_into(buf, 0, ">")
+    with pytest.raises(prophy.ProphyError, match="buffer too small to encode Union"):
+        Union().encode_into(buf, 0, ">")
+    assert buf == bytearray(13)
+
+
+def test_encode_into_buffer_of_exact_size(Dynamic, Union):
+    x = Dynamic()
+    x.b[:] = [1, 2, 3]
+    buf = bytearray(x.encoded_size())
+    assert x.encode_into(buf, 0, "<") == len(buf)
+    assert bytes(buf) == x.encode("<")
+
+    buf = bytearray(2 + x.encoded_size())
+    assert x.encode_into(buf, 2, "<") == len(buf)
+    with pytest.raises(prophy.ProphyError, match="buffer too small to encode Dynamic"):
+        x.encode_into(buf, 3, "<")
+
+    y = Union()
+    buf = bytearray(y.encoded_size())
+    assert y.encode_into(buf, 0, "<") == len(buf)
@@ -0,0 +1,51 @@
+import prophy
+import pytest
+
+
+@pytest.fixture(scope='session')
+def Inner():
+    class Inner(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("n", prophy.u8),
+                       ("b", prophy.bytes(bound="n"))]
+    return Inner
+
+
+@pytest.fixture(scope='session')
+def Outer(Inner):
+    class Outer(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", prophy.u8),
+                       ("x", Inner),
+                       ("o", prophy.optional(prophy.u32)),
+                       ("n", prophy.u16),
+                       ("c", prophy.array(Inner, bound="n")),
+                       ("d", prophy.u64)]
+    return Outer
+
+
+def test_fixed_struct_encoded_size():
+    class X(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", prophy.u8),
+                       ("b", prophy.u32)]
+
+    assert X().encoded_size() == 8
+
+
+def test_dynamic_struct_encoded_size(Outer):
+    x = Outer()
+    x.x.b = b""
+    assert x.encoded_size() == len(x.encode(">")) == 24
+
+    x.x.b = b"abcdef"
+    x.o = 1
+    x.c.add(b=b"ab")
+    x.c.add(b=b"abcdefghijk")
+    assert x.encoded_size() == len(x.encode(">")) == 48
+
+
+def test_union_encoded_size(Inner):
+    class U(prophy.with_metaclass(prophy.union_generator, prophy.union)):
+        _descriptor = [("a", prophy.u8, 0),
+                       ("b", prophy.u64, 1)]
+
+    u = U()
+    assert u.encoded_size() == len(u.encode(">")) == 16
@@ -103,3 +103,19 @@ def test_integer_codec(integer_type, a, encoded_a, b, encoded_b, too_short, too_
 
     with pytest.raises(prophy.ProphyError, match="not all bytes of X read"):
         x.decode(too_long, ">")
+
+
+@pytest.mark.parametrize('endianness, encoded', [
+    ('<', b"\x01\x02\x03\x04"),
+    ('>', b"\x04\x03\x02\x01"),
+    ('!', b"\x04\x03\x02\x01")
+])
+def test_integer_decode_at_offset(endianness, encoded):
+    data = bytearray(b"\xff" + encoded + b"\xff")
+
+    assert prophy.u32._encode(0x04030201, endianness) == encoded
+    assert prophy.u32._decode(data, 1, endianness) == (0x04030201, 4)
+    assert prophy.u32._decode(memoryview(data), 1, endianness) == (0x04030201, 4)
+
+    with pytest.raises(prophy.ProphyError, match="too few bytes to decode integer"):
+        prophy.u32._decode(data, 3, endianness)
@@ -0,0 +1,132 @@
+import prophy
+import pytest
+
+
+@pytest.fixture(scope='session')
+def Inner():
+    class Inner(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", prophy.u16),
+                       ("b", prophy.u32)]
+    return Inner
+
+
+@pytest.fixture(scope='session')
+def Outer(Inner):
+    class Outer(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("x", prophy.u8),
+                       ("n", prophy.u32),
+                       ("y", prophy.array(prophy.u16, bound="n")),
+                       ("z", Inner),
+                       ("o", prophy.optional(Inner))]
+    return Outer
+
+
+@pytest.fixture(scope='session')
+def encoded(Outer):
+    x = Outer()
+    x.x = 1
+    x.y[:] = [2, 3, 4]
+    x.z.a = 5
+    x.z.b = 6
+    x.o = True
+    x.o.b = 7
+    return x.encode(">")
+
+
+def test_lazy_decode(Outer, encoded):
+    x = Outer()
+    assert x.decode(encoded, ">", lazy=True) == len(encoded)
+    assert x.z.b == 6
+    assert x.o.b == 7
+    assert x.y[:] == [2, 3, 4]
+
+    y = Outer()
+    y.decode(encoded, ">")
+    assert str(x) == str(y)
+    assert x.o.__class__ is y.o.__class__
+    assert x == y
+    assert x.clone() == y
+    z = Outer()
+    z.decode(encoded, ">", lazy=True)
+    y.copy_from(z)
+    assert y == x
+
+
+def test_lazy_decode_copies_bytearray(Outer, encoded):
+    data = bytearray(encoded)
+    x = Outer()
+    x.decode(data, ">", lazy=True)
+    data[:] = b"\xff" * len(data)
+    assert x.z.a == 5
+    assert x.encode(">") == encoded
+
+
+def test_lazy_decode_reencodes_source(Outer, encoded):
+    x = Outer()
+    x.decode(bytearray(encoded), ">", lazy=True)
+    assert x.z.a == 5
+    assert x.encoded_size() == len(encoded)
+    assert x.encode(">") == encoded
+
+
+def test_lazy_decode_modified(Outer, encoded):
+    x = Outer()
+    x.decode(encoded, ">", lazy=True)
+    x.z.b = 8
+    x.x = 9
+
+    y = Outer()
+    y.decode(encoded, ">")
+    y.z.b = 8
+    y.x = 9
+    assert x.encode(">") == y.encode(">")
+    assert x.encode("<") == y.encode("<")
+
+
+def test_lazy_decode_errors(Outer, encoded):
+    with pytest.raises(prophy.ProphyError, match="Outer: Inner: too few bytes to decode integer"):
+        Outer().decode(encoded[:14], ">", lazy=True)
+    with pytest.raises(prophy.ProphyError, match="not all bytes of Outer read"):
+        Outer().decode(encoded + b"\x00" * 4, ">", lazy=True)
+
+
+def test_lazy_decode_deferred_value_check():
+    class E(prophy.with_metaclass(prophy.enum_generator, prophy.enum)):
+        _enumerators = [("E_1", 1)]
+
+    class X(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", prophy.u32),
+                       ("b", E)]
+
+    x = X()
+    x.decode(b"\x00\x00\x00\x01\x00\x00\x00\x02", ">", lazy=True)
+    assert x.a == 1
+    with pytest.raises(prophy.ProphyError, match="X: unknown enumerator E value"):
+        x.b
+
+
+def test_lazy_decode_limited_struct_array():
+    class E(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", prophy.u8),
+                       ("b", prophy.u32)]
+
+    class L(prophy.with_metaclass(prophy.struct_generator, prophy.struct_packed)):
+        _descriptor = [("n", prophy.u8),
+                       ("x", prophy.array(E, size=3, bound="n")),
+                       ("t", prophy.u8),
+                       ("g", prophy.array(prophy.u8))]
+
+    x = L()
+    x.x.add().a = 5
+    x.t = 6
+    x.g[:] = [7, 8]
+    encoded = x.encode(">")
+
+    eager = L()
+    eager.decode(encoded, ">")
+    lazy = L()
+    assert lazy.decode(encoded, ">", lazy=True) == len(encoded)
+    assert lazy.t == 6
+    assert lazy.g[:] == [7, 8]
+    assert lazy == eager
+    assert str(lazy) == str(eager)
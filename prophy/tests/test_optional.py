@@ -79,6 +79,28 @@ a {
     assert x.a is None
 
 
+def test_optional_struct_copy_from():
+    class S(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", prophy.u32)]
+
+    class K(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", prophy.optional(S)),
+                       ("b", prophy.optional(prophy.u8))]
+
+    x = K()
+    x.a = True
+    x.a.a = 3
+    y = K()
+    y.b = 1
+    y.copy_from(x)
+    assert y.a.a == 3
+    assert y.a is not x.a
+    assert y.b is None
+
+    y.copy_from(K())
+    assert y.a is None
+
+
 def test_optional_union():
     class U(prophy.with_metaclass(prophy.union_generator, prophy.union)):
         _descriptor = [("a", prophy.u32, 5)]
@@ -0,0 +1,48 @@
+import prophy
+import pytest
+
+
+def test_buffer_pool_acquire_release():
+    pool = prophy.buffer_pool(max_free=1, min_size=16)
+    a = pool.acquire(10)
+    b = pool.acquire(17)
+    assert (len(a), len(b)) == (16, 32)
+    assert (pool.hits, pool.misses) == (0, 2)
+
+    pool.release(a)
+    assert pool.acquire(16) is a
+    assert (pool.hits, pool.misses) == (1, 2)
+
+    pool.release(a)
+    pool.release(bytearray(16))
+    assert pool.free == 1
+
+    with pytest.raises(prophy.ProphyError, match="slab released twice"):
+        pool.release(a)
+    assert pool.free == 1
+    assert pool.acquire(16) is a
+    assert pool.acquire(16) is not a
+    pool.release(a)
+    assert pool.acquire(16) is a
+
+    with pytest.raises(prophy.ProphyError, match="not a slab of buffer pool"):
+        pool.release(bytearray(20))
+    with pytest.raises(prophy.ProphyError, match="not a slab of buffer pool"):
+        pool.release(b"\x00" * 16)
+
+
+def test_buffer_pool_encode():
+    class X(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", prophy.u8),
+                       ("n", prophy.u32),
+                       ("b", prophy.array(prophy.u16, bound="n"))]
+
+    x = X()
+    x.a = 1
+    x.b[:] = [2, 3, 4]
+    pool = prophy.buffer_pool()
+    pool.release(bytearray(b"\xff" * 64))
+
+    buf, size = pool.encode(x, ">")
+    assert bytes(buf[:size]) == x.encode(">")
+    assert pool.hits == 1
@@ -0,0 +1,165 @@
+import struct
+
+import prophy
+import pytest
+
+from prophy import records
+
+
+def implementations():
+    yield records.decode_records_py, records.encode_records_py, struct.Struct
+    try:
+        from prophy import _speedups
+    except ImportError:
+        return
+    yield _speedups.decode_records, _speedups.encode_records, _speedups.layout
+
+
+@pytest.fixture(scope='session')
+def Record():
+    class Record(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", prophy.u8),
+                       ("b", prophy.u32),
+                       ("c", prophy.r64)]
+    return Record
+
+
+@pytest.fixture(scope='session')
+def Records(Record):
+    class Records(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("n", prophy.u32),
+                       ("r", prophy.array(Record, bound="n"))]
+    return Records
+
+
+def test_record_structs(Record, Records):
+    assert Record._codec_plan.records is not None
+    assert Records._codec_plan.records is None
+
+
+@pytest.mark.parametrize("decode_records, encode_records, layout", list(implementations()))
+def test_records_codec(Record, decode_records, encode_records, layout):
+    layout = layout(">" + Record._codec_plan.fused.format)
+    x = Record()
+    x.a = 1
+    x.b = 2
+    x.c = 0.5
+    y = Record()
+    y.decode(x.encode(">"), ">", lazy=True)
+    buf = bytearray(b"\xff" * 34)
+
+    assert encode_records([x, y], layout, buf, 1, 16) == 33
+    assert buf == b"\xff" + x.encode(">") * 2 + b"\xff"
+
+    decoded = decode_records(Record, layout, buf, 17, 16, 1)
+    assert len(decoded) == 1 and decoded[0].__class__ is Record
+    assert decoded[0].encode(">") == x.encode(">")
+    assert str(decoded[0]) == str(x)
+
+
+def test_records_array(Record, Records):
+    x = Records()
+    for i in range(3):
+        x.r.add(a=i, b=i * 2, c=i / 4.0)
+    data = x.encode("<")
+    assert data == b"\x03\x00\x00\x00\x00\x00\x00\x00" + b"".join(elem.encode("<") for elem in x.r)
+
+    y = Records()
+    assert y.decode(data, "<") == len(data)
+    assert str(y) == str(x)
+    y.r[1].b = 7
+    assert x.r[1].b == 2
+
+    with pytest.raises(prophy.ProphyError, match="Records: Record: too few bytes to decode integer"):
+        y.decode(data[:-1], "<")
+
+
+@pytest.mark.parametrize("prefix", ["<", ">"])
+def test_layout_matches_struct(prefix):
+    _speedups = pytest.importorskip("prophy._speedups")
+    fmt = prefix + "bBhHiI2xqQfd3s"
+    values = (-128, 255, -32768, 65535, -(1 << 31), (1 << 32) - 1, -(1 << 63), (1 << 64) - 1, 0.5, -1e300, b"ab")
+    layout = _speedups.layout(fmt)
+    assert layout.size == struct.calcsize(fmt)
+    assert layout.format == fmt
+
+    buf = bytearray(b"\xff" * (layout.size + 1))
+    layout.pack_into(buf, 1, *values)
+    assert bytes(buf[1:]) == struct.pack(fmt, *values)
+    assert layout.unpack_from(buf, 1) == struct.unpack_from(fmt, buf, 1)
+
+    with pytest.raises(struct.error, match="'B' format requires 0 <= number <= 255"):
+        layout.pack_into(buf, 0, 0, 256, *values[2:])
+    with pytest.raises(struct.error, match="'q' format requires"):
+        layout.pack_into(buf, 0, *(values[:6] + (1 << 63,) + values[7:]))
+    with pytest.raises(struct.error, match="required argument is not an integer"):
+        layout.pack_into(buf, 0, 0.5, *values[1:])
+    with pytest.raises(OverflowError):
+        layout.pack_into(buf, 0, *(values[:8] + (1e300,) + values[9:]))
+    with pytest.raises(struct.error, match="pack expected 11 items"):
+        layout.pack_into(buf, 0, *values[1:])
+    with pytest.raises(struct.error):
+        layout.unpack_from(buf, 2)
+
+
+@pytest.fixture(scope='session')
+def Mixed():
+    class E(prophy.with_metaclass(prophy.enum_generator, prophy.enum)):
+        _enumerators = [("E_1", 1),
+                        ("E_2", 2)]
+
+    class Inner(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("e", E),
+                       ("o", prophy.optional(E)),
+                       ("n", prophy.u8),
+                       ("v", prophy.array(prophy.u8, bound="n", size=3))]
+
+    class Mixed(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", prophy.u32),
+                       ("b", prophy.i8),
+                       ("o", prophy.optional(prophy.u16)),
+                       ("x", prophy.array(prophy.i16, size=2)),
+                       ("es", prophy.array(E, size=2)),
+                       ("s", prophy.bytes(size=3)),
+                       ("i", Inner),
+                       ("is", prophy.array(Inner, size=2)),
+                       ("r", prophy.r32)]
+    return Mixed
+
+
+def test_native_run(Mixed):
+    run = Mixed._codec_plan.fused
+    if run.native is None:
+        pytest.skip("prophy._speedups not used")
+
+    x = Mixed()
+    x.a = 7
+    x.o = 3
+    x.x[:] = [-1, 2]
+    x.es[1] = "E_2"
+    x.s = b"ab"
+    x.i.e = "E_2"
+    x.i.o = "E_1"
+    x.i.v[:] = [4, 5]
+    x.r = 0.25
+    for endianness in "<>":
+        values = []
+        run.collect(x, values)
+        data = run.structs[endianness].pack(*values)
+        buf = bytearray(run.size)
+        assert run.native.encode(x, buf, 0, endianness) == run.size
+        assert buf == data
+
+        y = Mixed()
+        run.native.decode(y, data, 0, endianness, {})
+        z = Mixed()
+        run.distribute(z, run.structs[endianness].unpack_from(data, 0), 0)
+        assert str(y) == str(z) == str(x)
+        assert y.encode(endianness) == x.encode(endianness)
+
+    data = bytearray(x.encode("<"))
+    x.i.e = "E_1"
+    offset = [i for i, (a, b) in enumerate(zip(data, x.encode("<"))) if a != b][0]
+    data[offset] = 9
+    with pytest.raises(prophy.ProphyError, match="^Mixed: Inner: unknown enumerator E value$"):
+        Mixed().decode(bytes(data), "<")
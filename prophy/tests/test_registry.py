@@ -0,0 +1,77 @@
+import prophy
+import pytest
+
+
+@pytest.fixture(scope='session')
+def MsgId():
+    class MsgId(prophy.with_metaclass(prophy.enum_generator, prophy.enum)):
+        _enumerators = [("MsgId_Ping", 1),
+                        ("MsgId_Data", 2),
+                        ("MsgId_Pong", 3)]
+    return MsgId
+
+
+@pytest.fixture(scope='session')
+def Header(MsgId):
+    class Header(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("id", MsgId),
+                       ("seq", prophy.u32)]
+    return Header
+
+
+@pytest.fixture
+def registry(Header):
+    class Ping(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("token", prophy.u64)]
+
+    class Data(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("n", prophy.u32),
+                       ("values", prophy.array(prophy.u16, bound="n"))]
+
+    registry = prophy.message_registry(Header, "id")
+    registry.register("MsgId_Ping", Ping)
+    registry.register(2)(Data)
+    return registry
+
+
+def test_registry_decode(registry):
+    data = (b"\x00\x00\x00\x02\x00\x00\x00\x07"
+            b"\x00\x00\x00\x02\x00\x03\x00\x04")
+    header, body = registry.decode(data, ">")
+    assert header.seq == 7
+    assert body.__class__.__name__ == "Data"
+    assert body.values[:] == [3, 4]
+
+    header, body = registry.decode(b"\x00\x00\x00\x01\x00\x00\x00\x08" + b"\x00" * 7 + b"\x09", ">")
+    assert body.token == 9
+    registry.decode(data, ">")
+    assert registry.counters == {1: 1, 2: 2}
+
+
+def test_registry_encode(registry, Header):
+    body = registry.classes[2]()
+    body.values[:] = [5]
+    header = Header()
+    header.seq = 3
+    data = registry.encode(header, body, "<")
+    assert data == b"\x02\x00\x00\x00\x03\x00\x00\x00\x01\x00\x00\x00\x05\x00\x00\x00"
+    assert header.id == 2
+
+    header, decoded = registry.decode(data, "<")
+    assert decoded.values[:] == [5]
+
+
+def test_registry_errors(registry, Header):
+    with pytest.raises(prophy.ProphyError, match="unknown message id: 3"):
+        registry.decode(b"\x00\x00\x00\x03\x00\x00\x00\x00", ">")
+    with pytest.raises(prophy.ProphyError, match="not all bytes of Ping read"):
+        registry.decode(b"\x00\x00\x00\x01\x00\x00\x00\x00" + b"\x00" * 9, ">")
+    with pytest.raises(prophy.ProphyError, match="id 1 already registered for Ping"):
+        registry.register(1, registry.classes[2])
+    with pytest.raises(prophy.ProphyError, match="unknown enumerator"):
+        registry.register("MsgId_Bad", registry.classes[2])
+    with pytest.raises(prophy.ProphyError, match="Header has no field 'type'"):
+        prophy.message_registry(Header, "type")
+    with pytest.raises(prophy.ProphyError, match="Header not registered"):
+        registry.encode(Header(), Header(), ">")
+    assert registry.counters == {1: 0, 2: 0}
@@ -0,0 +1,123 @@
+import prophy
+import pytest
+
+
+@pytest.fixture(scope='session')
+def Message():
+    class Message(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("id", prophy.u16),
+                       ("n", prophy.u32),
+                       ("payload", prophy.bytes(bound="n"))]
+    return Message
+
+
+def make(Message, id_, payload):
+    x = Message()
+    x.id = id_
+    x.payload = payload
+    return x.encode(">")
+
+
+def test_stream_decoder_yields_complete_messages(Message):
+    data = make(Message, 1, b"abc") + make(Message, 2, b"") + make(Message, 3, b"defgh")
+    decoder = prophy.stream_decoder(Message, ">")
+
+    messages = []
+    for i in range(0, len(data), 5):
+        messages += decoder.feed(data[i:i + 5])
+        assert decoder.pending < 16
+
+    assert [(x.id, x.payload) for x in messages] == [(1, b"abc"), (2, b""), (3, b"defgh")]
+    assert decoder.pending == 0
+
+
+def test_stream_decoder_keeps_remainder(Message):
+    first, second = make(Message, 1, b"abc"), make(Message, 2, b"x")
+    decoder = prophy.stream_decoder(Message, ">")
+
+    messages = decoder.feed(first + second[:3])
+    assert [x.id for x in messages] == [1]
+    assert decoder.pending == 3
+    assert decoder.feed(b"") == []
+
+    messages = decoder.feed(second[3:])
+    assert [(x.id, x.payload) for x in messages] == [(2, b"x")]
+    assert decoder.pending == 0
+
+
+def test_stream_decoder_max_size(Message):
+    decoder = prophy.stream_decoder(Message, ">", max_size=16)
+    assert decoder.feed(b"\x00\x01\x00\x00\x00\x00\x00\xff") == []
+
+    with pytest.raises(prophy.ProphyError, match="too few bytes to decode string"):
+        decoder.feed(b"\x00" * 8)
+
+
+def test_stream_decoder_decodes_message_once(Message, monkeypatch):
+    decoded = []
+    decode = Message._decode_impl
+
+    def counting_decode(self, *args, **kwargs):
+        decoded.append(self)
+        return decode(self, *args, **kwargs)
+
+    monkeypatch.setattr(Message, "_decode_impl", counting_decode)
+    data = make(Message, 1, b"x" * 100)
+    decoder = prophy.stream_decoder(Message, ">")
+    messages = []
+    for i in range(len(data)):
+        messages += decoder.feed(data[i:i + 1])
+
+    assert [(x.id, x.payload) for x in messages] == [(1, b"x" * 100)]
+    assert decoded == messages
+
+
+def test_stream_decoder_truncated_error():
+    class Inner(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("n", prophy.u32),
+                       ("b", prophy.bytes(bound="n"))]
+
+    class X(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", prophy.u8),
+                       ("i", Inner)]
+
+    with pytest.raises(prophy.ProphyTruncatedError, match="X: Inner: too few bytes to decode string"):
+        X().decode(b"\x00\x00\x00\x00\x00\x00\x00\x02a", ">")
+    decoder = prophy.stream_decoder(X, ">", max_size=12)
+    assert decoder.feed(b"\x00\x00\x00\x00\x00\x00\x00\x08abc") == []
+    with pytest.raises(prophy.ProphyTruncatedError, match="Inner: too few bytes to decode string"):
+        decoder.feed(b"d")
+
+
+def test_stream_decoder_of_unlimited_message():
+    class X(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("x", prophy.bytes())]
+
+    with pytest.raises(prophy.ProphyError, match="stream of unlimited messages not allowed"):
+        prophy.stream_decoder(X, ">")
+
+
+def test_stream_decoder_of_struct_with_optional():
+    class X(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", prophy.u64),
+                       ("o", prophy.optional(prophy.u32))]
+
+    x = X()
+    x.o = 1
+    data = x.encode(">")
+    assert len(data) < X._SIZE
+
+    decoder = prophy.stream_decoder(X, ">")
+    assert decoder.feed(data) == [x]
+    assert decoder.pending == 0
+
+
+def test_stream_decoder_raises_on_malformed_data():
+    class U(prophy.with_metaclass(prophy.union_generator, prophy.union)):
+        _descriptor = [("a", prophy.u32, 0),
+                       ("b", prophy.u16, 1)]
+
+    decoder = prophy.stream_decoder(U, ">")
+    assert decoder.feed(b"\x00\x00\x00\x01\x00\x02") == []
+    with pytest.raises(prophy.ProphyError, match="unknown discriminator"):
+        decoder.feed(b"\x00\x00" + b"\x00\x00\x00\x07\x00\x00\x00\x00")
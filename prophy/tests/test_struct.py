@@ -1,3 +1,6 @@
+import io
+import sys
+
 import pytest
 
 import prophy
@@ -606,3 +609,339 @@ def test_struct_with_substruct_with_bytes():
     x = C()
     x.x.x[:] = [1]
     assert b'\x01\x00\x00\x00\x01\x00\x00\x00' == x.encode('<')
+
+
+def test_struct_clone(Struct, NestedStruct):
+    class X(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", NestedStruct),
+                       ("n", prophy.u32),
+                       ("b", prophy.array(Struct, bound="n")),
+                       ("c", prophy.array(prophy.u8, size=2)),
+                       ("d", prophy.optional(Struct)),
+                       ("e", prophy.optional(Struct))]
+
+    x = X()
+    x.a.b.x = 1
+    x.b.add(y=2)
+    x.c[:] = [3, 4]
+    x.d = True
+    x.d.x = 5
+
+    y = x.clone()
+    assert y.encode('<') == x.encode('<')
+    assert y.e is None
+    y.a.b.x = 6
+    y.b[0].y = 7
+    y.b.add()
+    y.c[0] = 8
+    y.d.x = 9
+    assert x.a.b.x == 1
+    assert x.b[0].y == 2
+    assert len(x.b) == 1
+    assert x.c[:] == [3, 4]
+    assert x.d.x == 5
+
+    z = X()
+    z.b.add()
+    z.copy_from(x)
+    assert z.encode('<') == x.encode('<')
+    z.b[0].y = 10
+    assert x.b[0].y == 2
+
+    w = X()
+    w.decode(x.encode('>'), '>', lazy=True)
+    assert w.clone().encode('<') == x.encode('<')
+
+
+def test_struct_unchecked(Struct):
+    class E(prophy.with_metaclass(prophy.enum_generator, prophy.enum)):
+        _enumerators = [("E_1", 1)]
+
+    class X(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", Struct),
+                       ("e", E),
+                       ("n", prophy.u32),
+                       ("b", prophy.array(prophy.u16, bound="n")),
+                       ("c", prophy.array(Struct, size=1)),
+                       ("o", prophy.optional(prophy.u8))]
+
+    s = Struct.unchecked(x=1, y=2)
+    x = X.unchecked(a=s, e=1, b=[3, 4], c=[Struct.unchecked(x=5)], o=6)
+    assert x.a is s
+    assert x.b[:] == [3, 4]
+    assert x.c[0].x == 5
+
+    y = X()
+    y.a.x = 1
+    y.a.y = 2
+    y.e = 1
+    y.b[:] = [3, 4]
+    y.c[0].x = 5
+    y.o = 6
+    assert x.encode('>') == y.encode('>')
+    assert X.unchecked().encode('>') == X().encode('>')
+
+    with pytest.raises(AttributeError, match="'X' object has no attribute 'd'"):
+        X.unchecked(d=1)
+    with pytest.raises(AttributeError, match="'X' object has no attribute 'n'"):
+        X.unchecked(n=5, b=[3, 4])
+    with pytest.raises(prophy.ProphyError, match="unchecked a field must be given as instance"):
+        X.unchecked(a={"x": 1})
+    with pytest.raises(prophy.ProphyError, match="unchecked c field must have exactly 1 elements"):
+        X.unchecked(c=[Struct(), Struct()])
+    with pytest.raises(prophy.ProphyError, match="unchecked c field must have exactly 1 elements"):
+        X.unchecked(c=[])
+    with pytest.raises(prophy.ProphyError, match="not an int"):
+        x.a.x = "1"
+
+
+def test_struct_unchecked_optional_composite(Struct):
+    class X(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("o", prophy.optional(Struct))]
+
+    with pytest.raises(prophy.ProphyError, match="unchecked o field must be given as instance"):
+        X.unchecked(o=True)
+
+
+def test_struct_from_dict(Struct):
+    class E(prophy.with_metaclass(prophy.enum_generator, prophy.enum)):
+        _enumerators = [("E_1", 1),
+                        ("E_2", 2)]
+
+    class U(prophy.with_metaclass(prophy.union_generator, prophy.union)):
+        _descriptor = [("a", prophy.u32, 0),
+                       ("b", Struct, 1)]
+
+    class X(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", Struct),
+                       ("e", E),
+                       ("n", prophy.u32),
+                       ("b", prophy.array(prophy.u16, bound="n")),
+                       ("m", prophy.u32),
+                       ("c", prophy.array(Struct, bound="m")),
+                       ("d", prophy.array(U, size=2)),
+                       ("o", prophy.optional(Struct)),
+                       ("s", prophy.bytes(size=2))]
+
+    values = {"a": {"x": 1, "y": 2},
+              "e": 2,
+              "b": [3, 4],
+              "c": [{"x": 5}, {"y": 6}],
+              "d": [{"a": 7}, {"b": {"x": 8}}],
+              "o": {"y": 9},
+              "s": b"ab"}
+    x = X.from_dict(values)
+    assert x.a.y == 2
+    assert x.b[:] == [3, 4]
+    assert x.c[1].y == 6
+    assert x.d[1].discriminator == 1
+    assert x.d[1].b.x == 8
+    assert x.o.y == 9
+    assert x.to_dict() == {"a": {"x": 1, "y": 2},
+                           "e": 2,
+                           "b": [3, 4],
+                           "c": [{"x": 5, "y": 0}, {"x": 0, "y": 6}],
+                           "d": [{"a": 7}, {"b": {"x": 8, "y": 0}}],
+                           "o": {"x": 0, "y": 9},
+                           "s": b"ab"}
+    assert X.from_dict(x.to_dict()).encode('<') == x.encode('<')
+
+    s = Struct(x=10)
+    y = X(a=s, e="E_1", c=[s], o=None)
+    s.x = 11
+    assert y.a.x == 10
+    assert y.c[0].x == 10
+    assert y.e == 1
+    assert y.o is None
+    assert X(o=True).o.x == 0
+    assert X(o=s).o.x == 11
+
+    with pytest.raises(prophy.ProphyError, match="not an int"):
+        X(a={"x": "1"})
+    with pytest.raises(prophy.ProphyError, match="unknown enumerator"):
+        X(e=3)
+    with pytest.raises(prophy.ProphyError, match="setting slice with different length collection"):
+        X(d=[{}])
+    with pytest.raises(prophy.ProphyError, match="not a Struct or dict"):
+        X(a=1)
+    with pytest.raises(AttributeError, match="'X' object has no attribute 'n'"):
+        X(n=1)
+    with pytest.raises(AttributeError, match="'Struct' object has no attribute 'z'"):
+        X.from_dict({"c": [{"z": 1}]})
+
+
+def test_struct_dict_of_defaults():
+    class X(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("n", prophy.u32),
+                       ("b", prophy.bytes(bound="n")),
+                       ("l", prophy.bytes(size=3, bound="n")),
+                       ("g", prophy.bytes())]
+
+    x = X()
+    assert x.to_dict() == {"b": b"", "l": b"", "g": b""}
+    y = X.from_dict(x.to_dict())
+    assert y == x
+    assert y.encode("<") == x.encode("<")
+
+
+def test_struct_equality(Struct):
+    class X(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", Struct),
+                       ("n", prophy.u32),
+                       ("b", prophy.array(Struct, bound="n")),
+                       ("o", prophy.optional(Struct))]
+
+    x = X(b=[{"x": 1}])
+    y = X.from_dict(x.to_dict())
+    assert x == y
+    assert not x != y
+    assert X() == X(a={})
+    assert X() != X(o={})
+    y.b[0].y = 2
+    assert x != y
+    assert x != Struct()
+    assert len({x.digest(), x.clone().digest(), y.digest()}) == 2
+    assert len({x, x.clone(), y}) == 2
+    assert {x: 1}[x.clone()] == 1
+    assert x in {X.from_dict(x.to_dict())}
+
+
+def test_struct_equality_of_bytes():
+    class X(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("n", prophy.u32),
+                       ("b", prophy.bytes(bound="n")),
+                       ("f", prophy.r32)]
+
+    x = X()
+    y = X()
+    y.decode(x.encode("<"), "<")
+    assert x == y
+    assert hash(x) == hash(y)
+    z = X.unchecked(b=u"z")
+    assert z != x
+    assert z in {z}
+
+
+def test_struct_equality_of_floats():
+    class X(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("f", prophy.r64),
+                       ("g", prophy.r32)]
+
+    assert X(f=0.0) != X(f=-0.0)
+    assert X(f=float("nan")) == X(f=float("nan"))
+    assert X(g=0.1) == X.from_dict({"g": X(g=0.1).to_dict()["g"]})
+    y = X()
+    y.decode(X(g=0.1).encode("<"), "<")
+    assert y == X(g=0.1)
+    assert y.digest() == X(g=0.1).digest()
+
+
+def test_struct_digest_cache(Struct):
+    class Y(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("s", Struct),
+                       ("o", prophy.optional(Struct))]
+
+    class X(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", prophy.u32),
+                       ("y", Y),
+                       ("n", prophy.u32),
+                       ("b", prophy.array(Struct, bound="n")),
+                       ("m", prophy.u32),
+                       ("f", prophy.array(prophy.r64, bound="m"))]
+
+    x = X(a=1, y={"s": {"x": 2}, "o": {"y": 3}}, b=[{"x": 4}], f=[0.0])
+    digest = x.digest()
+    assert x.digest() is digest
+
+    x.y.o.x = 5
+    assert x.digest() != digest
+    x.y.o.x = 0
+    assert x.digest() == digest
+
+    y, b, f = x.y, x.b, x.f
+    assert x.digest() is x.digest()
+    assert y.digest() == Y(s={"x": 2}, o={"y": 3}).digest()
+    y.s.y = 1
+    assert x.digest() != digest
+    y.s.y = 0
+    assert x.digest() == digest
+
+    b[0].x = 6
+    assert x.digest() != digest
+    b[0].x = 4
+    b.add()
+    assert x.digest() != digest
+    del b[1:]
+    assert x.digest() == digest
+
+    f[0] = -0.0
+    assert x.digest() != digest
+    f[0] = 0.0
+    x.a = 2
+    assert x.digest() != digest
+    x.a = 1
+    assert x.digest() == digest
+
+    z = X()
+    z.decode(x.encode("<"), "<")
+    assert z.digest() == digest
+    assert z.digest() is z.digest()
+    z.decode(X(a=7).encode("<"), "<")
+    assert z.digest() == X(a=7).digest()
+
+
+def test_struct_equality_and_digest_of_lazily_decoded(Struct):
+    class X(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", Struct),
+                       ("n", prophy.u32),
+                       ("b", prophy.array(prophy.u8, bound="n"))]
+
+    x = X(a={"x": 1}, b=[2, 3])
+    lazy = X()
+    lazy.decode(x.encode(">"), ">", lazy=True)
+    other = X()
+    other.decode(x.encode("<"), "<", lazy=True)
+
+    digest = lazy.digest()
+    assert digest == x.digest() == other.digest()
+    assert lazy._fields.digest == digest
+    assert lazy == other == x
+    lazy.a.y = 4
+    assert lazy.digest() != digest
+    assert lazy != other
+
+
+def test_struct_write_text(Struct):
+    class E(prophy.with_metaclass(prophy.enum_generator, prophy.enum)):
+        _enumerators = [("E_1", 1), ("E_2", 2)]
+
+    class X(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("n", prophy.u32),
+                       ("a", prophy.array(prophy.u8, bound="n")),
+                       ("m", prophy.u32),
+                       ("b", prophy.array(Struct, bound="m")),
+                       ("e", prophy.array(E, size=3))]
+
+    class Y(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("x", X)]
+
+    y = Y(x={"a": [1, 2, 3], "b": [{"x": 1}, {"x": 2}], "e": [1, 2, 2]})
+    stream = io.StringIO() if sys.version >= '3' else io.BytesIO()
+    y.write_text(stream)
+    assert stream.getvalue() == str(y)
+
+    stream = io.StringIO() if sys.version >= '3' else io.BytesIO()
+    y.write_text(stream, array_limit=1)
+    assert stream.getvalue() == """\
+x {
+  a: 1
+  a: ... (2 more)
+  b {
+    x: 1
+    y: 0
+  }
+  b: ... (1 more)
+  e: E_1
+  e: ... (2 more)
+}
+"""
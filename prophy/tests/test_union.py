@@ -128,6 +128,27 @@ def test_union_nonsequential_discriminators():
     assert 0 == x.c
 
 
+def test_union_with_many_arms():
+    descriptor = [("a%d" % i, prophy.u32 if i % 2 else prophy.u16, 3 * i + 1) for i in range(300)]
+    Many = prophy.union_generator("Many", (prophy.union,), {"_descriptor": descriptor})
+
+    x = Many()
+    x.discriminator = "a299"
+    x.a299 = 7
+    assert x.discriminator == 898
+    assert x.encode(">") == b"\x00\x00\x03\x82\x00\x00\x00\x07"
+
+    y = Many()
+    y.decode(b"\x00\x00\x00\x07\x00\x05\x00\x00", ">")
+    assert y.discriminator == 7
+    assert y.a2 == 5
+
+    with pytest.raises(prophy.ProphyError, match="unknown discriminator: 2"):
+        y.decode(b"\x00\x00\x00\x02\x00\x05\x00\x00", ">")
+    with pytest.raises(prophy.ProphyError, match=r"unknown discriminator: \[1\]"):
+        y.discriminator = [1]
+
+
 def test_union_encode_according_to_largest_field(VariableLengthFieldsUnion):
     x = VariableLengthFieldsUnion()
 
@@ -602,3 +623,65 @@ def test_union_with_optional_exception():
                            ("b", prophy.optional(prophy.u32), 1),
                            ("c", prophy.u32, 2)]
     assert "union with optional field disallowed" == str(e.value)
+
+
+def test_union_clone():
+    class S(prophy.with_metaclass(prophy.struct_generator, prophy.struct)):
+        _descriptor = [("a", prophy.array(prophy.u16, size=2))]
+
+    class U(prophy.with_metaclass(prophy.union_generator, prophy.union)):
+        _descriptor = [("a", prophy.u32, 0),
+                       ("b", S, 1)]
+
+    x = U()
+    x.discriminator = 1
+    x.b.a[:] = [1, 2]
+
+    y = x.clone()
+    assert y.discriminator == 1
+    y.b.a[0] = 3
+    assert x.b.a[:] == [1, 2]
+
+    z = U()
+    z.a = 4
+    z.copy_from(x)
+    assert z.discriminator == 1
+    assert z.encode('<') == x.encode('<')
+
+
+def test_union_from_dict():
+    class U(prophy.with_metaclass(prophy.union_generator, prophy.union)):
+        _descriptor = [("a", prophy.u32, 0),
+                       ("b", prophy.u16, 1)]
+
+    assert U(b=3).discriminator == 1
+    assert U(discriminator="b").b == 0
+    assert U(discriminator=1, b=4).b == 4
+    assert U.from_dict({"a": 5}).to_dict() == {"a": 5}
+    assert U().to_dict() == {"a": 0}
+
+    with pytest.raises(prophy.ProphyError, match="only one of a, b fields can be set"):
+        U(a=1, b=2)
+    with pytest.raises(prophy.ProphyError, match="currently field 0 is discriminated"):
+        U(discriminator=0, b=2)
+    with pytest.raises(AttributeError, match="'U' object has no attribute 'c'"):
+        U(c=1)
+
+
+def test_union_equality():
+    class U(prophy.with_metaclass(prophy.union_generator, prophy.union)):
+        _descriptor = [("a", prophy.u32, 0),
+                       ("b", prophy.u32, 1)]
+
+    assert U(a=1) == U(a=1)
+    assert U(a=1) != U(b=1)
+    assert U(a=1) != U(a=2)
+    assert len({U(a=1).digest(), U(a=1).digest(), U(b=1).digest()}) == 2
+
+    u = U(a=1)
+    digest = u.digest()
+    assert u.digest() is digest
+    u.a = 2
+    assert u.digest() != digest
+    u.discriminator = "b"
+    assert u.digest() == U(b=0).digest()
@@ -1,7 +1,14 @@
-from setuptools import setup, find_packages
+import platform
+
+from setuptools import Extension, setup, find_packages
 
 long_description = open('README.rst').read()
 
+# accelerator is optional, prophy falls back to pure Python if it's not built
+ext_modules = []
+if platform.python_implementation() == 'CPython':
+    ext_modules.append(Extension('prophy._speedups', ['prophy/_speedups.c'], optional=True))
+
 setup(
     name='prophy',
     version='1.2.3',
@@ -15,6 +22,7 @@ setup(
     long_description=long_description,
     long_description_content_type='text/x-rst',
     packages=find_packages(),
+    ext_modules=ext_modules,
     install_requires=['ply', 'renew>=0.4.8,<0.6'],
     keywords='idl codec binary data protocol compiler',
     classifiers=[